@@ -1,145 +1,659 @@
-import requests
+import argparse
+import hashlib
+import json
 import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # --- Configuration ---
 DOCS_DIR = 'knowledge_base/docs'
 BERKSHIRE_DIR = os.path.join(DOCS_DIR, 'Berkshire_Letters')
 MUNGER_DIR = os.path.join(DOCS_DIR, 'Munger_Transcripts')
 
-# Create necessary directories
-os.makedirs(BERKSHIRE_DIR, exist_ok=True)
-os.makedirs(MUNGER_DIR, exist_ok=True)
+# Download concurrency / retry settings
+MAX_WORKERS = 16            # Total concurrent downloads across all hosts
+PER_HOST_LIMIT = 4          # Concurrent requests allowed against any single host
+MAX_RETRIES = 3             # Retries after the first attempt
+BACKOFF_BASE = 0.5          # Seconds; doubled on every retry
+BACKOFF_MAX = 8.0           # Upper bound for a single backoff sleep
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+CHUNK_BYTES = 1024 * 1024   # Streaming block size when writing to disk
+MANIFEST_PATH = os.path.join(DOCS_DIR, '.download_manifest.json')
 
-print(f"Target directories created or verified: {BERKSHIRE_DIR} and {MUNGER_DIR}")
-print("-" * 30)
+# Transcript pages: extracted text is cached by the SHA-256 of the page HTML
+TRANSCRIPT_CACHE_DIR = os.path.join(MUNGER_DIR, '.text_cache')
+TRANSCRIPT_MIN_INTERVAL = 1.0   # Seconds between requests to the same domain
+MIN_ARTICLE_CHARS = 500         # Below this, fall back to the whole page's text
 
-# --- 1a. Fetch Combined Historical Letters (1977-2002) ---
-print("1a. Fetching Combined Historical Letters (1977-2002) from Archive...")
-# Using the stable archive link which covers the early years
-combined_url = 'https://uploads-ssl.webflow.com/60e3655ca778911eb64b2a00/60f0773bd7a92410fed4ccbb_All-Berkshire-Hathaway-Letters.pdf'
-file_path_combined = os.path.join(BERKSHIRE_DIR, '1977-2002_Combined_Archive_Letters.pdf')
+COMBINED_URL = 'https://uploads-ssl.webflow.com/60e3655ca778911eb64b2a00/60f0773bd7a92410fed4ccbb_All-Berkshire-Hathaway-Letters.pdf'
+LETTERS_BASE_URL = 'https://www.berkshirehathaway.com/letters/'
+LETTER_YEARS = range(1999, 2025)
+ALMANACK_URL = 'https://ia600702.us.archive.org/33/items/poor-charlies-almanack-the-wit-and-wisdom-of-charles-t.-munger-pdfdrive/Poor%20Charlie%E2%80%99s%20Almanack_%20The%20Wit%20and%20Wisdom%20of%20Charles%20T.%20Munger%20%28%20PDFDrive%20%29.pdf'
+
+DJ_TRANSCRIPTS = {
+    '2023': 'https://www.kingswell.io/p/charlie-munger-q-and-a-2023-daily',
+    '2022': 'https://latticeworkinvesting.com/2022/06/03/charlie-munger-full-transcript-of-daily-journals-2022-annual-meeting/',
+    '2021': 'https://sungcap.com/charlie-munger-daily-journal-2021-transcript/',
+    '2019': 'https://latticeworkinvesting.com/2019/03/03/charlie-munger-full-transcript-of-daily-journal-annual-meeting-2019/',
+    '2018': 'https://worldlypartners.com/charlie-munger-archive/'
+}
+SPEECHES = {
+    # FIX: Using a known stable PDF link for 'The Psychology of Human Misjudgment'
+    'Psychology_of_Human_Misjudgment': 'https://janav.files.wordpress.com/2015/12/thepsychologyofhumanmisjudgment.pdf',
+    'USC_Commencement_2007': 'https://worldlypartners.com/charlie-munger-archive/'
+}
+
+
+@dataclass
+class DownloadJob:
+    """A single file to fetch: a display label, the source URL and the destination path."""
+    label: str
+    url: str
+    file_path: str
+    timeout: float = 15
+
+
+class HostPool:
+    """
+    Hands out one pooled requests.Session per host, plus a semaphore that
+    caps how many requests may be in flight against that host at once.
+    """
+
+    def __init__(self, per_host_limit: int = PER_HOST_LIMIT):
+        self.per_host_limit = per_host_limit
+        self._sessions = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str):
+        """Returns the (session, semaphore) pair for the host of `url`."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.per_host_limit,
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._sessions[host], self._semaphores[host]
+
+    def close(self):
+        """Closes every pooled session."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._semaphores.clear()
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TransientDownloadError(Exception):
+    """A failure worth retrying: connection drop, timeout, short body or 5xx/429."""
 
-if not os.path.exists(file_path_combined):
-    try:
-        response = requests.get(combined_url, timeout=15)
-        if response.status_code == 200:
-            with open(file_path_combined, 'wb') as f:
-                f.write(response.content)
-            print(f'   SUCCESS: Downloaded combined 1977-2002 archive letter.')
-        else:
-            print(f'   SKIPPED: Combined 1977-2002 letter (Status code {response.status_code})')
-    except requests.exceptions.RequestException as e:
-        print(f'   ERROR: Could not download combined letters: {e}')
-else:
-    print(f'   EXISTS: Combined 1977-2002 letter already downloaded.')
 
-print("-" * 30)
+class DownloadManifest:
+    """
+    JSON manifest of completed (and in-progress) downloads. Each entry records
+    size, SHA-256, ETag and Last-Modified so reruns can issue conditional GETs
+    and resume partial files. Keys are paths relative to the manifest's folder.
+    """
 
-# --- 1b. Fetching Individual Annual Letters (1999-2024) ---
-print("1b. Fetching Individual Annual Letters (1999-2024)...")
-base_url = 'https://www.berkshirehathaway.com/letters/'
-years = range(1999, 2025)
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
 
-for year in years:
-    pdf_url = f'{base_url}{year}ltr.pdf'
-    file_path = os.path.join(BERKSHIRE_DIR, f'{year}_letter.pdf')
+    def key(self, file_path: str) -> str:
+        return os.path.relpath(file_path, os.path.dirname(self.path) or '.')
+
+    def get(self, file_path: str) -> dict:
+        with self._lock:
+            return dict(self.entries.get(self.key(file_path), {}))
+
+    def record(self, file_path: str, **fields):
+        """Replaces the entry for `file_path` and writes the manifest atomically."""
+        with self._lock:
+            self.entries[self.key(file_path)] = fields
+            self._save()
+
+    def remove(self, file_path: str):
+        with self._lock:
+            if self.entries.pop(self.key(file_path), None) is not None:
+                self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def sha256_file(file_path: str) -> str:
+    """Hashes a file in CHUNK_BYTES blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def looks_like_pdf(file_path: str) -> bool:
+    """Cheap corruption check: real PDFs start with the %PDF- magic bytes."""
+    with open(file_path, 'rb') as f:
+        return f.read(5) == b'%PDF-'
+
+
+def expected_total_size(response):
+    """Total resource size from Content-Range (206) or Content-Length (200), if known."""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range and not content_range.endswith('/*'):
+        return int(content_range.rsplit('/', 1)[1])
+    if response.status_code == 200 and 'Content-Length' in response.headers:
+        return int(response.headers['Content-Length'])
+    return None
+
+
+def attempt_download(session, job: DownloadJob, manifest: DownloadManifest) -> dict:
+    """
+    One download attempt. Resumes `<file>.part` with a Range request when the
+    manifest says it is a partial of the same resource, sends conditional
+    headers for complete files, and streams the body to disk in chunks while
+    hashing it. Raises TransientDownloadError for anything worth retrying.
+    """
+    entry = manifest.get(job.file_path)
+    part_path = f'{job.file_path}.part'
+    headers = {}
+    resume_from = 0
+
+    validator = entry.get('etag') or entry.get('last_modified')
+    if entry.get('partial') and os.path.exists(part_path) and validator:
+        resume_from = os.path.getsize(part_path)
+        headers['Range'] = f'bytes={resume_from}-'
+        headers['If-Range'] = validator
+    elif os.path.exists(job.file_path) and not entry.get('partial'):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
 
-    if os.path.exists(file_path):
-        print(f'   EXISTS: {year} letter already downloaded.')
-        continue
-    
     try:
-        response = requests.get(pdf_url, timeout=10)
-        
-        if response.status_code == 200:
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-            print(f'   SUCCESS: Downloaded {year} letter')
-        else:
-            print(f'   SKIPPED: {year} (Status code {response.status_code})')
-            
+        with session.get(job.url, headers=headers, timeout=job.timeout, stream=True) as response:
+            if response.status_code == 304:
+                return {'job': job, 'status': 'unchanged', 'bytes': 0}
+            if response.status_code == 416:
+                # Our partial no longer matches the resource; start again from scratch.
+                os.remove(part_path)
+                manifest.remove(job.file_path)
+                raise TransientDownloadError('range not satisfiable, restarting')
+            if response.status_code in RETRY_STATUS_CODES:
+                raise TransientDownloadError(f'status code {response.status_code}')
+            if response.status_code not in (200, 206):
+                return {'job': job, 'status': 'skipped', 'bytes': 0,
+                        'status_code': response.status_code}
+
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            expected_size = expected_total_size(response)
+
+            digest = hashlib.sha256()
+            if response.status_code == 206:
+                with open(part_path, 'rb') as f:
+                    for block in iter(lambda: f.read(CHUNK_BYTES), b''):
+                        digest.update(block)
+                mode = 'ab'
+            else:
+                resume_from = 0
+                mode = 'wb'
+
+            manifest.record(job.file_path, url=job.url, partial=True,
+                            etag=etag, last_modified=last_modified)
+            written = 0
+            os.makedirs(os.path.dirname(job.file_path) or '.', exist_ok=True)
+            with open(part_path, mode) as f:
+                for block in response.iter_content(chunk_size=CHUNK_BYTES):
+                    f.write(block)
+                    digest.update(block)
+                    written += len(block)
     except requests.exceptions.RequestException as e:
-        print(f'   ERROR: Could not download {year} letter: {e}')
-        
-    time.sleep(0.5)
+        raise TransientDownloadError(str(e)) from e
+
+    size = resume_from + written
+    if expected_size is not None and size < expected_size:
+        raise TransientDownloadError(f'short body ({size}/{expected_size} bytes)')
+    if job.file_path.endswith('.pdf') and not looks_like_pdf(part_path):
+        os.remove(part_path)
+        manifest.remove(job.file_path)
+        return {'job': job, 'status': 'error', 'bytes': written,
+                'error': 'response is not a PDF (likely an HTML error page)'}
+
+    os.replace(part_path, job.file_path)
+    manifest.record(job.file_path, url=job.url, size=size, sha256=digest.hexdigest(),
+                    etag=etag, last_modified=last_modified, downloaded_at=time.time())
+    return {'job': job, 'status': 'success', 'bytes': written, 'resumed_from': resume_from}
 
-print("-" * 30)
 
-# --- 2. Download Poor Charlie's Almanack ---
-print("2. Fetching Poor Charlie's Almanack...")
-almanack_url = 'https://ia600702.us.archive.org/33/items/poor-charlies-almanack-the-wit-and-wisdom-of-charles-t.-munger-pdfdrive/Poor%20Charlie%E2%80%99s%20Almanack_%20The%20Wit%20and%20Wisdom%20of%20Charles%20T.%20Munger%20%28%20PDFDrive%20%29.pdf'
-file_path_almanack = os.path.join(DOCS_DIR, 'Poor_Charlies_Almanack.pdf')
+def download_file(pool: HostPool, job: DownloadJob, manifest: DownloadManifest,
+                  max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE) -> dict:
+    """
+    Downloads a single job to disk, retrying transient failures with jittered
+    backoff (resuming from the partial file each time). Never raises for
+    network problems; the outcome is returned as a dict with 'status' and 'bytes'.
+    """
+    entry = manifest.get(job.file_path)
+    if os.path.exists(job.file_path) and not entry:
+        # Downloaded before the manifest existed: adopt it once if it is sane.
+        if not job.file_path.endswith('.pdf') or looks_like_pdf(job.file_path):
+            manifest.record(job.file_path, url=job.url, size=os.path.getsize(job.file_path),
+                            sha256=sha256_file(job.file_path), etag=None, last_modified=None)
+            return {'job': job, 'status': 'exists', 'bytes': 0}
+        print(f'   CLEANUP: Removing corrupted {job.file_path} (not a PDF).')
+        os.remove(job.file_path)
+    elif (os.path.exists(job.file_path) and not entry.get('partial')
+          and not (entry.get('etag') or entry.get('last_modified'))
+          and os.path.getsize(job.file_path) == entry.get('size')):
+        # No validators to revalidate with; trust the recorded size.
+        return {'job': job, 'status': 'exists', 'bytes': 0}
+
+    session, semaphore = pool.get(job.url)
+    for attempt in range(max_retries + 1):
+        try:
+            with semaphore:
+                return attempt_download(session, job, manifest)
+        except TransientDownloadError as e:
+            if attempt == max_retries:
+                return {'job': job, 'status': 'error', 'bytes': 0, 'error': str(e)}
+        time.sleep(backoff_delay(attempt, base=backoff_base))
+
+
+def verify_files(manifest: DownloadManifest) -> int:
+    """
+    Re-hashes every complete file in the manifest and removes any whose
+    SHA-256 no longer matches, so the next download pass refetches it.
+    Returns the number of files removed.
+    """
+    removed = 0
+    base_dir = os.path.dirname(manifest.path) or '.'
+    for key, entry in list(manifest.entries.items()):
+        file_path = os.path.join(base_dir, key)
+        if entry.get('partial') or not os.path.exists(file_path):
+            continue
+        if sha256_file(file_path) != entry.get('sha256'):
+            print(f'   CORRUPT: {key} does not match its recorded SHA-256; removing.')
+            os.remove(file_path)
+            manifest.remove(file_path)
+            removed += 1
+    return removed
+
+
+def report_result(result: dict):
+    """Prints a one-line status for a finished download."""
+    label = result['job'].label
+    status = result['status']
+    if status == 'success':
+        resumed = f', resumed at {result["resumed_from"] / 1e6:.2f} MB' if result.get('resumed_from') else ''
+        print(f'   SUCCESS: Downloaded {label} ({result["bytes"] / 1e6:.2f} MB{resumed})')
+    elif status == 'unchanged':
+        print(f'   UNCHANGED: {label} not modified on server.')
+    elif status == 'exists':
+        print(f'   EXISTS: {label} already downloaded.')
+    elif status == 'skipped':
+        print(f'   SKIPPED: {label} (Status code {result["status_code"]})')
+    else:
+        print(f'   ERROR: Could not download {label}: {result["error"]}')
 
-if not os.path.exists(file_path_almanack):
+
+def download_all(jobs: list[DownloadJob], manifest: DownloadManifest = None,
+                 max_workers: int = MAX_WORKERS, per_host_limit: int = PER_HOST_LIMIT,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE) -> list[dict]:
+    """
+    Downloads all jobs concurrently on a thread pool, sharing one pooled
+    session per host, and prints aggregate throughput when finished.
+    Results are returned in the same order as `jobs`.
+    """
+    manifest = manifest or DownloadManifest()
+    pool = HostPool(per_host_limit=per_host_limit)
+    results = [None] * len(jobs)
+    start_time = time.perf_counter()
     try:
-        response = requests.get(almanack_url, timeout=30)
-        with open(file_path_almanack, 'wb') as f:
-            f.write(response.content)
-        print(f'   SUCCESS: Downloaded: Poor Charlie\'s Almanack to {DOCS_DIR}')
-    except requests.exceptions.RequestException as e:
-        print(f'   ERROR: Could not download Almanack: {e}')
-else:
-    print(f'   EXISTS: Poor Charlie\'s Almanack already downloaded.')
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(download_file, pool, job, manifest, max_retries, backoff_base): i
+                for i, job in enumerate(jobs)
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                report_result(result)
+    finally:
+        pool.close()
 
-print("-" * 30)
+    elapsed = time.perf_counter() - start_time
+    total_bytes = sum(r['bytes'] for r in results)
+    fetched = sum(1 for r in results if r['status'] == 'success')
+    unchanged = sum(1 for r in results if r['status'] in ('unchanged', 'exists'))
+    print(
+        f'   Fetched {fetched}/{len(jobs)} files ({unchanged} unchanged), '
+        f'{total_bytes / 1e6:.2f} MB in {elapsed:.2f}s '
+        f'({total_bytes / 1e6 / max(elapsed, 1e-9):.2f} MB/s, {fetched / max(elapsed, 1e-9):.1f} files/s)'
+    )
+    return results
 
 
-# --- 3. Save Munger Transcript Links (as TXT bookmarks) ---
-print("3. Saving Munger Transcript URLs (for future web scraping or manual review)...")
-dj_transcripts = {
-    '2023': 'https://www.kingswell.io/p/charlie-munger-q-and-a-2023-daily',  
-    '2022': 'https://latticeworkinvesting.com/2022/06/03/charlie-munger-full-transcript-of-daily-journals-2022-annual-meeting/',
-    '2021': 'https://sungcap.com/charlie-munger-daily-journal-2021-transcript/',
-    '2019': 'https://latticeworkinvesting.com/2019/03/03/charlie-munger-full-transcript-of-daily-journal-annual-meeting-2019/',
-    '2018': 'https://worldlypartners.com/charlie-munger-archive/' 
-}
-for year, url in dj_transcripts.items():
-    file_path = os.path.join(MUNGER_DIR, f'DJ_{year}.txt')
-    with open(file_path, 'w') as f:
-        f.write(f'Charlie Munger Daily Journal {year} Transcript URL:\n{url}\n\nNote: The full content of this link should be scraped later if you want deep RAG analysis.')
-    print(f'   ADDED: DJ {year} transcript link to {MUNGER_DIR}')
+def build_corpus_jobs() -> list[DownloadJob]:
+    """Builds the list of PDF downloads that make up the knowledge base."""
+    jobs = [
+        DownloadJob(
+            'combined 1977-2002 archive letters',
+            COMBINED_URL,
+            os.path.join(BERKSHIRE_DIR, '1977-2002_Combined_Archive_Letters.pdf'),
+            timeout=30,
+        )
+    ]
+    for year in LETTER_YEARS:
+        jobs.append(DownloadJob(
+            f'{year} letter',
+            f'{LETTERS_BASE_URL}{year}ltr.pdf',
+            os.path.join(BERKSHIRE_DIR, f'{year}_letter.pdf'),
+            timeout=10,
+        ))
+    jobs.append(DownloadJob(
+        "Poor Charlie's Almanack",
+        ALMANACK_URL,
+        os.path.join(DOCS_DIR, 'Poor_Charlies_Almanack.pdf'),
+        timeout=30,
+    ))
+    for name, url in SPEECHES.items():
+        if url.endswith('.pdf'):
+            jobs.append(DownloadJob(
+                f'PDF: {name}', url, os.path.join(MUNGER_DIR, f'{name}.pdf'), timeout=10
+            ))
+    return jobs
 
-print("-" * 30)
 
-# --- 4. Bonus Speeches (TXT transcripts/PDFs) ---
-print("4. Fetching Bonus Speeches...")
-speeches = {
-    # FIX: Using a known stable PDF link for 'The Psychology of Human Misjudgment'
-    'Psychology_of_Human_Misjudgment': 'https://janav.files.wordpress.com/2015/12/thepsychologyofhumanmisjudgment.pdf',
-    'USC_Commencement_2007': 'https://worldlypartners.com/charlie-munger-archive/'
-}
-for name, url in speeches.items():
-    if url.endswith('.pdf'):
-        file_path = os.path.join(MUNGER_DIR, f'{name}.pdf')
-        
-        # Robustness check: Delete the corrupted file if it exists, to ensure a clean download attempt
-        if os.path.exists(file_path):
-            if os.path.getsize(file_path) < 100000 and name == 'Psychology_of_Human_Misjudgment':
-                # Assuming the PDF should be large; if it's small, it's likely corrupted HTML
-                print(f'   CLEANUP: Removing potentially corrupted {name}.pdf ({os.path.getsize(file_path)} bytes).')
-                os.remove(file_path)
-            elif os.path.getsize(file_path) > 1000:
-                 # If file exists and is reasonably large (already downloaded correctly)
-                 print(f'   EXISTS: PDF for {name} already downloaded and verified.')
-                 continue
-            
-        if not os.path.exists(file_path): # Check again if it was removed or didn't exist
-            try:
-                response = requests.get(url, timeout=10)
-                if response.status_code == 200:
-                    with open(file_path, 'wb') as f:
-                        f.write(response.content)
-                    print(f'   SUCCESS: Downloaded PDF: {name} (using stable link)')
-                else:
-                    print(f'   SKIPPED: PDF for {name} (Status code {response.status_code})')
-            except requests.exceptions.RequestException as e:
-                print(f'   ERROR: Could not download PDF for {name}: {e}')
+class RateLimiter:
+    """Enforces a minimum interval between requests to the same domain, across threads."""
+
+    def __init__(self, min_interval: float = TRANSCRIPT_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        """Blocks until a request to the domain of `url` is allowed, then reserves the slot."""
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ArticleTextExtractor(HTMLParser):
+    """
+    Pulls readable text out of a transcript page. Text inside <article> or
+    <main> is preferred; navigation, scripts and other page chrome are skipped.
+    """
+    SKIP_TAGS = {'script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form', 'svg'}
+    BLOCK_TAGS = {'p', 'div', 'br', 'li', 'blockquote', 'section', 'tr',
+                  'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+    ARTICLE_TAGS = {'article', 'main'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._skip_depth = 0
+        self._article_depth = 0
+        self._page_parts = []
+        self._article_parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.ARTICLE_TAGS:
+            self._article_depth += 1
+        if tag in self.BLOCK_TAGS:
+            self._append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self.ARTICLE_TAGS and self._article_depth:
+            self._article_depth -= 1
+        if tag in self.BLOCK_TAGS:
+            self._append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._append(data)
+
+    def _append(self, text):
+        self._page_parts.append(text)
+        if self._article_depth:
+            self._article_parts.append(text)
+
+    def text(self) -> str:
+        article = self._clean(''.join(self._article_parts))
+        return article if len(article) >= MIN_ARTICLE_CHARS else self._clean(''.join(self._page_parts))
+
+    @staticmethod
+    def _clean(raw: str) -> str:
+        lines = (' '.join(line.split()) for line in raw.splitlines())
+        return '\n'.join(line for line in lines if line)
+
+
+def extract_article_text(html: str) -> str:
+    """Returns the article text of an HTML page as newline-separated paragraphs."""
+    extractor = ArticleTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+def build_transcript_sources() -> dict:
+    """Maps transcript output file names (without extension) to their page URLs."""
+    sources = {f'DJ_{year}': url for year, url in DJ_TRANSCRIPTS.items()}
+    sources.update({name: url for name, url in SPEECHES.items() if not url.endswith('.pdf')})
+    return sources
+
+
+def fetch_transcript(pool: HostPool, limiter: RateLimiter, name: str, url: str,
+                     manifest: DownloadManifest, out_dir: str = MUNGER_DIR,
+                     cache_dir: str = TRANSCRIPT_CACHE_DIR, max_retries: int = MAX_RETRIES,
+                     timeout: float = 15, refresh: bool = False) -> dict:
+    """
+    Fetches one transcript page and materialises its article text as
+    `<out_dir>/<name>.txt`. A transcript that was already fetched is kept
+    without a request (most of these pages send no validators, so a
+    conditional GET would download them again); with `refresh` the page is
+    revalidated with a conditional GET instead. Extracted text is cached
+    under `cache_dir` keyed by the SHA-256 of the HTML, so an unchanged page
+    is never parsed twice.
+    """
+    out_path = os.path.join(out_dir, f'{name}.txt')
+    entry = manifest.get(out_path)
+    if (not refresh and entry.get('kind') == 'transcript' and os.path.exists(out_path)
+            and os.path.getsize(out_path) == entry.get('size')):
+        return {'name': name, 'status': 'exists', 'chars': entry.get('chars', 0)}
+    headers = {}
+    if entry.get('kind') == 'transcript' and os.path.exists(out_path):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    session, semaphore = pool.get(url)
+    for attempt in range(max_retries + 1):
+        limiter.wait(url)
+        try:
+            with semaphore:
+                response = session.get(url, headers=headers, timeout=timeout)
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+            error = f'status code {response.status_code}'
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+        if attempt == max_retries:
+            return {'name': name, 'status': 'error', 'error': error}
+        time.sleep(backoff_delay(attempt))
+
+    if response.status_code == 304:
+        return {'name': name, 'status': 'unchanged', 'chars': entry.get('chars', 0)}
+    if response.status_code != 200:
+        return {'name': name, 'status': 'error', 'error': f'status code {response.status_code}'}
+
+    html_sha256 = hashlib.sha256(response.content).hexdigest()
+    cache_path = os.path.join(cache_dir, f'{html_sha256}.txt')
+    if os.path.exists(cache_path):
+        status = 'cached'
+        with open(cache_path, encoding='utf-8') as f:
+            text = f.read()
+    else:
+        status = 'fetched'
+        text = extract_article_text(response.text)
+        if not text:
+            return {'name': name, 'status': 'error', 'error': 'no article text found'}
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+
+    text_sha256 = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    if (entry.get('sha256') != text_sha256 or not os.path.exists(out_path)
+            or os.path.getsize(out_path) != entry.get('size')):
+        os.makedirs(out_dir, exist_ok=True)
+        with open(out_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    manifest.record(out_path, kind='transcript', url=url, size=len(text.encode('utf-8')),
+                    sha256=text_sha256, html_sha256=html_sha256, chars=len(text),
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'),
+                    downloaded_at=time.time())
+    return {'name': name, 'status': status, 'chars': len(text)}
+
+
+def fetch_transcripts(sources: dict, manifest: DownloadManifest, max_workers: int = MAX_WORKERS,
+                      per_host_limit: int = PER_HOST_LIMIT, min_interval: float = TRANSCRIPT_MIN_INTERVAL,
+                      out_dir: str = MUNGER_DIR, cache_dir: str = TRANSCRIPT_CACHE_DIR,
+                      refresh: bool = False) -> list[dict]:
+    """
+    Fetches all transcript pages concurrently, rate-limited per domain.
+    Transcripts already on disk are only re-fetched with `refresh`.
+    Sources that fail keep their previous text (or get a URL bookmark if they
+    have never been fetched) so the run never aborts on one bad page.
+    """
+    pool = HostPool(per_host_limit=per_host_limit)
+    limiter = RateLimiter(min_interval=min_interval)
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(fetch_transcript, pool, limiter, name, url, manifest,
+                                out_dir, cache_dir, refresh=refresh): name
+                for name, url in sources.items()
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                report_transcript(result, sources[result['name']], manifest, out_dir)
+    finally:
+        pool.close()
+    return [results[name] for name in sources]
+
+
+def report_transcript(result: dict, url: str, manifest: DownloadManifest, out_dir: str):
+    """Prints a one-line status for a transcript, writing a bookmark if nothing was ever fetched."""
+    name = result['name']
+    if result['status'] == 'fetched':
+        print(f'   FETCHED: {name} ({result["chars"]:,} chars extracted)')
+    elif result['status'] == 'cached':
+        print(f'   CACHED: {name} (page content unchanged, reused extracted text)')
+    elif result['status'] == 'unchanged':
+        print(f'   UNCHANGED: {name} not modified on server.')
+    elif result['status'] == 'exists':
+        print(f'   EXISTS: {name} already fetched (--refresh-transcripts to re-fetch).')
     else:
-        file_path = os.path.join(MUNGER_DIR, f'{name}.txt')
-        with open(file_path, 'w') as f:
-            f.write(f'Transcript URL:\n{url}\n\nNote: The full content of this link should be scraped later if you want deep RAG analysis.')
-        print(f'   ADDED: {name} link to {MUNGER_DIR}')
-        
-print("-" * 30)
-print('Data download setup complete! Check your knowledge_base/docs folder.')py
\ No newline at end of file
+        print(f'   ERROR: Could not fetch {name}: {result["error"]}')
+        out_path = os.path.join(out_dir, f'{name}.txt')
+        if manifest.get(out_path).get('kind') != 'transcript':
+            with open(out_path, 'w') as f:
+                f.write(f'Transcript URL:\n{url}\n\nNote: The full content of this link could not be fetched; rerun download_data.py to retry.')
+            print(f'   ADDED: {name} link bookmark to {out_dir}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download the Buffett/Munger corpus.")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                        help='Total concurrent downloads (default: %(default)s)')
+    parser.add_argument('--per-host', type=int, default=PER_HOST_LIMIT,
+                        help='Concurrent requests per host (default: %(default)s)')
+    parser.add_argument('--retries', type=int, default=MAX_RETRIES,
+                        help='Retries per file after the first attempt (default: %(default)s)')
+    parser.add_argument('--verify', action='store_true',
+                        help='Re-hash downloaded files against the manifest and refetch mismatches')
+    parser.add_argument('--refresh-transcripts', action='store_true',
+                        help='Re-fetch transcript pages that were already downloaded')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Create necessary directories
+    os.makedirs(BERKSHIRE_DIR, exist_ok=True)
+    os.makedirs(MUNGER_DIR, exist_ok=True)
+
+    print(f"Target directories created or verified: {BERKSHIRE_DIR} and {MUNGER_DIR}")
+    print("-" * 30)
+
+    # --- 1. Letters, Almanack and speech PDFs (concurrent) ---
+    print(f"1. Fetching letters, Almanack and speech PDFs "
+          f"({args.workers} workers, {args.per_host} per host)...")
+    manifest = DownloadManifest()
+    if args.verify:
+        verify_files(manifest)
+    download_all(
+        build_corpus_jobs(),
+        manifest=manifest,
+        max_workers=args.workers,
+        per_host_limit=args.per_host,
+        max_retries=args.retries,
+    )
+    print("-" * 30)
+
+    # --- 2. Munger transcripts and speech pages (concurrent, rate-limited per domain) ---
+    print("2. Fetching Munger transcripts and extracting article text...")
+    fetch_transcripts(
+        build_transcript_sources(),
+        manifest,
+        max_workers=args.workers,
+        per_host_limit=args.per_host,
+        refresh=args.refresh_transcripts,
+    )
+
+    print("-" * 30)
+    print('Data download setup complete! Check your knowledge_base/docs folder.')
+
+
+if __name__ == "__main__":
+    main()
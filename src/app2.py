@@ -17,6 +17,10 @@ from langchain_chroma import Chroma
 # Tools
 from langchain_tavily import TavilySearch 
 
+from index_versions import current_path
+from retrieval import ShardedRetriever
+from shards import present_shards
+
 # --- Configuration ---
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -46,18 +50,27 @@ def setup_rag_and_search():
         model_name=EMBEDDING_MODEL_NAME
     )
     
-    # 2. Load the Vector Store
+    # 2. Load the Vector Store (one collection per source family; stores from
+    # before sharding have a single default collection)
     try:
-        vectorstore = Chroma(
-            persist_directory=VECTOR_DB_PATH,
-            embedding_function=embedding_function
-        )
+        store_dir = current_path(VECTOR_DB_PATH)
+        shard_names = present_shards(store_dir)
+        if shard_names:
+            vectorstores = {
+                name: Chroma(collection_name=name, persist_directory=store_dir, embedding_function=embedding_function)
+                for name in shard_names
+            }
+        else:
+            vectorstore = Chroma(persist_directory=store_dir, embedding_function=embedding_function)
     except Exception as e:
         st.error(f"Error loading vector store. Did you run process_documents.py? Error: {e}")
         return None, None, None
 
     # 3. Create Retriever
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
+    if shard_names:
+        retriever = ShardedRetriever(shards=vectorstores, k=4)
+    else:
+        retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
 
     # 4. Create Tavily Search Tool
     search_tool = TavilySearch(
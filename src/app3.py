@@ -1,6 +1,9 @@
 # Version 1.0: Buffett's Brain - Production RAG System 🚀
 # Hybrid RAG with intelligent routing and web search fallback
 import os
+import sqlite3
+from functools import partial
+
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -11,6 +14,19 @@ from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_tavily import TavilySearch 
 
+from embedding_cache import CachedEmbeddings
+from fact_tables import instant_answer
+from flat_index import FLAT_DIRNAME, FlatIndex
+from ivf_index import IVF_DIRNAME, IVFIndex
+from quantized_index import QUANTIZED_DIRNAME, QuantizedIndex
+from bm25_index import BM25_DIRNAME, BM25Index
+from retrieval import (
+    HYBRID_CANDIDATES, HybridRetriever, LexicalRetriever, MetadataFilteredRetriever, ReloadingRetriever,
+    ShardedRetriever, SmallToBigRetriever, VectorIndexRetriever, fetch_from_chroma,
+)
+from shards import present_shards
+from small_to_big import PARENT_DOCSTORE_FILENAME, ParentDocstore
+
 # --- Configuration ---
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -18,7 +34,18 @@ TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
 VECTOR_DB_PATH = "../knowledge_base/vector_db"
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_PATH = "../knowledge_base/embedding_cache.sqlite3"
 GROQ_MODEL_NAME = "llama-3.1-8b-instant"
+# "chroma" searches Chroma's HNSW index; "quantized" uses the compact int8 index with
+# full-precision rescoring, "flat" exact search over a memory-mapped matrix, "ivf" k-means
+# posting lists for large corpora (built by `process_documents.py --engine quantized|flat|ivf`)
+RETRIEVAL_ENGINE = "chroma"
+# Also search the BM25 index built by process_documents.py and fuse both rankings, so exact
+# terms (names, tickers, years) are found even when the dense search misses them
+HYBRID_SEARCH = True
+# Characters of context passed to the LLM when the index embeds sentence windows
+# (small-to-big): the matched windows are expanded into their passages up to this budget
+CONTEXT_CHAR_BUDGET = 2400
 
 if not GROQ_API_KEY:
     st.error("Error: GROQ_API_KEY not found. Please add it to your .env file.")
@@ -33,18 +60,78 @@ def setup_rag_and_search():
     """
     Initializes the RAG pipeline with vector store, embeddings, LLM, and web search.
     """
-    embedding_function = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    
-    try:
-        vectorstore = Chroma(
-            persist_directory=VECTOR_DB_PATH, 
-            embedding_function=embedding_function
+    embedding_function = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME),
+        EMBEDDING_MODEL_NAME,
+        path=EMBEDDING_CACHE_PATH,
+    )
+
+    def load_dense_retriever(path, vectorstores, filtered, k):
+        engine_path = os.path.join(path, RETRIEVAL_ENGINE)
+        if RETRIEVAL_ENGINE in (FLAT_DIRNAME, IVF_DIRNAME) and os.path.isdir(engine_path):
+            # Memory-mapped engines carry the chunk texts themselves
+            index = FlatIndex(engine_path) if RETRIEVAL_ENGINE == FLAT_DIRNAME else IVFIndex(engine_path)
+            return VectorIndexRetriever(
+                index=index,
+                embeddings=embedding_function,
+                fetch_documents=index.documents,
+                filtered=filtered,
+                k=k,
+            )
+        if RETRIEVAL_ENGINE == QUANTIZED_DIRNAME and os.path.isdir(engine_path):
+            return VectorIndexRetriever(
+                index=QuantizedIndex(engine_path),
+                embeddings=embedding_function,
+                fetch_documents=partial(fetch_from_chroma, vectorstores),
+                filtered=filtered,
+                k=k,
+            )
+        return filtered
+
+    def load_retriever(path):
+        bm25_path = os.path.join(path, BM25_DIRNAME)
+        hybrid = HYBRID_SEARCH and os.path.isdir(bm25_path)
+        docstore_path = os.path.join(path, PARENT_DOCSTORE_FILENAME)
+        small_to_big = os.path.exists(docstore_path)
+        # Each path of a hybrid search contributes more candidates than the final k, and
+        # sentence windows are short enough that the context budget, not k, limits them
+        k = HYBRID_CANDIDATES if hybrid or small_to_big else 4
+        # One collection per source family, searched concurrently (stores from before
+        # sharding have a single default collection)
+        shard_names = present_shards(path)
+        # Explicit source/year references in a query ("in the 1987 letter") restrict the search
+        if shard_names:
+            vectorstores = [
+                Chroma(collection_name=name, persist_directory=path, embedding_function=embedding_function)
+                for name in shard_names
+            ]
+            filtered = ShardedRetriever(shards=dict(zip(shard_names, vectorstores)), k=k)
+        else:
+            vectorstores = [Chroma(persist_directory=path, embedding_function=embedding_function)]
+            filtered = MetadataFilteredRetriever(vectorstore=vectorstores[0], k=k)
+        retriever = load_dense_retriever(path, vectorstores, filtered, k)
+        if hybrid:
+            lexical = LexicalRetriever(
+                index=BM25Index(bm25_path),
+                fetch_documents=partial(fetch_from_chroma, vectorstores),
+                k=k,
+            )
+            retriever = HybridRetriever(dense=retriever, lexical=lexical, k=HYBRID_CANDIDATES if small_to_big else 4)
+        if not small_to_big:
+            return retriever
+        return SmallToBigRetriever(
+            retriever=retriever,
+            docstore=ParentDocstore(docstore_path, readonly=True),
+            budget=CONTEXT_CHAR_BUDGET,
         )
+
+    try:
+        # Follows the published index version; rebuilds are picked up without a restart
+        retriever = ReloadingRetriever(root=VECTOR_DB_PATH, load_retriever=load_retriever)
     except Exception as e:
         st.error(f"Error loading vector store: {e}")
         return None, None, None
 
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
     search_tool = TavilySearch(
         api_key=TAVILY_API_KEY, 
         max_results=3, 
@@ -96,10 +183,21 @@ Respond ONLY with a number 1-10."""
 def process_query(query, retriever, search_tool, llm):
     """
     Intelligent query routing:
-    1. Detects time-sensitive queries → triggers web search
-    2. For other queries → evaluates RAG relevance, falls back to search if needed
-    3. Returns comprehensive answer with appropriate sources
+    1. Answers per-year performance figures straight from the letters' tables
+    2. Detects time-sensitive queries → triggers web search
+    3. For other queries → evaluates RAG relevance, falls back to search if needed
+    4. Returns comprehensive answer with appropriate sources
     """
+    # "Berkshire's book value gain in 1985" needs no retrieval or LLM call
+    try:
+        fact_answer = instant_answer(query, VECTOR_DB_PATH)
+    except sqlite3.Error as e:
+        # A corrupt or locked fact table: answer with RAG instead
+        print(f"⚠️ Could not read the fact table, answering from retrieval: {e}")
+        fact_answer = None
+    if fact_answer:
+        return fact_answer
+
     results = []
     use_search = False
     
@@ -220,9 +318,10 @@ with st.sidebar:
     - 🧠 **Intelligent Routing**: LLM evaluates query relevance and chooses optimal source
     
     **How it works:**
-    1. Detects time-sensitive queries (prices, news) → web search
-    2. Evaluates RAG relevance for other queries (1-10 score)
-    3. Falls back to web search if RAG score < 5
+    1. Answers per-year performance figures (book value, market value, S&P 500) instantly from the letters' tables
+    2. Detects time-sensitive queries (prices, news) → web search
+    3. Evaluates RAG relevance for other queries (1-10 score)
+    4. Falls back to web search if RAG score < 5
     
     **Note on Real-Time Data:**
     Web search provides *references* to current data sources, not always the raw data itself. For production use, consider integrating dedicated financial APIs.
@@ -230,10 +329,18 @@ with st.sidebar:
     **Tech Stack:**
     - LLM: Groq (Llama 3.1 8B) - blazing fast!
     - Embeddings: HuggingFace (all-MiniLM-L6-v2)
-    - Vector DB: Chroma
+    - Vector DB: Chroma, plus a BM25 index for exact terms (hybrid rank fusion)
     - Search: Tavily Advanced
     """)
     
+    active_retriever = retriever.active
+    if isinstance(active_retriever, SmallToBigRetriever):
+        active_retriever = active_retriever.retriever
+    if isinstance(active_retriever, HybridRetriever) and active_retriever.latency_summary():
+        st.caption("Retrieval latency, recent queries (p50 / p95 ms): " + ", ".join(
+            f"{path} {ms['p50']:.0f} / {ms['p95']:.0f}" for path, ms in active_retriever.latency_summary().items()
+        ))
+
     if st.button("🗑️ Clear Chat History"):
         st.session_state["messages"] = [
             {"role": "assistant", "content": "Chat cleared! Ask me anything."}
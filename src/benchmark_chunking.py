@@ -0,0 +1,96 @@
+"""
+Compares character-based and tokenizer-aligned chunking on the corpus.
+
+For each splitter it reports how many chunks exceed the encoder's 256-token
+window (and so are only partly embedded), how many tokens are dropped, the
+average chunk size in tokens and characters, and the estimated index size
+(vectors plus stored text). Page text comes from the page text cache, so
+this runs in seconds once the corpus has been parsed.
+
+Usage (from src/):
+    python benchmark_chunking.py
+    python benchmark_chunking.py --chunk-tokens 200 --token-overlap 32
+"""
+import argparse
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from parallel_loader import DEFAULT_WORKERS
+from process_documents import (
+    CHUNK_OVERLAP, CHUNK_SIZE, CHUNK_TOKEN_OVERLAP, CHUNK_TOKENS, EMBEDDING_DIMENSION, EMBEDDING_MODEL_NAME,
+    load_documents, load_transcripts,
+)
+from token_chunking import EMBEDDING_MAX_TOKENS, SPECIAL_TOKENS, TokenTextSplitter, count_tokens, load_tokenizer
+
+
+def chunk_stats(texts: list[str], token_counts: list[int]) -> dict:
+    """Truncation and size statistics of a set of chunks."""
+    limit = EMBEDDING_MAX_TOKENS - SPECIAL_TOKENS
+    chars = sum(len(text) for text in texts)
+    return {
+        "chunks": len(texts),
+        "truncated": sum(1 for n in token_counts if n > limit),
+        "dropped_tokens": sum(max(n - limit, 0) for n in token_counts),
+        "mean_tokens": sum(token_counts) / max(len(texts), 1),
+        "mean_chars": chars / max(len(texts), 1),
+        "index_mb": (len(texts) * EMBEDDING_DIMENSION * 4 + chars) / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare character and token chunking on the corpus.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processes used for parsing PDFs missing from the page cache (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Characters per chunk (default: %(default)s)")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP,
+                        help="Character overlap (default: %(default)s)")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="Tokens per chunk (default: %(default)s)")
+    parser.add_argument("--token-overlap", type=int, default=CHUNK_TOKEN_OVERLAP,
+                        help="Token overlap (default: %(default)s)")
+    args = parser.parse_args()
+
+    documents = load_documents(workers=args.workers) + load_transcripts()
+    tokenizer = load_tokenizer(EMBEDDING_MODEL_NAME)
+    splitters = {
+        f"chars {args.chunk_size}/{args.chunk_overlap}": RecursiveCharacterTextSplitter(
+            chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, length_function=len,
+        ),
+        f"tokens {args.chunk_tokens}/{args.token_overlap}": TokenTextSplitter(
+            tokenizer, chunk_tokens=args.chunk_tokens, chunk_overlap=args.token_overlap,
+        ),
+    }
+
+    print(f"📏 Chunking {len(documents)} pages; the encoder embeds at most {EMBEDDING_MAX_TOKENS} tokens per chunk")
+    print("=" * 60)
+    print(f"{'splitter':<18} {'chunks':>7} {'truncated':>10} {'dropped tok':>12} "
+          f"{'mean tok':>9} {'mean chars':>11} {'index MB':>9} {'split (s)':>10}")
+    results = []
+    for name, splitter in splitters.items():
+        started = time.perf_counter()
+        texts = [chunk.page_content for chunk in splitter.split_documents(documents)]
+        elapsed = time.perf_counter() - started
+        stats = chunk_stats(texts, count_tokens(tokenizer, texts))
+        results.append(stats)
+        print(
+            f"{name:<18} {stats['chunks']:>7} "
+            f"{stats['truncated']:>5} ({stats['truncated'] / max(stats['chunks'], 1):>3.0%}) "
+            f"{stats['dropped_tokens']:>12} {stats['mean_tokens']:>9.1f} {stats['mean_chars']:>11.1f} "
+            f"{stats['index_mb']:>9.2f} {elapsed:>10.2f}"
+        )
+
+    before, after = results
+    print("=" * 60)
+    print(
+        f"Truncated chunks: {before['truncated']} → {after['truncated']}; "
+        f"dropped tokens: {before['dropped_tokens']} → {after['dropped_tokens']}"
+    )
+    print(
+        f"Index size: {before['index_mb']:.2f} MB → {after['index_mb']:.2f} MB "
+        f"({100.0 * (after['index_mb'] - before['index_mb']) / max(before['index_mb'], 1e-9):+.1f}%), "
+        f"chunks: {before['chunks']} → {after['chunks']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
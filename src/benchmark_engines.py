@@ -0,0 +1,114 @@
+"""
+Compares the search engines on the published store.
+
+For each engine it reports cold start (open the index and answer a first
+query), p50/p95 single-query latency, batched throughput and recall@4
+against exact float32 search. Engines missing from the published version
+are built in a temporary directory from the stored vectors first. The IVF
+engine is then swept over nprobe to show the recall/latency tradeoff.
+
+Usage (from src/):
+    python benchmark_engines.py
+    python benchmark_engines.py --nprobe 1 4 16 64 --n-lists 256
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from flat_index import FLAT_DIRNAME, FlatIndex, build_flat_index
+from index_versions import current_path
+from ivf_index import DEFAULT_NPROBE, IVF_DIRNAME, IVFIndex, build_ivf_index
+from process_documents import EMBEDDING_MODEL_NAME, VECTOR_DB_PATH
+from store_vectors import load_store_vectors
+from vector_benchmarks import embed_questions, exact_top_k, percentile_ms, recall_at_k, sharded_chroma, timed_queries
+
+K = 4
+
+
+def engine_path(store_dir: str, tmp_dir: str, name: str, build) -> str:
+    """The published engine directory, or a temporary build of it."""
+    path = os.path.join(store_dir, name)
+    if not os.path.isdir(path):
+        path = os.path.join(tmp_dir, name)
+        build(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search engines on the published store.")
+    parser.add_argument("--repeat", type=int, default=5, help="Times the query set is run (default: %(default)s)")
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32],
+                        help="IVF lists probed per query, swept in the tradeoff report (default: %(default)s)")
+    parser.add_argument("--n-lists", type=int, default=None,
+                        help="IVF lists for a temporary build (default: ~4*sqrt(vectors))")
+    args = parser.parse_args()
+
+    store_dir = current_path(VECTOR_DB_PATH)
+    store = load_store_vectors(store_dir)
+    queries = embed_questions(EMBEDDING_MODEL_NAME)
+    repeated = np.tile(queries, (args.repeat, 1))
+    truth = exact_top_k(store.vectors, queries, K)
+    row_of = {chunk_id: row for row, chunk_id in enumerate(store.ids)}
+
+    print(f"🔬 {len(store)} vectors, {len(queries)} queries x {args.repeat}, recall@{K} against exact search")
+    print("=" * 80)
+    print(f"{'engine':<24} {'cold start ms':>13} {'p50 ms':>8} {'p95 ms':>8} {'batch q/s':>10} {f'recall@{K}':>9}")
+
+    def report(name, cold_ms, search, search_batch=None):
+        results, millis = timed_queries(search, repeated)
+        if search_batch:
+            started = time.perf_counter()
+            search_batch(repeated)
+            batch_qps = len(repeated) / (time.perf_counter() - started)
+        else:
+            batch_qps = len(repeated) / (millis.sum() / 1000)
+        recall = recall_at_k(truth, results[:len(queries)])
+        print(f"{name:<24} {cold_ms:>13.1f} {percentile_ms(millis, 50):>8.2f} {percentile_ms(millis, 95):>8.2f} "
+              f"{batch_qps:>10.0f} {recall:>9.3f}")
+
+    started = time.perf_counter()
+    chroma = sharded_chroma(store_dir)
+    chroma.search_by_vector(queries[0].tolist(), K)
+    chroma_cold = (time.perf_counter() - started) * 1000
+    report(f"chroma HNSW ({len(chroma.shards)} shards)", chroma_cold,
+           lambda q: [row_of[doc.id] for doc, _ in chroma.search_by_vector(q.tolist(), K)])
+
+    with tempfile.TemporaryDirectory(prefix="engines_") as tmp:
+        flat_path = engine_path(store_dir, tmp, FLAT_DIRNAME, lambda path: build_flat_index(store, path))
+        started = time.perf_counter()
+        flat = FlatIndex(flat_path)
+        flat.search(queries[0], K)
+        flat_cold = (time.perf_counter() - started) * 1000
+        report("flat (mmap, exact)", flat_cold,
+               lambda q: [row for row, _ in flat.search(q, K)],
+               lambda qs: flat.search_batch(qs, K))
+
+        ivf_path = engine_path(store_dir, tmp, IVF_DIRNAME,
+                               lambda path: build_ivf_index(store, path, n_lists=args.n_lists))
+        started = time.perf_counter()
+        ivf = IVFIndex(ivf_path)
+        ivf.search(queries[0], K)
+        ivf_cold = (time.perf_counter() - started) * 1000
+        # IVF rows are grouped by posting list; map them back to store rows
+        store_row = np.array([row_of[ivf.chunks.record(position)["id"]] for position in range(len(ivf))])
+        report(f"ivf (nprobe {DEFAULT_NPROBE})", ivf_cold,
+               lambda q: [store_row[row] for row, _ in ivf.search(q, K)])
+
+        list_sizes = np.diff(ivf.lists)
+        print("=" * 80)
+        print(f"IVF recall/latency vs. nprobe ({len(list_sizes)} lists, median {int(np.median(list_sizes))} "
+              f"vectors per list)")
+        print(f"{'nprobe':>8} {'scanned %':>10} {'p50 ms':>8} {'p95 ms':>8} {f'recall@{K}':>9}")
+        for nprobe in args.nprobe:
+            results, millis = timed_queries(
+                lambda q: [store_row[row] for row, _ in ivf.search(q, K, nprobe=nprobe)], repeated)
+            scanned = np.mean([list_sizes[ivf.probe(q, nprobe)].sum() for q in queries]) / max(len(ivf), 1)
+            print(f"{nprobe:>8} {100 * scanned:>10.1f} {percentile_ms(millis, 50):>8.2f} "
+                  f"{percentile_ms(millis, 95):>8.2f} {recall_at_k(truth, results[:len(queries)]):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
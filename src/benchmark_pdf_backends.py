@@ -0,0 +1,100 @@
+"""
+Benchmarks the installed PDF extraction backends on the corpus.
+
+For each backend it reports total parse time, pages/sec and how closely the
+extracted text matches the pypdf baseline (the extractor the index was
+originally built with), so we can pick the fastest backend that yields
+equivalent text.
+
+Usage (from src/):
+    python benchmark_pdf_backends.py
+    python benchmark_pdf_backends.py --workers 8 --files ../knowledge_base/docs/Poor_Charlies_Almanack.pdf
+"""
+import argparse
+import re
+import time
+from collections import Counter
+
+from parallel_loader import DEFAULT_WORKERS, load_pdfs_parallel
+from pdf_backends import available_backends
+from process_documents import find_pdf_files
+
+# A backend is "equivalent" if its mean word-level similarity to pypdf is at least this
+EQUIVALENCE_THRESHOLD = 0.95
+# Pages below this similarity are counted as divergent
+DIVERGENT_PAGE_THRESHOLD = 0.90
+
+WORD_RE = re.compile(r"\w+")
+
+
+def word_similarity(a: str, b: str) -> float:
+    """Multiset Jaccard similarity of the words on two pages (layout/whitespace-insensitive)."""
+    words_a, words_b = Counter(WORD_RE.findall(a.lower())), Counter(WORD_RE.findall(b.lower()))
+    if not words_a and not words_b:
+        return 1.0
+    return sum((words_a & words_b).values()) / sum((words_a | words_b).values())
+
+
+def compare_to_baseline(baseline: dict, candidate: dict) -> dict:
+    """Text-diff statistics of `candidate` pages against `baseline` pages, keyed by (source, page)."""
+    similarities = [word_similarity(baseline[key], candidate.get(key, "")) for key in baseline]
+    baseline_chars = sum(len(text) for text in baseline.values())
+    candidate_chars = sum(len(text) for text in candidate.values())
+    return {
+        "mean_similarity": sum(similarities) / max(len(similarities), 1),
+        "divergent_pages": sum(1 for s in similarities if s < DIVERGENT_PAGE_THRESHOLD),
+        "missing_pages": sum(1 for key in baseline if key not in candidate),
+        "char_delta_pct": 100.0 * (candidate_chars - baseline_chars) / max(baseline_chars, 1),
+    }
+
+
+def run_backend(backend: str, pdf_paths: list[str], workers: int) -> tuple[dict, float]:
+    """Parses the files with one backend; returns ({(source, page): text}, seconds)."""
+    started = time.perf_counter()
+    documents = load_pdfs_parallel(pdf_paths, workers=workers, backend=backend, verbose=False)
+    elapsed = time.perf_counter() - started
+    return {(d.metadata["source"], d.metadata["page"]): d.page_content for d in documents}, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF extraction backends on the corpus.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processes used for parsing (default: %(default)s)")
+    parser.add_argument("--files", nargs="*", help="PDFs to benchmark (default: the whole corpus)")
+    args = parser.parse_args()
+
+    pdf_paths = args.files or find_pdf_files()
+    backends = available_backends()
+    print(f"📏 Benchmarking {', '.join(backends)} on {len(pdf_paths)} PDFs with {args.workers} worker(s)")
+    print("=" * 60)
+
+    runs = {}
+    for backend in ["pypdf"] + [b for b in backends if b != "pypdf"]:
+        pages, elapsed = run_backend(backend, pdf_paths, args.workers)
+        runs[backend] = (pages, elapsed)
+        print(f"   {backend}: {len(pages)} pages in {elapsed:.2f}s")
+
+    baseline = runs["pypdf"][0]
+    print("=" * 60)
+    print(f"{'backend':<10} {'pages':>7} {'time (s)':>9} {'pages/sec':>10} {'similarity':>11} {'divergent':>10} {'chars Δ%':>9}")
+    candidates = []
+    for backend, (pages, elapsed) in runs.items():
+        stats = compare_to_baseline(baseline, pages)
+        rate = len(pages) / max(elapsed, 1e-9)
+        print(
+            f"{backend:<10} {len(pages):>7} {elapsed:>9.2f} {rate:>10.1f} "
+            f"{stats['mean_similarity']:>11.3f} {stats['divergent_pages']:>10} {stats['char_delta_pct']:>+9.1f}"
+        )
+        if stats["mean_similarity"] >= EQUIVALENCE_THRESHOLD and stats["missing_pages"] == 0:
+            candidates.append((rate, backend))
+
+    print("=" * 60)
+    if candidates:
+        _, best = max(candidates)
+        print(f"✅ Fastest backend with equivalent text: {best} (use --pdf-backend {best})")
+    else:
+        print("⚠️ No backend matched pypdf closely enough; keep --pdf-backend pypdf")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compares the quantized index against the current Chroma store.
+
+For the published store it builds int8 (and PCA + int8) indexes in a
+temporary directory and reports, per engine: memory held for search,
+p50/p95 latency and recall@4 against exact float32 search, with and
+without full-precision rescoring of the first-pass candidates.
+
+Usage (from src/):
+    python benchmark_quantization.py
+    python benchmark_quantization.py --pca-dims 256 128 64 --candidates 80
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from index_versions import current_path
+from process_documents import EMBEDDING_MODEL_NAME, VECTOR_DB_PATH
+from quantized_index import RESCORE_CANDIDATES, QuantizedIndex, build_quantized_index
+from store_vectors import load_store_vectors
+from vector_benchmarks import embed_questions, exact_top_k, percentile_ms, recall_at_k, sharded_chroma, timed_queries
+
+K = 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark int8/PCA quantized search against the Chroma store.")
+    parser.add_argument("--pca-dims", type=int, nargs="*", default=[192, 96],
+                        help="PCA sizes to try in addition to int8 at full dimension (default: %(default)s)")
+    parser.add_argument("--candidates", type=int, default=RESCORE_CANDIDATES,
+                        help="First-pass candidates rescored at full precision (default: %(default)s)")
+    args = parser.parse_args()
+
+    store_dir = current_path(VECTOR_DB_PATH)
+    store = load_store_vectors(store_dir, include_documents=False)
+    queries = embed_questions(EMBEDDING_MODEL_NAME)
+    truth = exact_top_k(store.vectors, queries, K)
+    row_of = {chunk_id: row for row, chunk_id in enumerate(store.ids)}
+    float_mb = store.vectors.astype(np.float32).nbytes / 1e6
+
+    print(f"🔬 {len(store)} vectors of dimension {store.vectors.shape[1]}, {len(queries)} queries, recall@{K} "
+          f"against exact float32 search")
+    print("=" * 72)
+    print(f"{'engine':<30} {'memory MB':>10} {'p50 ms':>8} {'p95 ms':>8} {f'recall@{K}':>9}")
+
+    def report(name, memory_mb, results, millis):
+        recall = recall_at_k(truth, results)
+        print(f"{name:<30} {memory_mb:>10.2f} {percentile_ms(millis, 50):>8.2f} "
+              f"{percentile_ms(millis, 95):>8.2f} {recall:>9.3f}")
+        return recall
+
+    chroma = sharded_chroma(store_dir)
+    results, millis = timed_queries(
+        lambda q: [row_of[doc.id] for doc, _ in chroma.search_by_vector(q.tolist(), K)],
+        queries,
+    )
+    report("chroma HNSW (float32)", float_mb, results, millis)
+
+    summary = []
+    with tempfile.TemporaryDirectory(prefix="quantized_") as tmp:
+        for pca_dims in [None] + list(args.pca_dims):
+            path = os.path.join(tmp, f"pca{pca_dims or 0}")
+            build_quantized_index(store.ids, store.vectors, path, pca_dims=pca_dims)
+            index = QuantizedIndex(path)
+            label = f"pca{pca_dims} + int8" if pca_dims else "int8"
+            for rescore in (False, True):
+                results, millis = timed_queries(
+                    lambda q: [row_of[i] for i, _ in index.search(q, K, args.candidates, rescore=rescore)],
+                    queries,
+                )
+                name = f"{label} + rescore {args.candidates}" if rescore else label
+                recall = report(name, index.memory_bytes / 1e6, results, millis)
+                if rescore:
+                    summary.append((name, index.memory_bytes / 1e6, recall, percentile_ms(millis, 50)))
+
+    print("=" * 72)
+    print(f"Full-precision vectors stay on disk ({float_mb:.2f} MB, memory-mapped; only candidate rows are read)")
+    for name, memory_mb, recall, p50 in summary:
+        print(f"{name}: {float_mb:.2f} MB → {memory_mb:.2f} MB in memory "
+              f"({100.0 * (1 - memory_mb / max(float_mb, 1e-9)):.0f}% saved), recall@{K} {recall:.3f}, p50 {p50:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
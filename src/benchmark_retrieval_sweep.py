@@ -0,0 +1,298 @@
+"""
+Sweeps chunking, k and HNSW settings against a golden question set.
+
+golden_queries.json lists Buffett/Munger questions with the passages that
+should answer them. A passage is given as a short phrase plus the letter
+year and/or a substring of the source file name, so a retrieved chunk counts
+as relevant whatever the chunk boundaries are: it must contain the phrase
+(case and whitespace are ignored) and come from that source. Keep phrases
+short so they rarely straddle two chunks.
+
+Every chunking variant (chunk size, overlap and small-to-big child size, in
+CHUNK_UNIT) is split from the cached page text and embedded through the
+persistent embedding cache, then indexed in a scratch Chroma collection for
+every HNSW setting (space, M, construction ef); search ef is changed on the
+built index (on chromadb < 1.0, where it is fixed at creation, the index is
+rebuilt per search ef). Small-to-big variants are scored on the expanded
+passages, as the app serves them. Per combination and k it reports:
+
+    recall@k    fraction of a question's expected passages found in the top k
+    MRR         1 / rank of the first relevant result (0 if none in the top k)
+    p50/p95     search latency per query, milliseconds
+    index MB    size of the built collection on disk
+    build s     split + embed + index time (embedding cache hits are free)
+
+The recommendation is the smallest k (then smallest index, then lowest p95)
+whose recall and MRR are within RECALL_TOLERANCE of the best; it is written
+with every row to a JSON report. Its "hnsw" block is in the collection
+configuration format of chromadb 1.x; older versions take the same settings
+as "hnsw:" collection metadata.
+
+Usage (from src/):
+    python benchmark_retrieval_sweep.py
+    python benchmark_retrieval_sweep.py --chunk-sizes 128 192 254 --overlaps 0 48 --child-sizes 0 --k 4
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from dedup import strip_repeated_lines
+from embedding_cache import CachedEmbeddings
+from parallel_embeddings import DEFAULT_EMBED_WORKERS, ParallelEmbedder
+from parallel_loader import DEFAULT_WORKERS
+from process_documents import (
+    CHILD_CHARS, CHILD_TOKENS, CHUNK_OVERLAP, CHUNK_SIZE, CHUNK_TOKEN_OVERLAP, CHUNK_TOKENS, CHUNK_UNIT,
+    EMBEDDING_CACHE_PATH, EMBEDDING_MODEL_NAME, WRITE_BATCH_SIZE, load_documents, load_transcripts,
+)
+from small_to_big import CONTEXT_CHAR_BUDGET, SentenceWindowSplitter, expand_windows
+from source_metadata import SourceTagger
+from token_chunking import TokenTextSplitter, count_tokens, load_tokenizer
+from vector_benchmarks import embed_questions, percentile_ms, timed_queries
+
+GOLDEN_SET_PATH = "golden_queries.json"
+REPORT_PATH = "../knowledge_base/retrieval_sweep.json"
+# Recall/MRR within this of the best count as equally good, so the cheaper setting wins
+RECALL_TOLERANCE = 0.01
+
+
+def load_golden_set(path: str = GOLDEN_SET_PATH) -> list[dict]:
+    """[{"question", "expected": [{"text", "year"?, "source"?}, ...]}, ...]"""
+    with open(path, encoding="utf-8") as f:
+        golden = json.load(f)
+    for item in golden:
+        if not item.get("question") or not item.get("expected"):
+            raise ValueError(f"Golden query needs a question and expected passages: {item}")
+    return golden
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.replace("’", "'").lower().split())
+
+
+def matches(expected: dict, text: str, metadata: dict) -> bool:
+    """True if a retrieved text (with its chunk metadata) is the expected passage."""
+    if "source" in expected and expected["source"] not in metadata.get("source", ""):
+        return False
+    if "year" in expected and not (metadata.get("year_start", 0) <= expected["year"] <= metadata.get("year_end", 0)):
+        return False
+    return _normalize(expected["text"]) in _normalize(text)
+
+
+def score_ranking(documents: list, expected: list[dict]) -> tuple[float, float]:
+    """(recall, reciprocal rank) of a ranked list of Documents against the expected passages."""
+    found, first = set(), None
+    for rank, doc in enumerate(documents, start=1):
+        hits = {i for i, passage in enumerate(expected) if matches(passage, doc.page_content, doc.metadata)}
+        if hits and first is None:
+            first = rank
+        found |= hits
+    return len(found) / len(expected), (1.0 / first if first else 0.0)
+
+
+def recommend(rows: list[dict], tolerance: float = RECALL_TOLERANCE) -> dict:
+    """The cheapest row whose recall and MRR are within `tolerance` of the best."""
+    best_recall = max(row["recall"] for row in rows)
+    candidates = [row for row in rows if row["recall"] >= best_recall - tolerance]
+    best_mrr = max(row["mrr"] for row in candidates)
+    candidates = [row for row in candidates if row["mrr"] >= best_mrr - tolerance]
+    return min(candidates, key=lambda row: (row["k"], row["index_mb"], row["p95_ms"]))
+
+
+def chunk_variants(sizes: list[int], overlaps: list[int], child_sizes: list[int]) -> list[tuple]:
+    """(chunk size, overlap, child size) combinations; parents never overlap when children are on."""
+    variants = []
+    for size, overlap, child in itertools.product(sizes, overlaps, child_sizes):
+        overlap = 0 if child else overlap
+        if overlap < size and (size, overlap, child) not in variants:
+            variants.append((size, overlap, child))
+    return variants
+
+
+def split_variant(pages: list, unit: str, size: int, overlap: int, child: int, tokenizer) -> tuple[list, dict]:
+    """(documents to embed, {parent id: parent Document}) for one chunking variant."""
+    if unit == "tokens":
+        splitter = TokenTextSplitter(tokenizer, chunk_tokens=size, chunk_overlap=overlap)
+    else:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap, length_function=len)
+    chunks = splitter.split_documents(pages)
+    if not child:
+        return chunks, {}
+    parent_ids = [f"p{i}" for i in range(len(chunks))]
+    count = (lambda texts: count_tokens(tokenizer, texts)) if unit == "tokens" else None
+    children = SentenceWindowSplitter(child, count).split(chunks, parent_ids)
+    return children, dict(zip(parent_ids, chunks))
+
+
+def load_pages(workers: int) -> list:
+    """Every page of the corpus, tagged and with running headers/footers removed as during ingestion."""
+    by_source = {}
+    for doc in load_documents(workers=workers) + load_transcripts():
+        by_source.setdefault(doc.metadata["source"], []).append(doc)
+    tagger = SourceTagger()
+    pages = []
+    for documents in by_source.values():
+        tagger.tag(documents)
+        pages.extend(strip_repeated_lines(documents)[0])
+    return pages
+
+
+def has_collection_configuration() -> bool:
+    """
+    Whether chromadb takes HNSW settings as a collection configuration that
+    can be modified after the build (1.0 and later). Before that they are
+    "hnsw:" collection metadata, fixed when the collection is created.
+    """
+    import chromadb
+    return int(chromadb.__version__.split(".")[0]) >= 1
+
+
+def create_hnsw_collection(client, space: str, m: int, ef_construction: int, ef_search: int):
+    """A scratch collection with the given HNSW settings."""
+    if has_collection_configuration():
+        return client.create_collection("sweep", configuration={"hnsw": {
+            "space": space, "max_neighbors": m, "ef_construction": ef_construction, "ef_search": ef_search}})
+    return client.create_collection("sweep", metadata={
+        "hnsw:space": space, "hnsw:M": m, "hnsw:construction_ef": ef_construction, "hnsw:search_ef": ef_search})
+
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names) / 1e6
+
+
+def main():
+    tokens = CHUNK_UNIT == "tokens"
+    parser = argparse.ArgumentParser(description="Sweep chunking, k and HNSW settings against the golden set.")
+    parser.add_argument("--golden", default=GOLDEN_SET_PATH, help="Golden question set (default: %(default)s)")
+    parser.add_argument("--out", default=REPORT_PATH, help="JSON report path (default: %(default)s)")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[128, CHUNK_TOKENS] if tokens else [500, CHUNK_SIZE],
+                        help=f"Chunk sizes in {CHUNK_UNIT} (default: %(default)s)")
+    parser.add_argument("--overlaps", type=int, nargs="+",
+                        default=[0, CHUNK_TOKEN_OVERLAP] if tokens else [0, CHUNK_OVERLAP],
+                        help=f"Chunk overlaps in {CHUNK_UNIT} (default: %(default)s)")
+    parser.add_argument("--child-sizes", type=int, nargs="+", default=[0, CHILD_TOKENS if tokens else CHILD_CHARS],
+                        help=f"Small-to-big child sizes in {CHUNK_UNIT}, 0 for none (default: %(default)s)")
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 4, 6, 8, 10],
+                        help="Results per query (default: %(default)s)")
+    parser.add_argument("--space", nargs="+", default=["cosine", "l2"], choices=["cosine", "l2", "ip"],
+                        help="HNSW distance (default: %(default)s)")
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32],
+                        help="HNSW neighbors per node (default: %(default)s)")
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100],
+                        help="HNSW construction ef (default: %(default)s)")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 50, 100],
+                        help="HNSW search ef (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="Times the question set is run (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processes used for parsing PDFs missing from the page cache (default: %(default)s)")
+    parser.add_argument("--embed-workers", type=int, default=DEFAULT_EMBED_WORKERS,
+                        help="Embedding processes (default: %(default)s)")
+    args = parser.parse_args()
+    variants = chunk_variants(args.chunk_sizes, args.overlaps, args.child_sizes)
+    if not variants:
+        parser.error(f"no chunking variant left: every overlap in {args.overlaps} is at least "
+                     f"every chunk size in {args.chunk_sizes}")
+
+    import chromadb
+
+    golden = load_golden_set(args.golden)
+    pages = load_pages(args.workers)
+    tokenizer = load_tokenizer(EMBEDDING_MODEL_NAME) if tokens else None
+    queries = embed_questions(EMBEDDING_MODEL_NAME, [item["question"] for item in golden])
+    repeated = np.tile(queries, (args.repeat, 1))
+    embedder = ParallelEmbedder(EMBEDDING_MODEL_NAME, workers=args.embed_workers)
+    embeddings = CachedEmbeddings(embedder, EMBEDDING_MODEL_NAME, path=EMBEDDING_CACHE_PATH)
+    # (space, M, construction ef, search efs measured on the build)
+    configurable = has_collection_configuration()
+    ef_groups = [args.ef_search] if configurable else [[ef_search] for ef_search in args.ef_search]
+    hnsw_builds = [(*build, ef_searches) for build in itertools.product(args.space, args.m, args.ef_construction)
+                   for ef_searches in ef_groups]
+
+    print(f"🎯 {len(golden)} golden questions x {args.repeat}, {len(pages)} pages, "
+          f"{len(variants)} chunkings x {len(hnsw_builds)} HNSW builds x {len(ef_groups[0])} ef x {len(args.k)} k")
+    print("=" * 112)
+    print(f"{'chunking':<22} {'hnsw':<18} {'ef':>4} {'k':>3} {'recall@k':>9} {'MRR':>6} {'p50 ms':>7} "
+          f"{'p95 ms':>7} {'index MB':>9} {'build s':>8} {'vectors':>8}")
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="retrieval_sweep_") as tmp:
+            for size, overlap, child in variants:
+                started = time.perf_counter()
+                documents, parents = split_variant(pages, CHUNK_UNIT, size, overlap, child, tokenizer)
+                vectors = embeddings.embed_documents([doc.page_content for doc in documents])
+                prepare_s = time.perf_counter() - started
+
+                for space, m, ef_construction, ef_searches in hnsw_builds:
+                    path = os.path.join(tmp, f"build-{len(rows)}")
+                    started = time.perf_counter()
+                    collection = create_hnsw_collection(chromadb.PersistentClient(path=path),
+                                                        space, m, ef_construction, ef_searches[0])
+                    for start in range(0, len(documents), WRITE_BATCH_SIZE):
+                        batch = documents[start:start + WRITE_BATCH_SIZE]
+                        collection.add(ids=[str(i) for i in range(start, start + len(batch))],
+                                       embeddings=vectors[start:start + len(batch)],
+                                       documents=[doc.page_content for doc in batch],
+                                       metadatas=[{key: value for key, value in doc.metadata.items()
+                                                   if value is not None} for doc in batch])
+                    build_s = prepare_s + time.perf_counter() - started
+                    index_mb = directory_mb(path)
+
+                    for ef_search, k in itertools.product(ef_searches, args.k):
+                        if configurable:
+                            collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+
+                        def search(query):
+                            found = collection.query(query_embeddings=[query.tolist()], n_results=k,
+                                                     include=["documents", "metadatas"])
+                            ranked = [documents[int(i)] for i in found["ids"][0]]
+                            return expand_windows(ranked, parents, CONTEXT_CHAR_BUDGET) if parents else ranked
+
+                        results, millis = timed_queries(search, repeated)
+                        scores = [score_ranking(docs, item["expected"]) for docs, item in zip(results, golden)]
+                        row = {
+                            "chunk_unit": CHUNK_UNIT, "chunk_size": size, "chunk_overlap": overlap, "child_size": child,
+                            "hnsw": {"space": space, "max_neighbors": m, "ef_construction": ef_construction,
+                                     "ef_search": ef_search},
+                            "k": k,
+                            "recall": float(np.mean([recall for recall, _ in scores])),
+                            "mrr": float(np.mean([rr for _, rr in scores])),
+                            "p50_ms": percentile_ms(millis, 50), "p95_ms": percentile_ms(millis, 95),
+                            "index_mb": index_mb, "build_s": build_s, "vectors": len(documents),
+                        }
+                        rows.append(row)
+                        chunking = f"{size}/{overlap}" + (f" child {child}" if child else "")
+                        print(f"{chunking:<22} {f'{space} M{m} efc{ef_construction}':<18} {ef_search:>4} {k:>3} "
+                              f"{row['recall']:>9.3f} {row['mrr']:>6.3f} {row['p50_ms']:>7.2f} {row['p95_ms']:>7.2f} "
+                              f"{index_mb:>9.1f} {build_s:>8.1f} {len(documents):>8}")
+    finally:
+        embeddings.close()
+        embedder.close()
+
+    best = recommend(rows)
+    recommended = {key: best[key] for key in ("chunk_unit", "chunk_size", "chunk_overlap", "child_size", "k", "hnsw")}
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "golden_set": args.golden, "questions": len(golden), "repeat": args.repeat,
+            "recommended": recommended, "metrics": {key: best[key] for key in
+                                                    ("recall", "mrr", "p50_ms", "p95_ms", "index_mb", "build_s")},
+            "rows": rows,
+        }, f, indent=2)
+
+    print("=" * 112)
+    print(f"Recommended: {CHUNK_UNIT} {best['chunk_size']}/{best['chunk_overlap']}, child {best['child_size']}, "
+          f"k={best['k']}, HNSW {best['hnsw']} (recall@k {best['recall']:.3f}, MRR {best['mrr']:.3f}, "
+          f"p95 {best['p95_ms']:.2f} ms, {best['index_mb']:.1f} MB)")
+    print(f"Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
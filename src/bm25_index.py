@@ -0,0 +1,180 @@
+"""
+On-disk BM25 inverted index over the stored chunks.
+
+Dense search matches meaning, not spelling, so queries that hinge on an exact
+term ("Ajit Jain", "BRK", "float", "1987") can miss chunks that contain it
+word for word. BM25 scores exactly those term matches. The index is built
+from the chunk texts already in the store and written as flat arrays, all of
+which are memory-mapped at load. Files, under <version>/bm25/:
+
+    meta.json          {"format", "count", "terms", "avg_length", "k1", "b", "source_types"}
+    vocab.json         term -> term id
+    ids.json           chunk IDs, row order
+    postings.npy       int64 (terms + 1,): where each term's posting list starts
+    posting_rows.npy   int32: rows containing the term, per term, ascending
+    posting_tf.npy     uint16: occurrences of the term in that row
+    lengths.npy        int32 (count,): tokens per row
+    source_type.npy    uint8 (count,): index into meta["source_types"]
+    year_start.npy, year_end.npy   int16 (count,), 0 when unknown
+
+The per-row source type and years let a query's source/year constraints (see
+source_metadata.py) be applied without reading any text. Built on every
+`process_documents.py` run; `LexicalRetriever` and `HybridRetriever`
+(retrieval.py) search it.
+"""
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+
+from source_metadata import QueryConstraints
+from store_vectors import StoreVectors
+
+BM25_DIRNAME = "bm25"
+BM25_FORMAT = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Only the most frequent function words; everything else is kept, so names and
+# tickers match exactly
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have he his i in is it its of on or our s so such that the their
+them there they this to was we were what when which who will with would you your
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased alphanumeric terms without stopwords and single letters (numbers are kept)."""
+    return [token for token in TOKEN_RE.findall(text.lower())
+            if token not in STOPWORDS and (len(token) > 1 or token.isdigit())]
+
+
+def build_bm25_index(store: StoreVectors, out_dir: str) -> dict:
+    """Writes a BM25Index over the chunk texts of `store`; returns its meta."""
+    count = len(store)
+    vocab = {}          # term -> term id, in order of first appearance
+    token_ids = []
+    lengths = np.zeros(count, dtype=np.int32)
+    for row, text in enumerate(store.documents):
+        tokens = tokenize(text or "")
+        lengths[row] = len(tokens)
+        token_ids.extend(vocab.setdefault(token, len(vocab)) for token in tokens)
+
+    # One (term, row) pair per occurrence; unique pairs sorted by term then row are the posting lists
+    pairs = np.asarray(token_ids, dtype=np.int64) * max(count, 1) + np.repeat(np.arange(count), lengths)
+    pairs, tf = np.unique(pairs, return_counts=True)
+    posting_terms = pairs // max(count, 1)
+    posting_rows = (pairs % max(count, 1)).astype(np.int32)
+    posting_tf = np.minimum(tf, np.iinfo(np.uint16).max).astype(np.uint16)
+    starts = np.zeros(len(vocab) + 1, dtype=np.int64)
+    starts[1:] = np.cumsum(np.bincount(posting_terms, minlength=len(vocab)))
+
+    metadatas = store.metadatas or [{}] * count
+    source_types = sorted({m.get("source_type", "") for m in metadatas})
+    code = {source_type: i for i, source_type in enumerate(source_types)}
+
+    meta = {"format": BM25_FORMAT, "count": count, "terms": len(vocab),
+            "avg_length": float(lengths.mean()) if count else 0.0, "k1": BM25_K1, "b": BM25_B,
+            "source_types": source_types}
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    arrays = {
+        "postings": starts,
+        "posting_rows": posting_rows,
+        "posting_tf": posting_tf,
+        "lengths": lengths,
+        "source_type": np.array([code[m.get("source_type", "")] for m in metadatas], dtype=np.uint8),
+        "year_start": np.array([m.get("year_start", 0) for m in metadatas], dtype=np.int16),
+        "year_end": np.array([m.get("year_end", 0) for m in metadatas], dtype=np.int16),
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+    with open(os.path.join(tmp_dir, "vocab.json"), "w") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, "ids.json"), "w") as f:
+        json.dump(list(store.ids), f)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(tmp_dir, out_dir)
+    return meta
+
+
+class BM25Index:
+    """Read-only view of an index written by build_bm25_index; search() returns [(chunk id, score)]."""
+
+    MAPPED = ("postings", "posting_rows", "posting_tf", "lengths", "source_type", "year_start", "year_end")
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != BM25_FORMAT:
+            raise ValueError(f"Unsupported BM25 index format {self.meta.get('format')} in {path}")
+        with open(os.path.join(path, "vocab.json")) as f:
+            self.vocab = json.load(f)
+        with open(os.path.join(path, "ids.json")) as f:
+            self.ids = json.load(f)
+        for name in self.MAPPED:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        # Length normalization of the BM25 denominator, per row
+        k1, b = self.meta["k1"], self.meta["b"]
+        avg_length = max(self.meta["avg_length"], 1e-9)
+        self.norms = (k1 * (1 - b + b * np.asarray(self.lengths, dtype=np.float32) / avg_length)).astype(np.float32)
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def close(self):
+        """Drops the memory maps; a file is unmapped once no array taken from it is left."""
+        for name in self.MAPPED:
+            setattr(self, name, None)
+
+    def allowed_rows(self, constraints: QueryConstraints):
+        """Boolean mask of the rows matching the constraints, or None when there are none."""
+        if not constraints:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        if constraints.source_types:
+            codes = [i for i, source_type in enumerate(self.meta["source_types"])
+                     if source_type in constraints.source_types]
+            mask &= np.isin(self.source_type, codes)
+        if constraints.year_ranges:
+            # Same rule as the Chroma filter: the row's years overlap a range; unknown years never match
+            starts, ends = np.asarray(self.year_start), np.asarray(self.year_end)
+            in_range = np.zeros(len(self), dtype=bool)
+            for first, last in constraints.year_ranges:
+                in_range |= (starts > 0) & (starts <= last) & (ends >= first)
+            mask &= in_range
+        return mask
+
+    def search(self, query: str, k: int = 4, constraints: QueryConstraints = None) -> list[tuple[str, float]]:
+        """Top `k` (chunk id, BM25 score) for the query's terms, best first; rows with no match are never returned."""
+        count = len(self)
+        scores = np.zeros(count, dtype=np.float32)
+        k1 = self.meta["k1"]
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.postings[term_id]), int(self.postings[term_id + 1])
+            rows = np.asarray(self.posting_rows[start:end])
+            tf = np.asarray(self.posting_tf[start:end], dtype=np.float32)
+            df = end - start
+            idf = np.log(1.0 + (count - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tf * (k1 + 1) / (tf + self.norms[rows])
+
+        mask = self.allowed_rows(constraints or QueryConstraints())
+        if mask is not None:
+            scores[~mask] = 0.0
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.ids[row], float(scores[row])) for row in matched]
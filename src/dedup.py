@@ -0,0 +1,199 @@
+"""
+Near-duplicate chunk elimination for process_documents.py.
+
+The corpus repeats itself: the combined 1977-2002 archive overlaps the
+individual 1999-2002 letters, and running headers/footers appear on every
+page. Two passes remove that before anything is embedded:
+
+1. strip_repeated_lines drops header/footer lines that recur at the top or
+   bottom of many pages of the same file.
+2. DedupIndex fingerprints every chunk with a 64-bit SimHash over word
+   3-shingles and drops chunks within SIMHASH_THRESHOLD bits of a chunk that
+   is already indexed. Candidates are found with 4 x 16-bit bands, which by
+   pigeonhole catches every pair within 3 bits.
+
+The index is persisted next to the vector store. It also remembers which
+kept chunk each dropped chunk duplicated, so when that chunk is deleted the
+file that lost a duplicate can be re-processed.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+DEDUP_INDEX_FILENAME = "dedup_index.json"
+# Bumped when fingerprints change; an index of another format is discarded
+DEDUP_FORMAT = 1
+SIMHASH_BITS = 64
+SIMHASH_THRESHOLD = 3       # Max differing bits for two chunks to count as near-duplicates
+BANDS = 4                   # BANDS > SIMHASH_THRESHOLD guarantees no missed pairs
+SHINGLE_WORDS = 3
+MIN_WORDS = 8               # Shorter chunks are too small to fingerprint reliably
+
+# Header/footer detection: lines seen at the top/bottom of at least this many
+# pages (and this fraction of a file's pages) are treated as boilerplate
+EDGE_LINES = 2
+MIN_REPEATS = 3
+MIN_REPEAT_FRACTION = 0.5
+
+WORD_RE = re.compile(r"\w+")
+DIGITS_RE = re.compile(r"\d+")
+
+
+def simhash(text: str):
+    """64-bit SimHash of the word 3-shingles of `text`, or None if the text is too short."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles],
+        dtype=">u8",
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1)
+    # Signed: unsigned sums would wrap around instead of going negative for minority bits
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    return int("".join("1" if v > 0 else "0" for v in votes), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _edge_key(line: str) -> str:
+    """Page numbers differ page to page; compare header/footer lines with digits masked."""
+    return DIGITS_RE.sub("#", " ".join(line.lower().split()))
+
+
+def _edge_positions(count: int) -> list[int]:
+    """Positions of the top and bottom EDGE_LINES of `count` content lines; never the middle of a short page."""
+    edge = min(EDGE_LINES, count // 2)
+    return list(range(edge)) + list(range(count - edge, count))
+
+
+def strip_repeated_lines(documents: list) -> tuple[list, int]:
+    """
+    Removes running headers/footers from a run of pages of the same file.
+    Returns (documents, number of lines removed). Documents are modified in place.
+    """
+    if len(documents) < MIN_REPEATS:
+        return documents, 0
+
+    counts = Counter()
+    for doc in documents:
+        lines = [line for line in doc.page_content.splitlines() if line.strip()]
+        counts.update({_edge_key(lines[i]) for i in _edge_positions(len(lines))})
+    needed = max(MIN_REPEATS, MIN_REPEAT_FRACTION * len(documents))
+    boilerplate = {key for key, count in counts.items() if count >= needed}
+    if not boilerplate:
+        return documents, 0
+
+    removed = 0
+    for doc in documents:
+        lines = doc.page_content.splitlines()
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        edge_idx = {content[i] for i in _edge_positions(len(content))}
+        drop = {i for i in edge_idx if _edge_key(lines[i]) in boilerplate}
+        removed += len(drop)
+        doc.page_content = "\n".join(line for i, line in enumerate(lines) if i not in drop)
+    return documents, removed
+
+
+class DedupIndex:
+    """
+    SimHash fingerprints of every chunk in the store, with banded lookup.
+
+    kept:    {chunk_id: fingerprint}           chunks that were embedded
+    dropped: {source: {chunk_id: kept_id}}     near-duplicates that were skipped
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.kept = {}
+        self.dropped = {}
+        self._bands = [dict() for _ in range(BANDS)]
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("format") != DEDUP_FORMAT:
+                return
+            self.dropped = data.get("dropped", {})
+            for chunk_id, fingerprint in data.get("kept", {}).items():
+                self._add(chunk_id, int(fingerprint, 16))
+
+    def _band_keys(self, fingerprint: int):
+        width = SIMHASH_BITS // BANDS
+        mask = (1 << width) - 1
+        return [(fingerprint >> (i * width)) & mask for i in range(BANDS)]
+
+    def _add(self, chunk_id: str, fingerprint: int):
+        self.kept[chunk_id] = fingerprint
+        for band, key in zip(self._bands, self._band_keys(fingerprint)):
+            band.setdefault(key, set()).add(chunk_id)
+
+    def find_duplicate(self, fingerprint: int):
+        """Returns the ID of an indexed chunk within SIMHASH_THRESHOLD bits, or None."""
+        for band, key in zip(self._bands, self._band_keys(fingerprint)):
+            for candidate in band.get(key, ()):
+                if hamming(fingerprint, self.kept[candidate]) <= SIMHASH_THRESHOLD:
+                    return candidate
+        return None
+
+    def check(self, source: str, chunk_id: str, text: str):
+        """
+        Registers a chunk. Returns the ID of the kept chunk it duplicates (and
+        records the drop), or None if it is new and should be embedded.
+        """
+        if chunk_id in self.kept:
+            return None
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return None
+        duplicate_of = self.find_duplicate(fingerprint)
+        if duplicate_of is not None:
+            self.dropped.setdefault(source, {})[chunk_id] = duplicate_of
+            return duplicate_of
+        self._add(chunk_id, fingerprint)
+        return None
+
+    def register(self, chunk_id: str, text: str):
+        """Adds an already-stored chunk (e.g. one resumed from a checkpoint) to the index."""
+        if chunk_id not in self.kept:
+            fingerprint = simhash(text)
+            if fingerprint is not None:
+                self._add(chunk_id, fingerprint)
+
+    def reset_source(self, source: str):
+        """Forgets the drops recorded for a file that is about to be re-processed."""
+        self.dropped.pop(source, None)
+
+    def forget(self, chunk_ids):
+        """Removes deleted chunks from the index."""
+        for chunk_id in chunk_ids:
+            fingerprint = self.kept.pop(chunk_id, None)
+            if fingerprint is None:
+                continue
+            for band, key in zip(self._bands, self._band_keys(fingerprint)):
+                band.get(key, set()).discard(chunk_id)
+
+    def dependents_of(self, chunk_ids) -> set:
+        """Sources that dropped a chunk as a duplicate of any of `chunk_ids`."""
+        chunk_ids = set(chunk_ids)
+        return {
+            source for source, drops in self.dropped.items()
+            if any(kept_id in chunk_ids for kept_id in drops.values())
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "format": DEDUP_FORMAT,
+                "kept": {chunk_id: f"{fp:016x}" for chunk_id, fp in self.kept.items()},
+                "dropped": self.dropped,
+            }, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,147 @@
+"""
+Persistent on-disk embedding cache.
+
+CachedEmbeddings wraps any LangChain Embeddings (HuggingFaceEmbeddings,
+ParallelEmbedder, ...) and reads through a SQLite table of float32 vectors
+keyed by (embedding model name, SHA-256 of the whitespace-normalized text).
+Chunks that are byte-identical to a previous build, e.g. after a
+CHUNK_SIZE/CHUNK_OVERLAP experiment, are never embedded twice.
+
+The cache lives outside the vector store directory so `--rebuild` keeps it.
+It is bounded by `max_entries`; the least recently used vectors are evicted.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = "../knowledge_base/embedding_cache.sqlite3"
+# ~1.6 KB per 384-dim vector, so the default bound is roughly 400 MB on disk
+MAX_CACHE_ENTRIES = 250_000
+# Fraction of max_entries kept after an eviction pass (avoids evicting on every insert)
+EVICT_TO_FRACTION = 0.9
+# SQLite limits the number of bound parameters per statement
+LOOKUP_BATCH_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalizes and collapses whitespace so trivially different copies share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Read-through embedding cache. Misses are embedded by `inner` in one call
+    and written back; `hits` and `misses` count texts served from / added to
+    the cache. Safe to share across threads (e.g. Streamlit sessions).
+    """
+
+    def __init__(self, inner: Embeddings, model_name: str, path: str = EMBEDDING_CACHE_PATH,
+                 max_entries: int = MAX_CACHE_ENTRIES):
+        self.inner = inner
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def _lookup(self, model: str, hashes: list[str]) -> dict:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+                batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                found.update((h, np.frombuffer(blob, dtype=np.float32).tolist()) for h, blob in rows)
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash IN ({placeholders})",
+                    [now, model, *batch],
+                )
+            self._conn.commit()
+        return found
+
+    def _store(self, model: str, items: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes(), now) for h, v in items.items()],
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * EVICT_TO_FRACTION)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+
+    def _embed(self, model: str, texts: list[str], embed_fn) -> list[list[float]]:
+        hashes = [text_hash(text) for text in texts]
+        cached = self._lookup(model, list(dict.fromkeys(hashes)))
+
+        missing = {}
+        for text, h in zip(texts, hashes):
+            if h not in cached and h not in missing:
+                missing[h] = text
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            new_items = dict(zip(missing, vectors))
+            self._store(model, new_items)
+            cached.update(new_items)
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [list(cached[h]) for h in hashes]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._embed(self.model_name, texts, self.inner.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        # Queries get their own namespace: some models embed queries differently from documents
+        return self._embed(f"{self.model_name}#query", [text],
+                           lambda texts: [self.inner.embed_query(texts[0])])[0]
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
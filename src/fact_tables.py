@@ -0,0 +1,292 @@
+"""
+Structured facts extracted from the annual letters, for instant numeric answers.
+
+Every annual letter opens with "Berkshire's Performance vs. the S&P 500": one
+row per year with the annual percentage change in per-share book value
+and/or per-share market value, and in the S&P 500 with dividends included.
+Questions such as "what was Berkshire's per-share book value gain in 1985?"
+are answered straight from these rows instead of going through retrieval and
+two LLM calls.
+
+At ingestion extract_performance_facts reads the rows from tagged pages and
+the build stores them in a small SQLite table inside the vector store
+version (so it is published, snapshotted and exported together with it):
+
+    facts(year, metric, value, source, page, letter_year)
+
+Each letter repeats the whole history; lookups use the most recent letter
+that reports a figure. The column layout changed over the years, so it is
+inferred per table:
+
+    year  book value  S&P 500  relative      (to 2014; relative = book - S&P)
+    year  book value  market value  S&P 500  (2015-2018)
+    year  market value  S&P 500              (2019 on)
+
+At query time instant_answer recognizes numeric questions about those
+figures for specific years and formats the answer with a citation, or
+returns None so the query takes the normal RAG path.
+"""
+import os
+import re
+import sqlite3
+from collections import Counter
+from dataclasses import dataclass
+
+from index_versions import current_path
+from source_metadata import RANGE_RE, YEAR_RE
+
+FACT_TABLE_FILENAME = "fact_tables.sqlite3"
+# Bumped whenever extraction changes, so the next build re-extracts every letter
+FACT_TABLE_VERSION = 1
+
+BOOK_VALUE = "book_value"
+MARKET_VALUE = "market_value"
+SP500 = "sp500"
+METRICS = (BOOK_VALUE, MARKET_VALUE, SP500)
+METRIC_LABELS = {
+    BOOK_VALUE: "per-share book value",
+    MARKET_VALUE: "per-share market value",
+    SP500: "S&P 500 (with dividends included)",
+}
+TABLE_TITLE = "Berkshire's Performance vs. the S&P 500"
+
+# A table row: the year, dot leaders, then 2-3 percentages; "(26.4)" is negative
+ROW_RE = re.compile(
+    r"^\s*(19[6-9]\d|20[0-4]\d)\s*[.·… ]*\s+"
+    r"((?:\(?[-–−]?\d{1,3}(?:,\d{3})*(?:\.\d+)?\)?%?\s+){1,2}\(?[-–−]?\d{1,3}(?:,\d{3})*(?:\.\d+)?\)?%?)\s*$"
+)
+NUMBER_RE = re.compile(r"(\()?([-–−])?(\d{1,3}(?:,\d{3})*(?:\.\d+)?)\)?")
+TABLE_PAGE_RE = re.compile(r"S&P\s*500", re.IGNORECASE)
+TABLE_HEADER_RE = re.compile(r"per[-\s]share|performance vs", re.IGNORECASE)
+# Fewer rows than this on a page is prose that happens to start lines with years
+MIN_TABLE_ROWS = 5
+# Rounding slack when checking relative = book value - S&P 500
+RELATIVE_TOLERANCE = 0.15
+
+QUERY_METRIC_PATTERNS = [
+    (re.compile(r"book[-\s]value", re.IGNORECASE), BOOK_VALUE),
+    (re.compile(r"market[-\s]value|(?:stock|share) price|stock (?:return|performance|gain)", re.IGNORECASE),
+     MARKET_VALUE),
+    (re.compile(r"s\s*&\s*p|standard (?:and|&) poor", re.IGNORECASE), SP500),
+]
+NUMERIC_CUE_RE = re.compile(
+    r"%|\b(?:gains?|gained|change[ds]?|returns?|returned|increase[ds]?|rise|rose|fall|fell|drop(?:ped)?|"
+    r"declined?|grow|grew|growth|up|down|performance|perform(?:ed)?|percent(?:age)?|how much|beat|"
+    r"outperform\w*|underperform\w*|vs\.?|versus|compare\w*)\b",
+    re.IGNORECASE,
+)
+SUBJECT_RE = re.compile(r"berkshire|\bbrk\b|per[-\s]share|book[-\s]value|s\s*&\s*p", re.IGNORECASE)
+# Questions asking for reasons need the letters' prose, not the number
+EXPLANATION_RE = re.compile(r"\b(?:why|explain\w*|reasons?|because|what caused)\b", re.IGNORECASE)
+# More years than this is a trend question for the LLM
+MAX_QUERY_YEARS = 5
+
+
+@dataclass
+class Fact:
+    year: int
+    metric: str
+    value: float          # annual change in percent
+    source: str
+    page: int             # 0-based, as stored in the chunk metadata
+    letter_year: int
+
+
+@dataclass
+class FactQuery:
+    years: tuple
+    metrics: tuple
+
+
+def _parse_number(token: str) -> float:
+    match = NUMBER_RE.fullmatch(token.rstrip("%"))
+    value = float(match.group(3).replace(",", ""))
+    return -value if match.group(1) or match.group(2) else value
+
+
+def _table_rows(text: str) -> list[tuple[int, list[float]]]:
+    rows = []
+    for line in text.splitlines():
+        match = ROW_RE.match(line)
+        if match:
+            rows.append((int(match.group(1)), [_parse_number(t) for t in match.group(2).split()]))
+    return rows
+
+
+def _columns(text: str, rows: list) -> tuple:
+    """Metric of each value column for a table with the given rows."""
+    width = Counter(len(values) for _, values in rows).most_common(1)[0][0]
+    if width == 3:
+        relative = sum(1 for _, v in rows if len(v) == 3 and abs(v[0] - v[1] - v[2]) <= RELATIVE_TOLERANCE)
+        if relative * 2 >= len(rows):
+            return BOOK_VALUE, SP500, None
+        return BOOK_VALUE, MARKET_VALUE, SP500
+    if re.search(r"market value", text, re.IGNORECASE) and not re.search(r"book value", text, re.IGNORECASE):
+        return MARKET_VALUE, SP500
+    return BOOK_VALUE, SP500
+
+
+def extract_performance_facts(documents: list) -> list[Fact]:
+    """
+    Facts from every performance table on the given pages. Pages must carry
+    the SourceTagger metadata; year_start tells which letter a page belongs to.
+    """
+    facts = []
+    for doc in documents:
+        text = doc.page_content
+        if not (TABLE_PAGE_RE.search(text) and TABLE_HEADER_RE.search(text)):
+            continue
+        rows = _table_rows(text)
+        if len(rows) < MIN_TABLE_ROWS:
+            continue
+        columns = _columns(text, rows)
+        letter_year = doc.metadata.get("year_start") or max(year for year, _ in rows)
+        for year, values in rows:
+            if len(values) != len(columns) or year > letter_year:
+                continue
+            facts.extend(
+                Fact(year, metric, value, doc.metadata.get("source", ""), doc.metadata.get("page", 0), letter_year)
+                for metric, value in zip(columns, values) if metric
+            )
+    return facts
+
+
+class FactTable:
+    """SQLite table of extracted facts, replaced per source file like the index manifest."""
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS facts ("
+            " year INTEGER NOT NULL, metric TEXT NOT NULL, value REAL NOT NULL,"
+            " source TEXT NOT NULL, page INTEGER NOT NULL, letter_year INTEGER NOT NULL,"
+            " PRIMARY KEY (source, letter_year, year, metric))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS facts_lookup ON facts (year, metric, letter_year)")
+        self._conn.commit()
+
+    def is_current(self) -> bool:
+        """Whether the table was filled by this version of the extractor."""
+        return self._conn.execute("PRAGMA user_version").fetchone()[0] == FACT_TABLE_VERSION
+
+    def reset(self):
+        """Empties the table and stamps it with the current extractor version."""
+        with self._conn:
+            self._conn.execute("DELETE FROM facts")
+            self._conn.execute(f"PRAGMA user_version = {FACT_TABLE_VERSION}")
+
+    def replace_source(self, source: str, facts: list[Fact]):
+        with self._conn:
+            self._conn.execute("DELETE FROM facts WHERE source = ?", (source,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO facts (year, metric, value, source, page, letter_year) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(f.year, f.metric, f.value, source, f.page, f.letter_year) for f in facts],
+            )
+
+    def remove_source(self, source: str):
+        self.replace_source(source, [])
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+
+    def lookup(self, year: int, metrics=METRICS) -> dict:
+        """{metric: Fact} for `year`, each from the most recent letter reporting it."""
+        found = {}
+        for metric in metrics:
+            row = self._conn.execute(
+                "SELECT value, source, page, letter_year FROM facts WHERE year = ? AND metric = ? "
+                "ORDER BY letter_year DESC, source LIMIT 1",
+                (year, metric),
+            ).fetchone()
+            if row:
+                found[metric] = Fact(year, metric, *row)
+        return found
+
+    def close(self):
+        self._conn.close()
+
+
+def parse_fact_query(query: str):
+    """The years and metrics a numeric performance question asks about, or None."""
+    if EXPLANATION_RE.search(query) or RANGE_RE.search(query):
+        return None
+    if not (SUBJECT_RE.search(query) and NUMERIC_CUE_RE.search(query)):
+        return None
+    years = tuple(sorted({int(y) for y in YEAR_RE.findall(query)}))
+    if not years or len(years) > MAX_QUERY_YEARS:
+        return None
+
+    metrics = [metric for pattern, metric in QUERY_METRIC_PATTERNS if pattern.search(query)]
+    about_berkshire = re.search(r"berkshire|\bbrk\b|per[-\s]share", query, re.IGNORECASE)
+    if not metrics and not about_berkshire:
+        return None
+    if not metrics or metrics == [SP500] and about_berkshire:
+        # "How did Berkshire do vs. the S&P in 1999?" -> the whole row
+        metrics = list(METRICS)
+    return FactQuery(years=years, metrics=tuple(m for m in METRICS if m in metrics))
+
+
+def _cite(fact: Fact) -> str:
+    return f"{os.path.basename(fact.source)}, p. {fact.page + 1}"
+
+
+def format_answer(fact_query: FactQuery, table: FactTable):
+    """Markdown answer with citations, or None if the table has none of the figures."""
+    lines, citations = [], []
+    for year in fact_query.years:
+        facts = table.lookup(year, fact_query.metrics)
+        if not facts:
+            lines.append(f"- **{year}:** not reported in the performance table")
+            continue
+        parts = [f"{METRIC_LABELS[m]} {facts[m].value:+.1f}%" for m in fact_query.metrics if m in facts]
+        line = f"- **{year}:** " + ", ".join(parts)
+        berkshire = facts.get(BOOK_VALUE) or facts.get(MARKET_VALUE)
+        if berkshire and SP500 in facts:
+            gap = berkshire.value - facts[SP500].value
+            line += (f" ({METRIC_LABELS[berkshire.metric]} {'beat' if gap >= 0 else 'trailed'} "
+                     f"the S&P 500 by {abs(gap):.1f} points)")
+        lines.append(line)
+        for fact in facts.values():
+            if _cite(fact) not in citations:
+                citations.append(_cite(fact))
+    if not citations:
+        return None
+    return (
+        f"**Instant answer from {TABLE_TITLE}** (annual percentage change):\n\n"
+        + "\n".join(lines)
+        + f"\n\n📎 Source: \"{TABLE_TITLE}\" table, " + "; ".join(citations)
+    )
+
+
+def instant_answer(query: str, root: str):
+    """Answers a numeric performance question from the published fact table, or returns None."""
+    fact_query = parse_fact_query(query)
+    if fact_query is None:
+        return None
+    path = os.path.join(current_path(root), FACT_TABLE_FILENAME)
+    if not os.path.exists(path):
+        return None
+    table = FactTable(path, readonly=True)
+    try:
+        return format_answer(fact_query, table)
+    finally:
+        table.close()
+
+
+def table_is_current(path: str) -> bool:
+    """Whether a fact table exists at `path` and was filled by this version of the extractor."""
+    if not os.path.exists(path):
+        return False
+    table = FactTable(path, readonly=True)
+    try:
+        return table.is_current()
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        table.close()
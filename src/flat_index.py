@@ -0,0 +1,141 @@
+"""
+Memory-mapped flat index: exact search over one contiguous matrix.
+
+For a corpus of a few thousand to tens of thousands of chunks, a brute-force
+matrix multiply over normalized vectors is both exact and faster than a
+Chroma query (no client round trip, no SQLite metadata reads). Everything is
+memory-mapped read-only, so loading is a few mmap calls and every process
+serving the index (Streamlit sessions, the CLI, workers) shares the same
+pages from the OS page cache. Files, under <version>/flat/:
+
+    meta.json       {"format", "count", "dim"}
+    vectors.f32     float32 (count, dim), L2-normalized rows, raw (no header)
+    chunks.jsonl    one {"id", "text", "metadata"} record per row
+    offsets.npy     int64 (count + 1,): byte offset of each record in chunks.jsonl
+
+search_batch scores a block of queries with one matrix multiply per block of
+SEARCH_BLOCK_ROWS rows and keeps a running top-k, so memory stays bounded for
+any corpus size. Built by `process_documents.py --engine flat`.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+from langchain_core.documents import Document
+
+from store_vectors import StoreVectors, normalize
+
+FLAT_DIRNAME = "flat"
+FLAT_FORMAT = 1
+# Rows scored per matrix multiply
+SEARCH_BLOCK_ROWS = 65536
+
+
+def write_chunk_records(out_dir: str, store: StoreVectors, order=None):
+    """Writes chunks.jsonl and offsets.npy for the rows of `store` (in `order`, default row order)."""
+    order = range(len(store)) if order is None else order
+    offsets = np.zeros(len(store) + 1, dtype=np.int64)
+    with open(os.path.join(out_dir, "chunks.jsonl"), "wb") as f:
+        for position, row in enumerate(order):
+            record = {"id": store.ids[row], "text": store.documents[row], "metadata": store.metadatas[row] or {}}
+            f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            offsets[position + 1] = f.tell()
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+
+
+class ChunkRecords:
+    """Memory-mapped chunks.jsonl + offsets.npy, read one record at a time."""
+
+    def __init__(self, path: str):
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.records = (np.memmap(os.path.join(path, "chunks.jsonl"), dtype=np.uint8, mode="r")
+                        if len(self.offsets) > 1 else np.empty(0, dtype=np.uint8))
+
+    def close(self):
+        """Drops the memory maps; a file is unmapped once no array taken from it is left."""
+        self.offsets = self.records = None
+
+    def record(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self.records[start:end].tobytes().decode("utf-8"))
+
+    def documents(self, rows: list[int]) -> list[Document]:
+        """Documents for the given rows, in the same order."""
+        documents = []
+        for row in rows:
+            record = self.record(row)
+            documents.append(Document(page_content=record["text"], metadata=record["metadata"]))
+        return documents
+
+
+def build_flat_index(store: StoreVectors, out_dir: str) -> dict:
+    """Writes the vectors, texts and metadata of `store` as a FlatIndex; returns its meta."""
+    vectors = normalize(store.vectors)
+    count, dim = vectors.shape if len(store) else (0, 0)
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    vectors.tofile(os.path.join(tmp_dir, "vectors.f32"))
+    write_chunk_records(tmp_dir, store)
+
+    meta = {"format": FLAT_FORMAT, "count": count, "dim": dim}
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(tmp_dir, out_dir)
+    return meta
+
+
+class FlatIndex:
+    """Read-only view of an index written by build_flat_index; search() returns [(row, score)]."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FLAT_FORMAT:
+            raise ValueError(f"Unsupported flat index format {self.meta.get('format')} in {path}")
+        count, dim = self.meta["count"], self.meta["dim"]
+        self.vectors = (np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+                        if count else np.empty((0, dim), dtype=np.float32))
+        self.chunks = ChunkRecords(path)
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def close(self):
+        """Drops the memory maps; a file is unmapped once no array taken from it is left."""
+        self.vectors = None
+        self.chunks.close()
+
+    def search_batch(self, query_vectors, k: int = 4) -> list[list[tuple[int, float]]]:
+        """Exact cosine top-k for each query: [[(row, score), ...], ...], best first."""
+        queries = normalize(np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)))
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in queries]
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            scores = queries @ self.vectors[start:start + SEARCH_BLOCK_ROWS].T
+            rows = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [[(int(r), float(s)) for r, s in zip(rows, scores)] for rows, scores in zip(best_rows, best_scores)]
+
+    def search(self, query_vector, k: int = 4) -> list[tuple[int, float]]:
+        return self.search_batch([query_vector], k)[0]
+
+    def documents(self, rows: list[int]) -> list[Document]:
+        """Documents for rows returned by search, in the same order."""
+        return self.chunks.documents(rows)
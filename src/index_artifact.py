@@ -0,0 +1,216 @@
+"""
+Portable, prebuilt index artifacts.
+
+`export` packs the published vector store version (Chroma files, index
+manifest, dedup index, ...) into one gzipped tar together with artifact.json:
+
+    {"format": 1, "version": ..., "built_at": ..., "embedding_model": ...,
+     "embedding_dimension": 384, "index_config": {...},
+     "corpus": {source: sha256}, "files": {path: {"size": ..., "sha256": ...}}}
+
+and writes `<artifact>.sha256` next to it. `import` verifies the archive
+checksum and every file's hash, checks the embedding model matches the one
+this checkout queries with, then installs the store as a new published
+version (see index_versions.py), so a running app switches to it at once.
+
+Usage (from src/):
+    python index_artifact.py export [--output PATH]
+    python index_artifact.py verify ARTIFACT
+    python index_artifact.py import ARTIFACT [--force]
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from datetime import datetime, timezone
+
+from index_manifest import CHECKPOINT_FILENAME, MANIFEST_FILENAME, file_sha256
+from index_versions import current_path, publish, read_current, staging_path
+
+ARTIFACT_FORMAT = 1
+ARTIFACT_MANIFEST = "artifact.json"
+ARTIFACT_INDEX_DIR = "index"
+ARTIFACTS_DIR = "../knowledge_base/artifacts"
+
+
+class ArtifactError(Exception):
+    """The artifact is corrupt, tampered with, or incompatible with this checkout."""
+
+
+def checksum_path(artifact_path: str) -> str:
+    return f"{artifact_path}.sha256"
+
+
+def _index_files(index_dir: str) -> dict:
+    """{relative path: {"size", "sha256"}} for every file of a store (interrupted-run state excluded)."""
+    files = {}
+    for dirpath, _, filenames in os.walk(index_dir):
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(path, index_dir).replace(os.sep, "/")
+            if name == CHECKPOINT_FILENAME or name.endswith(".tmp"):
+                continue
+            files[rel_path] = {"size": os.path.getsize(path), "sha256": file_sha256(path)}
+    return dict(sorted(files.items()))
+
+
+def export_index(root: str, output_path: str, embedding_model: str, embedding_dimension: int) -> dict:
+    """Packs the published store under `root` into `output_path`; returns the artifact manifest."""
+    index_dir = current_path(root)
+    index_manifest_path = os.path.join(index_dir, MANIFEST_FILENAME)
+    if not os.path.exists(index_manifest_path):
+        raise ArtifactError(f"No published index with a manifest under {root}; run process_documents.py first")
+    with open(index_manifest_path) as f:
+        index_manifest = json.load(f)
+
+    pointer = read_current(root)
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "version": pointer.get("version"),
+        "built_at": pointer.get("published_at"),
+        "exported_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "embedding_model": embedding_model,
+        "embedding_dimension": embedding_dimension,
+        "index_config": index_manifest.get("config", {}),
+        "corpus": {source: entry["sha256"] for source, entry in sorted(index_manifest.get("files", {}).items())},
+        "files": _index_files(index_dir),
+    }
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with tarfile.open(tmp_path, "w:gz") as tar:
+        manifest_bytes = json.dumps(manifest, indent=2).encode("utf-8")
+        info = tarfile.TarInfo(ARTIFACT_MANIFEST)
+        info.size = len(manifest_bytes)
+        info.mtime = int(datetime.now(timezone.utc).timestamp())
+        tar.addfile(info, io.BytesIO(manifest_bytes))
+        for rel_path in manifest["files"]:
+            tar.add(os.path.join(index_dir, rel_path), arcname=f"{ARTIFACT_INDEX_DIR}/{rel_path}")
+    os.replace(tmp_path, output_path)
+
+    with open(checksum_path(output_path), "w") as f:
+        f.write(f"{file_sha256(output_path)}  {os.path.basename(output_path)}\n")
+    return manifest
+
+
+def _safe_members(tar: tarfile.TarFile) -> list:
+    """Regular files and directories that stay inside the extraction directory."""
+    members = []
+    for member in tar.getmembers():
+        name = os.path.normpath(member.name)
+        if os.path.isabs(name) or name.startswith(".."):
+            raise ArtifactError(f"Unsafe path in artifact: {member.name}")
+        if not (member.isfile() or member.isdir()):
+            raise ArtifactError(f"Unsupported entry in artifact: {member.name}")
+        members.append(member)
+    return members
+
+
+def verify_artifact(artifact_path: str, expected_sha256: str = None, extract_to: str = None) -> dict:
+    """
+    Checks the archive checksum (from `expected_sha256` or the .sha256 file)
+    and every file's hash; returns the artifact manifest. With `extract_to`,
+    the verified files are left extracted there.
+    """
+    if expected_sha256 is None and os.path.exists(checksum_path(artifact_path)):
+        with open(checksum_path(artifact_path)) as f:
+            expected_sha256 = f.read().split()[0]
+    if expected_sha256 is not None and file_sha256(artifact_path) != expected_sha256:
+        raise ArtifactError(f"Checksum mismatch for {artifact_path}")
+
+    workdir = extract_to or tempfile.mkdtemp(prefix="index_artifact_")
+    try:
+        with tarfile.open(artifact_path, "r:gz") as tar:
+            members = _safe_members(tar)
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(workdir, members=members, filter="data")
+            else:
+                tar.extractall(workdir, members=members)
+        with open(os.path.join(workdir, ARTIFACT_MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != ARTIFACT_FORMAT:
+            raise ArtifactError(f"Unsupported artifact format {manifest.get('format')}")
+
+        index_dir = os.path.join(workdir, ARTIFACT_INDEX_DIR)
+        extracted = {path: entry["sha256"] for path, entry in _index_files(index_dir).items()}
+        expected = {path: entry["sha256"] for path, entry in manifest["files"].items()}
+        if extracted != expected:
+            bad = sorted(p for p in set(extracted) | set(expected) if extracted.get(p) != expected.get(p))
+            raise ArtifactError(f"Files missing, extra or modified in artifact: {', '.join(bad)}")
+        return manifest
+    except (tarfile.TarError, OSError, KeyError, json.JSONDecodeError) as e:
+        raise ArtifactError(f"Unreadable artifact {artifact_path}: {e}") from e
+    finally:
+        if extract_to is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def import_index(artifact_path: str, root: str, embedding_model: str = None, expected_sha256: str = None,
+                 force: bool = False) -> str:
+    """
+    Verifies an artifact and publishes it as a new version of the store under
+    `root`. Refuses artifacts built with a different embedding model, and an
+    in-progress build in staging unless `force`. Returns the new version.
+    """
+    staging = staging_path(root)
+    if os.path.exists(staging):
+        if not force:
+            raise ArtifactError(f"{staging} holds an unfinished build; pass --force to discard it")
+        shutil.rmtree(staging)
+
+    os.makedirs(root, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix=".import_", dir=root)
+    try:
+        manifest = verify_artifact(artifact_path, expected_sha256, extract_to=workdir)
+        if embedding_model and manifest["embedding_model"] != embedding_model:
+            raise ArtifactError(
+                f"Artifact was built with {manifest['embedding_model']}, but queries use {embedding_model}"
+            )
+        os.rename(os.path.join(workdir, ARTIFACT_INDEX_DIR), staging)
+        return publish(root)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    from process_documents import EMBEDDING_DIMENSION, EMBEDDING_MODEL_NAME, VECTOR_DB_PATH
+
+    parser = argparse.ArgumentParser(description="Export or import a prebuilt Buffett's Brain index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_cmd = commands.add_parser("export", help="Pack the published index into a checksummed artifact")
+    export_cmd.add_argument("--output", help=f"Artifact path (default: {ARTIFACTS_DIR}/index_<version>.tar.gz)")
+    verify_cmd = commands.add_parser("verify", help="Check an artifact without installing it")
+    verify_cmd.add_argument("artifact")
+    verify_cmd.add_argument("--sha256", help="Expected archive checksum (default: read ARTIFACT.sha256)")
+    import_cmd = commands.add_parser("import", help="Verify an artifact and publish it as the current index")
+    import_cmd.add_argument("artifact")
+    import_cmd.add_argument("--sha256", help="Expected archive checksum (default: read ARTIFACT.sha256)")
+    import_cmd.add_argument("--force", action="store_true", help="Discard an unfinished build in staging")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            version = read_current(VECTOR_DB_PATH).get("version", "legacy")
+            output = args.output or os.path.join(ARTIFACTS_DIR, f"index_{version}.tar.gz")
+            manifest = export_index(VECTOR_DB_PATH, output, EMBEDDING_MODEL_NAME, EMBEDDING_DIMENSION)
+            size_mb = os.path.getsize(output) / 1e6
+            print(f"📦 Exported index version {version}: {len(manifest['corpus'])} source files, "
+                  f"{len(manifest['files'])} index files, {size_mb:.1f} MB → {output}")
+            print(f"   Checksum written to {checksum_path(output)}")
+        elif args.command == "verify":
+            manifest = verify_artifact(args.artifact, args.sha256)
+            print(f"✅ {args.artifact} is intact: version {manifest['version']} built {manifest['built_at']} "
+                  f"with {manifest['embedding_model']} ({len(manifest['corpus'])} source files)")
+        else:
+            version = import_index(args.artifact, VECTOR_DB_PATH, EMBEDDING_MODEL_NAME, args.sha256, args.force)
+            print(f"✅ Imported and published index version {version} in {VECTOR_DB_PATH}")
+    except ArtifactError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Health report and compaction for the published Chroma store.
+
+The report covers:
+
+  * chunks per collection and per source file, checked against the index
+    manifest: orphaned chunks (in the store, not in the manifest) and missing
+    chunks (in the manifest, not in the store)
+  * on-disk size of the metadata DB, its write-ahead log and each segment
+  * SQLite fragmentation (free pages) and the size of Chroma's embeddings queue
+  * HNSW segment state: elements ever added vs. live vectors (deleted vectors
+    stay in the graph as tombstones until it is rebuilt)
+  * cold load time: opening the store and running a first query
+
+`--compact` copies the live vectors (no re-embedding) into a fresh store,
+which rebuilds the HNSW graph without tombstones, vacuums its SQLite DB and
+publishes it as a new version (see index_versions.py), so running apps
+switch to it without downtime.
+
+Usage (from src/):
+    python index_health.py
+    python index_health.py --json report.json
+    python index_health.py --compact
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import time
+import uuid
+from collections import Counter
+
+from index_manifest import CHECKPOINT_FILENAME, MANIFEST_FILENAME
+from index_versions import current_path, publish, staging_path
+from store_vectors import collection_names, iter_collection_rows
+
+CHROMA_DB_FILENAME = "chroma.sqlite3"
+HNSW_METADATA_FILENAME = "index_metadata.pickle"
+# Fragmentation or tombstone share above which the report recommends --compact
+COMPACT_THRESHOLD = 0.2
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, _, names in os.walk(path) for name in names)
+
+
+def _is_segment_dir(name: str) -> bool:
+    """Chroma names segment directories by UUID; other directories are ours (engines, ...)."""
+    try:
+        uuid.UUID(name)
+        return True
+    except ValueError:
+        return False
+
+
+def sqlite_stats(db_path: str) -> dict:
+    """Page usage of Chroma's metadata DB, read without taking a write lock."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        queue_rows = (conn.execute("SELECT COUNT(*) FROM embeddings_queue").fetchone()[0]
+                      if "embeddings_queue" in tables else None)
+    finally:
+        conn.close()
+    wal_path = f"{db_path}-wal"
+    return {
+        "bytes": os.path.getsize(db_path),
+        "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        "page_size": page_size,
+        "pages": page_count,
+        "free_pages": free_pages,
+        "fragmentation": free_pages / max(page_count, 1),
+        "queue_rows": queue_rows,
+    }
+
+
+def segment_stats(store_dir: str) -> dict:
+    """Size and HNSW bookkeeping of every vector segment directory."""
+    segments = {}
+    for name in sorted(os.listdir(store_dir)):
+        path = os.path.join(store_dir, name)
+        if not (os.path.isdir(path) and _is_segment_dir(name)):
+            continue
+        stats = {"bytes": _dir_bytes(path), "elements_added": None, "live_labels": None}
+        metadata_path = os.path.join(path, HNSW_METADATA_FILENAME)
+        if os.path.exists(metadata_path):
+            try:
+                # Written by Chroma itself for its persistent HNSW segments
+                with open(metadata_path, "rb") as f:
+                    metadata = pickle.load(f)
+                metadata = metadata if isinstance(metadata, dict) else vars(metadata)
+                stats["elements_added"] = metadata.get("total_elements_added")
+                stats["live_labels"] = len(metadata.get("id_to_label", {}))
+            except Exception as e:
+                stats["error"] = f"{type(e).__name__}: {e}"
+        segments[name] = stats
+    return segments
+
+
+def collection_stats(store_dir: str) -> dict:
+    """Chunk counts per collection and source, plus the cold load time of the store."""
+    import chromadb
+
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=store_dir)
+    collections = {}
+    load_seconds = None
+    for name in collection_names(client):
+        collection = client.get_collection(name)
+        ids, per_source = [], Counter()
+        for rows in iter_collection_rows(collection, ["metadatas"]):
+            ids.extend(rows["ids"])
+            per_source.update((m or {}).get("source", "<none>") for m in rows["metadatas"])
+        if ids and load_seconds is None:
+            # The first query loads the HNSW graph from disk
+            probe = collection.get(ids=ids[:1], include=["embeddings"])["embeddings"][0]
+            collection.query(query_embeddings=[list(probe)], n_results=1)
+            load_seconds = time.perf_counter() - started
+        collections[name] = {"count": len(ids), "ids": ids, "per_source": dict(sorted(per_source.items()))}
+    return {"collections": collections, "load_seconds": load_seconds}
+
+
+def inspect_store(store_dir: str) -> dict:
+    """Full health report of one store directory."""
+    report = {"path": store_dir, "bytes": _dir_bytes(store_dir)}
+    db_path = os.path.join(store_dir, CHROMA_DB_FILENAME)
+    report["sqlite"] = sqlite_stats(db_path) if os.path.exists(db_path) else None
+    report["segments"] = segment_stats(store_dir)
+    report.update(collection_stats(store_dir))
+
+    manifest_ids = set()
+    manifest_path = os.path.join(store_dir, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            for entry in json.load(f).get("files", {}).values():
+                manifest_ids.update(entry.get("chunk_ids", []))
+    store_ids = {i for c in report["collections"].values() for i in c.pop("ids")}
+    report["orphaned_chunks"] = len(store_ids - manifest_ids) if manifest_ids else None
+    report["missing_chunks"] = len(manifest_ids - store_ids) if manifest_ids else None
+
+    live = len(store_ids)
+    added = sum(s["elements_added"] or 0 for s in report["segments"].values())
+    report["hnsw_tombstones"] = max(added - live, 0) if added else None
+    fragmentation = report["sqlite"]["fragmentation"] if report["sqlite"] else 0.0
+    tombstone_share = (report["hnsw_tombstones"] or 0) / max(added, 1)
+    report["compaction_recommended"] = fragmentation > COMPACT_THRESHOLD or tombstone_share > COMPACT_THRESHOLD
+    return report
+
+
+def _release_chroma_clients():
+    """Closes cached Chroma systems so their SQLite files can be vacuumed and moved."""
+    try:
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+    except (ImportError, AttributeError):
+        pass
+
+
+def compact_store(root: str, force: bool = False) -> str:
+    """
+    Rebuilds the published store from its live vectors into staging, vacuums
+    it and publishes the result. Returns the new version.
+    """
+    import chromadb
+
+    source_dir = current_path(root)
+    staging = staging_path(root)
+    if os.path.exists(staging):
+        if not force:
+            raise RuntimeError(f"{staging} holds an unfinished build; pass --force to discard it")
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+    # A client cached for an earlier store at the staging path would not see the fresh directory
+    _release_chroma_clients()
+
+    # Index manifest, dedup index, search engines, ...: everything that is not Chroma's own
+    for name in os.listdir(source_dir):
+        path = os.path.join(source_dir, name)
+        if os.path.isdir(path) and not _is_segment_dir(name):
+            shutil.copytree(path, os.path.join(staging, name))
+        elif os.path.isfile(path) and not name.startswith(CHROMA_DB_FILENAME) and name != CHECKPOINT_FILENAME:
+            shutil.copy2(path, os.path.join(staging, name))
+
+    source_client = chromadb.PersistentClient(path=source_dir)
+    target_client = chromadb.PersistentClient(path=staging)
+    for name in collection_names(source_client):
+        source = source_client.get_collection(name)
+        target = target_client.create_collection(name, metadata=source.metadata)
+        for rows in iter_collection_rows(source, ["embeddings", "documents", "metadatas"]):
+            target.add(ids=rows["ids"], embeddings=rows["embeddings"],
+                       documents=rows["documents"], metadatas=rows["metadatas"])
+    _release_chroma_clients()
+
+    conn = sqlite3.connect(os.path.join(staging, CHROMA_DB_FILENAME))
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return publish(root)
+
+
+def print_report(report: dict):
+    mb = 1024 * 1024
+    print(f"📊 Index health: {report['path']} ({report['bytes'] / mb:.1f} MB on disk)")
+    print("=" * 60)
+    for name, collection in report["collections"].items():
+        print(f"Collection '{name}': {collection['count']} chunks from {len(collection['per_source'])} sources")
+        for source, count in collection["per_source"].items():
+            print(f"   {count:>6}  {os.path.basename(source)}")
+    if report["orphaned_chunks"] is not None:
+        print(f"Orphaned chunks (not in manifest): {report['orphaned_chunks']}; "
+              f"missing chunks (in manifest only): {report['missing_chunks']}")
+    if report["sqlite"]:
+        sqlite = report["sqlite"]
+        queue = f", {sqlite['queue_rows']} rows in the embeddings queue" if sqlite["queue_rows"] is not None else ""
+        print(f"SQLite: {sqlite['bytes'] / mb:.1f} MB (+{sqlite['wal_bytes'] / mb:.1f} MB WAL), "
+              f"{sqlite['free_pages']}/{sqlite['pages']} free pages ({sqlite['fragmentation']:.0%} fragmented){queue}")
+    for name, segment in report["segments"].items():
+        state = (f"{segment['elements_added']} elements added, {segment['live_labels']} live"
+                 if segment["elements_added"] is not None else segment.get("error", "no HNSW metadata"))
+        print(f"Segment {name}: {segment['bytes'] / mb:.1f} MB, {state}")
+    if report["hnsw_tombstones"] is not None:
+        print(f"HNSW tombstones (deleted but still in the graph): {report['hnsw_tombstones']}")
+    if report["load_seconds"] is not None:
+        print(f"Cold load + first query: {report['load_seconds']:.2f}s")
+    print("=" * 60)
+    if report["compaction_recommended"]:
+        print("⚠️ Store is fragmented; run with --compact to rebuild it from live vectors")
+    else:
+        print("✅ Store is compact")
+
+
+def main():
+    from process_documents import VECTOR_DB_PATH
+
+    parser = argparse.ArgumentParser(description="Inspect and compact the published vector store.")
+    parser.add_argument("--root", default=VECTOR_DB_PATH, help="Vector store root (default: %(default)s)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    parser.add_argument("--compact", action="store_true",
+                        help="Rebuild the store from live vectors, vacuum it and publish it as a new version")
+    parser.add_argument("--force", action="store_true", help="With --compact, discard an unfinished build")
+    args = parser.parse_args()
+
+    report = inspect_store(current_path(args.root))
+    print_report(report)
+    if args.compact:
+        print("🧹 Compacting...")
+        version = compact_store(args.root, force=args.force)
+        after = inspect_store(current_path(args.root))
+        print(f"📦 Published compacted version {version}: {report['bytes'] / 1e6:.1f} MB → {after['bytes'] / 1e6:.1f} MB")
+        report = {"before": report, "after": after}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
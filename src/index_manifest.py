@@ -0,0 +1,165 @@
+"""
+Content-hash manifest for incremental indexing.
+
+Records the SHA-256 of every indexed source file and the IDs of the chunks it
+produced. Chunk IDs are themselves content hashes, so comparing the manifest
+with the files on disk tells process_documents.py exactly which chunks to
+embed, which to delete and which to leave alone.
+"""
+import hashlib
+import json
+import os
+
+from langchain_core.documents import Document
+
+MANIFEST_FILENAME = "index_manifest.json"
+CHECKPOINT_FILENAME = "ingest_checkpoint.json"
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    """Hashes a file in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def assign_chunk_ids(chunks: list[Document]) -> list[str]:
+    """
+    Returns a deterministic ID per chunk: a hash of its source, page and text,
+    plus an occurrence counter for identical chunks on the same page.
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        key = "\0".join([
+            str(chunk.metadata.get("source", "")),
+            str(chunk.metadata.get("page", "")),
+            chunk.page_content,
+        ])
+        content_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        occurrence = seen.get(content_hash, 0)
+        seen[content_hash] = occurrence + 1
+        ids.append(f"{content_hash}-{occurrence}")
+    return ids
+
+
+class IndexManifest:
+    """
+    Per-file and per-chunk state of the vector store:
+
+        {"config": {...}, "files": {source: {"sha256": ..., "config": {...}, "chunk_ids": [...]}}}
+
+    `config` holds the settings that change every chunk (embedding model,
+    chunk size/overlap). It is stored per file, so a file indexed under
+    different settings counts as updated even if a run was interrupted midway.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.config = {}
+        self.files = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.config = data.get("config", {})
+            self.files = data.get("files", {})
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def diff(self, file_hashes: dict, config: dict) -> dict:
+        """
+        Compares current source files ({path: sha256}) with the manifest.
+        Returns sorted lists of 'added', 'updated', 'removed' and 'unchanged' paths.
+        """
+        result = {"added": [], "updated": [], "removed": [], "unchanged": []}
+        for source, sha256 in sorted(file_hashes.items()):
+            if source not in self.files:
+                result["added"].append(source)
+            elif self.files[source].get("config") != config or self.files[source]["sha256"] != sha256:
+                result["updated"].append(source)
+            else:
+                result["unchanged"].append(source)
+        result["removed"] = sorted(set(self.files) - set(file_hashes))
+        return result
+
+    def chunk_ids(self, source: str) -> list[str]:
+        return self.files.get(source, {}).get("chunk_ids", [])
+
+    def reusable_chunk_ids(self, source: str, config: dict) -> list[str]:
+        """Chunk IDs that can be kept as stored: only those written under the current config."""
+        if self.files.get(source, {}).get("config") != config:
+            return []
+        return self.chunk_ids(source)
+
+    def set_file(self, source: str, sha256: str, chunk_ids: list[str], config: dict):
+        self.files[source] = {"sha256": sha256, "config": config, "chunk_ids": chunk_ids}
+
+    def remove_file(self, source: str):
+        self.files.pop(source, None)
+
+    def save(self, config: dict):
+        """Writes the manifest atomically alongside the vector store."""
+        self.config = config
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"config": self.config, "files": self.files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class IngestCheckpoint:
+    """
+    Chunk IDs written during an in-progress ingestion run, saved after every
+    batch. A file's IDs stay here until the file is fully written and recorded
+    in the IndexManifest; if the run is interrupted, the next run skips
+    re-embedding them. The checkpoint is discarded if the index config changed.
+    """
+
+    def __init__(self, path: str, config: dict):
+        self.path = path
+        self.config = config
+        self.written = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("config") == config:
+                self.written = {source: set(ids) for source, ids in data.get("written", {}).items()}
+
+    def resumed_chunks(self) -> int:
+        return sum(len(ids) for ids in self.written.values())
+
+    def written_ids(self, source: str) -> set:
+        return self.written.get(source, set())
+
+    def add(self, ids_by_source: dict):
+        """Records a flushed batch and saves the checkpoint atomically."""
+        for source, ids in ids_by_source.items():
+            self.written.setdefault(source, set()).update(ids)
+        self._save()
+
+    def finish_file(self, source: str):
+        """Drops a fully written file; its state now lives in the IndexManifest."""
+        if self.written.pop(source, None) is not None:
+            self._save()
+
+    def discard_file(self, source: str):
+        """Drops a file that failed part way; its written chunks have been deleted again."""
+        if self.written.pop(source, None) is not None:
+            self._save()
+
+    def clear(self):
+        self.written = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"config": self.config,
+                       "written": {source: sorted(ids) for source, ids in self.written.items()}}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,108 @@
+"""
+Atomic, versioned publishing of the vector store.
+
+Builds never modify the store the apps are reading. Layout under the store
+root (VECTOR_DB_PATH):
+
+    CURRENT                 {"version": ..., "published_at": ...}, replaced atomically
+    versions/<version>/     published stores (Chroma files + index manifest)
+    staging/                the build in progress, resumed if a run is interrupted
+
+An incremental build starts from a copy of the published version; a rebuild
+starts from an empty staging directory. publish() renames staging into
+versions/ and then swaps the CURRENT pointer, so readers see either the old
+or the new store and never a half-built one. The last KEEP_VERSIONS versions
+are kept, so a reader still holding the previous version keeps working.
+
+Stores built before versioning live directly in the root; current_path()
+falls back to the root until the first versioned build is published.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+CURRENT_FILENAME = "CURRENT"
+VERSIONS_DIRNAME = "versions"
+STAGING_DIRNAME = "staging"
+KEEP_VERSIONS = 3
+
+
+def staging_path(root: str) -> str:
+    return os.path.join(root, STAGING_DIRNAME)
+
+
+def read_current(root: str) -> dict:
+    """The CURRENT pointer ({} if nothing has been published)."""
+    try:
+        with open(os.path.join(root, CURRENT_FILENAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def current_version(root: str):
+    return read_current(root).get("version")
+
+
+def version_path(root: str, version) -> str:
+    """Directory of a published version (the root itself for a pre-versioning store)."""
+    return os.path.join(root, VERSIONS_DIRNAME, version) if version else root
+
+
+def current_path(root: str) -> str:
+    """Directory of the published store."""
+    return version_path(root, current_version(root))
+
+
+def prepare_staging(root: str, rebuild: bool = False) -> str:
+    """
+    Returns the staging directory for a build. An existing staging directory
+    (an interrupted build) is resumed unless `rebuild` is set; otherwise it
+    starts as a copy of the published store, or empty for a rebuild.
+    """
+    staging = staging_path(root)
+    if os.path.exists(staging):
+        if not rebuild:
+            return staging
+        shutil.rmtree(staging)
+
+    source = current_path(root)
+    if rebuild or not os.path.isdir(source):
+        os.makedirs(staging)
+    else:
+        # A pre-versioning root also holds CURRENT/versions/staging; never copy those
+        skip = shutil.ignore_patterns(CURRENT_FILENAME, VERSIONS_DIRNAME, STAGING_DIRNAME)
+        shutil.copytree(source, staging, ignore=skip if source == root else None)
+    return staging
+
+
+def publish(root: str) -> str:
+    """Moves the staging build into versions/ and atomically points CURRENT at it."""
+    now = datetime.now(timezone.utc)
+    version = now.strftime("%Y%m%dT%H%M%S%fZ")
+    versions_dir = os.path.join(root, VERSIONS_DIRNAME)
+    os.makedirs(versions_dir, exist_ok=True)
+    os.rename(staging_path(root), version_path(root, version))
+
+    pointer = os.path.join(root, CURRENT_FILENAME)
+    tmp_path = f"{pointer}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "published_at": now.isoformat(timespec="seconds")}, f)
+    os.replace(tmp_path, pointer)
+
+    prune_versions(root)
+    return version
+
+
+def prune_versions(root: str, keep: int = KEEP_VERSIONS) -> list[str]:
+    """Deletes all but the newest `keep` versions (never the current one); returns those removed."""
+    versions_dir = os.path.join(root, VERSIONS_DIRNAME)
+    if not os.path.isdir(versions_dir):
+        return []
+    current = current_version(root)
+    versions = sorted(os.listdir(versions_dir), reverse=True)
+    removed = [v for v in versions[keep:] if v != current]
+    for version in removed:
+        shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+    return removed
@@ -0,0 +1,163 @@
+"""
+Inverted-file (IVF) index: k-means coarse quantizer over the chunk vectors.
+
+Exact search reads every vector, so its cost grows linearly with the corpus.
+IVF partitions the vectors into `n_lists` clusters (spherical k-means over
+the normalized embeddings) and stores each cluster's vectors as one
+contiguous posting list. A query scores the centroids, then scans only the
+`nprobe` closest lists: with ~4·sqrt(N) lists and nprobe 8, a query reads a
+few thousand vectors even at millions of chunks. Raising nprobe trades
+latency for recall; nprobe == n_lists is exact search. Files, under
+<version>/ivf/:
+
+    meta.json       {"format", "count", "dim", "n_lists"}
+    centroids.npy   float32 (n_lists, dim), L2-normalized
+    lists.npy       int64 (n_lists + 1,): row where each posting list starts
+    vectors.f32     float32 (count, dim), rows grouped by list, raw (no header)
+    chunks.jsonl    one {"id", "text", "metadata"} record per row, same order
+    offsets.npy     int64 (count + 1,): byte offset of each record in chunks.jsonl
+
+Vectors and records are memory-mapped, so only the probed lists are paged
+in. Built by `process_documents.py --engine ivf`; `python benchmark_engines.py`
+reports recall and latency per nprobe against exact search.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+from langchain_core.documents import Document
+
+from flat_index import ChunkRecords, write_chunk_records
+from store_vectors import StoreVectors, normalize
+
+IVF_DIRNAME = "ivf"
+IVF_FORMAT = 1
+# Posting lists probed per query; raise for recall, lower for latency
+DEFAULT_NPROBE = 8
+# k-means settings: Lloyd iterations, and the vectors sampled to fit the centroids
+KMEANS_ITERATIONS = 10
+KMEANS_TRAIN_SAMPLE = 100_000
+# Rows assigned to centroids per matrix multiply
+ASSIGN_BLOCK_ROWS = 65536
+
+
+def default_n_lists(count: int) -> int:
+    """~4·sqrt(N) lists: ~25 vectors per list at 10k chunks, ~250 at a million."""
+    return max(1, min(count, int(round(4 * np.sqrt(count)))))
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest (highest cosine) centroid for each normalized row."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = vectors[start:start + ASSIGN_BLOCK_ROWS]
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors: np.ndarray, n_lists: int, iterations: int = KMEANS_ITERATIONS,
+                    sample: int = KMEANS_TRAIN_SAMPLE, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on (a sample of) the normalized rows; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    train = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), sample), replace=False))]
+    centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_lists(train, centroids)
+        counts = np.bincount(assignments, minlength=n_lists)
+        order = np.argsort(assignments, kind="stable")
+        used = np.flatnonzero(counts)
+        sums = np.zeros_like(centroids)
+        sums[used] = np.add.reduceat(train[order], (np.cumsum(counts) - counts)[used])
+        # An empty list takes a random training vector so every list stays in use
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = train[rng.choice(len(train), len(empty), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+def build_ivf_index(store: StoreVectors, out_dir: str, n_lists: int = None) -> dict:
+    """Clusters the vectors of `store` and writes them as an IVFIndex; returns its meta."""
+    vectors = normalize(store.vectors)
+    count, dim = vectors.shape if len(store) else (0, 0)
+    n_lists = min(n_lists or default_n_lists(count), count)
+    if count:
+        centroids = train_centroids(vectors, n_lists)
+        assignments = assign_lists(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        lists = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+    else:
+        centroids = np.empty((0, dim), dtype=np.float32)
+        order, lists = np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "centroids.npy"), centroids.astype(np.float32))
+    np.save(os.path.join(tmp_dir, "lists.npy"), lists.astype(np.int64))
+    vectors[order].tofile(os.path.join(tmp_dir, "vectors.f32"))
+    write_chunk_records(tmp_dir, store, order)
+
+    meta = {"format": IVF_FORMAT, "count": count, "dim": dim, "n_lists": n_lists}
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(tmp_dir, out_dir)
+    return meta
+
+
+class IVFIndex:
+    """Read-only view of an index written by build_ivf_index; search() returns [(row, score)]."""
+
+    def __init__(self, path: str, nprobe: int = DEFAULT_NPROBE):
+        self.path = path
+        self.nprobe = nprobe
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != IVF_FORMAT:
+            raise ValueError(f"Unsupported IVF index format {self.meta.get('format')} in {path}")
+        count, dim = self.meta["count"], self.meta["dim"]
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.lists = np.load(os.path.join(path, "lists.npy"))
+        self.vectors = (np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+                        if count else np.empty((0, dim), dtype=np.float32))
+        self.chunks = ChunkRecords(path)
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def close(self):
+        """Drops the memory maps; a file is unmapped once no array taken from it is left."""
+        self.vectors = None
+        self.chunks.close()
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """The `nprobe` posting lists whose centroids are closest to the (normalized) query."""
+        nprobe = min(nprobe, len(self.centroids))
+        scores = self.centroids @ query
+        if nprobe < len(scores):
+            return np.argpartition(-scores, nprobe - 1)[:nprobe]
+        return np.arange(len(scores))
+
+    def search(self, query_vector, k: int = 4, nprobe: int = None) -> list[tuple[int, float]]:
+        """Top `k` (row, cosine similarity) among the rows of the `nprobe` closest lists."""
+        if not len(self):
+            return []
+        query = normalize(np.asarray(query_vector, dtype=np.float32))
+        rows, scores = [], []
+        for list_id in np.sort(self.probe(query, nprobe or self.nprobe)):    # ascending: sequential reads
+            start, end = int(self.lists[list_id]), int(self.lists[list_id + 1])
+            if start < end:
+                rows.append(np.arange(start, end))
+                scores.append(np.asarray(self.vectors[start:end]) @ query)
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def documents(self, rows: list[int]) -> list[Document]:
+        """Documents for rows returned by search, in the same order."""
+        return self.chunks.documents(rows)
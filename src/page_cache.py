@@ -0,0 +1,111 @@
+"""
+On-disk cache of extracted PDF page text.
+
+Parsing is by far the slowest step of a re-chunking experiment, yet the page
+text only changes when the PDF does. PageTextCache stores the pages of each
+parsed file as gzipped JSONL, keyed by the file's SHA-256 and the extraction
+backend:
+
+    <cache_dir>/<sha256>.<backend>.jsonl.gz
+        {"version": 1, "source": ...}                  header line
+        {"metadata": {"page": 0, ...}, "text": ...}    one line per page
+
+The source path is not part of the key, so a moved or renamed file is still a
+hit. Entries are written to a temporary file and renamed into place once the
+whole file has parsed, so a crash never leaves a truncated entry behind.
+"""
+import gzip
+import json
+import os
+
+from langchain_core.documents import Document
+
+PAGE_CACHE_DIR = "../knowledge_base/page_cache"
+PAGE_CACHE_VERSION = 1
+# Pages per PageBatch when replaying a cached file, matching parallel_loader.PAGES_PER_TASK
+CACHED_BATCH_PAGES = 64
+
+
+class PageCacheWriter:
+    """Accumulates the pages of one file as they stream in; commit() publishes the entry."""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self._tmp_path = f"{path}.tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = gzip.open(self._tmp_path, "wt", encoding="utf-8")
+        self._write({"version": PAGE_CACHE_VERSION, "source": source})
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def add(self, documents: list[Document]):
+        for doc in documents:
+            metadata = {k: v for k, v in doc.metadata.items() if k != "source"}
+            self._write({"metadata": metadata, "text": doc.page_content})
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class PageTextCache:
+    """Extracted page text per (file hash, backend)."""
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, sha256: str, backend: str) -> str:
+        return os.path.join(self.cache_dir, f"{sha256}.{backend}.jsonl.gz")
+
+    def contains(self, sha256: str, backend: str) -> bool:
+        return os.path.exists(self.path(sha256, backend))
+
+    def iter_pages(self, sha256: str, backend: str, source: str):
+        """Yields the cached pages of a file as Documents attributed to `source`."""
+        with gzip.open(self.path(sha256, backend), "rt", encoding="utf-8") as f:
+            header = json.loads(next(f))
+            if header.get("version") != PAGE_CACHE_VERSION:
+                raise ValueError(f"unsupported page cache version {header.get('version')}")
+            for line in f:
+                record = json.loads(line)
+                yield Document(page_content=record["text"], metadata={"source": source, **record["metadata"]})
+
+    def load(self, sha256: str, backend: str, source: str):
+        """All cached pages of a file, or None on a miss (or an unreadable entry)."""
+        if self.contains(sha256, backend):
+            try:
+                documents = list(self.iter_pages(sha256, backend, source))
+                self.hits += 1
+                return documents
+            except (OSError, ValueError, KeyError, EOFError):
+                os.remove(self.path(sha256, backend))
+        self.misses += 1
+        return None
+
+    def writer(self, sha256: str, backend: str, source: str) -> PageCacheWriter:
+        return PageCacheWriter(self.path(sha256, backend), source)
+
+    def store(self, sha256: str, backend: str, source: str, documents: list[Document]):
+        writer = self.writer(sha256, backend, source)
+        writer.add(documents)
+        writer.commit()
+
+    def prune(self, keep_hashes) -> int:
+        """Deletes entries for files that no longer exist (any backend); returns how many were removed."""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        keep_hashes = set(keep_hashes)
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if name.split(".", 1)[0] not in keep_hashes:
+                os.remove(os.path.join(self.cache_dir, name))
+                removed += 1
+        return removed
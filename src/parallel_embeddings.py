@@ -0,0 +1,122 @@
+"""
+Multi-process sentence-transformers embedding for index builds.
+
+A single HuggingFaceEmbeddings instance runs every forward pass in one
+process. ParallelEmbedder instead shards the texts across a pool of worker
+processes, each holding its own copy of the model pinned to a fixed number of
+torch threads, so throughput scales with cores. Texts are sorted by length
+before being cut into batches, which keeps padding inside each batch small.
+
+ParallelEmbedder implements the LangChain Embeddings interface, so it can
+be passed to Chroma anywhere HuggingFaceEmbeddings is used.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+# Texts per forward pass. MiniLM is small; 64 keeps a CPU core busy without
+# wasting time on padding when batches are length-sorted.
+EMBED_BATCH_SIZE = 64
+DEFAULT_EMBED_WORKERS = os.cpu_count() or 1
+# torch threads per worker; one thread per process scales best on CPU
+THREADS_PER_WORKER = 1
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    """Process-pool initializer: loads one model per worker process."""
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_batch(texts: list[str], batch_size: int):
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+
+def length_sorted_batches(texts: list[str], batch_size: int) -> list[list[int]]:
+    """Groups text indices into batches of similar length (longest first)."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class ParallelEmbedder(Embeddings):
+    """
+    Embeds documents on a pool of `workers` processes (or in-process when
+    workers is 1). The pool is started lazily and reused across calls;
+    call close() when the build is done. Throughput is tracked in
+    `total_texts` / `total_seconds`.
+    """
+
+    def __init__(self, model_name: str, workers: int = DEFAULT_EMBED_WORKERS,
+                 batch_size: int = EMBED_BATCH_SIZE, threads_per_worker: int = THREADS_PER_WORKER):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.threads_per_worker = threads_per_worker
+        self.total_texts = 0
+        self.total_seconds = 0.0
+        self._executor = None
+        self._local_model = None
+
+    def _start(self):
+        if self.workers == 1:
+            if self._local_model is None:
+                from sentence_transformers import SentenceTransformer
+                self._local_model = SentenceTransformer(self.model_name, device="cpu")
+        elif self._executor is None:
+            # "spawn" avoids forking a parent that may already hold torch thread pools
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.threads_per_worker),
+            )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        self._start()
+        started = time.perf_counter()
+        batches = length_sorted_batches(texts, self.batch_size)
+
+        if self._executor is None:
+            results = [
+                self._local_model.encode([texts[i] for i in batch], batch_size=self.batch_size,
+                                         convert_to_numpy=True, show_progress_bar=False)
+                for batch in batches
+            ]
+        else:
+            futures = [
+                self._executor.submit(_encode_batch, [texts[i] for i in batch], self.batch_size)
+                for batch in batches
+            ]
+            results = [future.result() for future in futures]
+
+        embeddings = [None] * len(texts)
+        for batch, vectors in zip(batches, results):
+            for i, vector in zip(batch, vectors):
+                embeddings[i] = vector.tolist()
+
+        self.total_texts += len(texts)
+        self.total_seconds += time.perf_counter() - started
+        return embeddings
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    @property
+    def texts_per_second(self) -> float:
+        return self.total_texts / max(self.total_seconds, 1e-9)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,177 @@
+"""
+Parallel PDF page extraction for process_documents.py.
+
+Files are split into page ranges (so one large PDF such as the combined
+1977-2002 archive does not pin a single core) and parsed on a
+ProcessPoolExecutor. Results are reassembled in file/page order, so the
+output is identical to a serial load regardless of worker count.
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+from typing import NamedTuple
+
+from langchain_core.documents import Document
+
+from pdf_backends import get_backend
+
+# Pages per task; files longer than this are split across workers
+PAGES_PER_TASK = 64
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+class PageBatch(NamedTuple):
+    """One parsed page range, as yielded by iter_pdf_pages."""
+    source: str
+    documents: list
+    is_last: bool           # True for the final range of `source`
+    error: str = None       # Set (with is_last=True) when `source` failed to parse
+
+
+def count_pages(pdf_path: str, backend: str = "pypdf") -> int:
+    """Returns the number of pages in a PDF (reads only the document structure)."""
+    return get_backend(backend).page_count(pdf_path)
+
+
+def parse_page_range(pdf_path: str, start: int, end: int, backend: str = "pypdf") -> dict:
+    """
+    Worker: extracts the text of pages [start, end) of one PDF with the named
+    backend. Never raises; errors are returned so one bad file cannot abort the run.
+    """
+    started = time.perf_counter()
+    try:
+        texts = get_backend(backend).extract_pages(pdf_path, start, end)
+        pages = [
+            (text, {"source": pdf_path, "page": start + offset})
+            for offset, text in enumerate(texts)
+        ]
+        return {"pages": pages, "seconds": time.perf_counter() - started}
+    except Exception as e:
+        return {"pages": [], "seconds": time.perf_counter() - started, "error": f"{type(e).__name__}: {e}"}
+
+
+def plan_tasks(pdf_paths: list[str], pages_per_task: int = PAGES_PER_TASK, backend: str = "pypdf"):
+    """
+    Splits files into (pdf_path, start, end) tasks. Returns (tasks, errors),
+    where errors maps files that could not even be opened to their message.
+    """
+    tasks, errors = [], {}
+    for pdf_path in pdf_paths:
+        try:
+            page_count = count_pages(pdf_path, backend)
+        except Exception as e:
+            errors[pdf_path] = f"{type(e).__name__}: {e}"
+            continue
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((pdf_path, start, min(start + pages_per_task, page_count)))
+    return tasks, errors
+
+
+def load_pdfs_parallel(pdf_paths: list[str], workers: int = DEFAULT_WORKERS,
+                       pages_per_task: int = PAGES_PER_TASK, backend: str = "pypdf",
+                       parse_fn=parse_page_range, verbose: bool = True) -> list[Document]:
+    """
+    Parses `pdf_paths` across `workers` processes and returns one Document per
+    page, ordered by file then page. Prints per-file parse time and failures;
+    files that fail are left out of the result rather than aborting the run.
+    """
+    tasks, errors = plan_tasks(pdf_paths, pages_per_task, backend)
+    results = {}
+    started = time.perf_counter()
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            results[task] = parse_fn(*task, backend)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(parse_fn, *task, backend): task for task in tasks}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+    file_seconds, file_pages = {}, {}
+    for task in tasks:
+        pdf_path, result = task[0], results[task]
+        file_seconds[pdf_path] = file_seconds.get(pdf_path, 0.0) + result["seconds"]
+        file_pages[pdf_path] = file_pages.get(pdf_path, 0) + len(result["pages"])
+        if "error" in result:
+            errors.setdefault(pdf_path, result["error"])
+
+    # A file with any failed range is dropped entirely so it is never half-indexed
+    documents = [
+        Document(page_content=text, metadata=metadata)
+        for task in tasks if task[0] not in errors
+        for text, metadata in results[task]["pages"]
+    ]
+
+    elapsed = time.perf_counter() - started
+    if not verbose:
+        return documents
+    for pdf_path in pdf_paths:
+        if pdf_path in file_seconds:
+            print(f"   {os.path.basename(pdf_path)}: {file_pages[pdf_path]} pages in {file_seconds[pdf_path]:.2f}s")
+    for pdf_path, message in errors.items():
+        print(f"   ⚠️ Failed to parse {pdf_path}: {message}")
+    print(
+        f"Parsed {len(documents)} pages from {len(pdf_paths) - len(errors)}/{len(pdf_paths)} files "
+        f"in {elapsed:.2f}s using {workers} worker(s) with {backend} "
+        f"({len(documents) / max(elapsed, 1e-9):.1f} pages/sec)"
+    )
+    return documents
+
+
+def iter_pdf_pages(pdf_paths: list[str], workers: int = DEFAULT_WORKERS,
+                   pages_per_task: int = PAGES_PER_TASK, backend: str = "pypdf",
+                   parse_fn=parse_page_range, max_pending: int = None):
+    """
+    Streaming variant of load_pdfs_parallel: yields a PageBatch per page range,
+    in file/page order, while keeping at most `max_pending` ranges (default
+    2 x workers) parsed or in flight. Memory stays bounded no matter how large
+    the corpus is. A file that fails yields a single error batch and no more.
+    """
+    tasks, errors = plan_tasks(pdf_paths, pages_per_task, backend)
+    for pdf_path, message in errors.items():
+        print(f"   ⚠️ Failed to parse {pdf_path}: {message}")
+        yield PageBatch(pdf_path, [], True, message)
+
+    last_task = {task[0]: task for task in tasks}
+    file_seconds = {}
+    failed = set()
+
+    def to_batch(task, result):
+        pdf_path = task[0]
+        if pdf_path in failed:
+            return None
+        file_seconds[pdf_path] = file_seconds.get(pdf_path, 0.0) + result["seconds"]
+        if "error" in result:
+            failed.add(pdf_path)
+            print(f"   ⚠️ Failed to parse {pdf_path}: {result['error']}")
+            return PageBatch(pdf_path, [], True, result["error"])
+        is_last = task == last_task[pdf_path]
+        if is_last:
+            print(f"   {os.path.basename(pdf_path)}: {task[2]} pages in {file_seconds[pdf_path]:.2f}s")
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in result["pages"]]
+        return PageBatch(pdf_path, documents, is_last)
+
+    if workers <= 1:
+        for task in tasks:
+            batch = to_batch(task, parse_fn(*task, backend))
+            if batch:
+                yield batch
+        return
+
+    max_pending = max_pending or 2 * workers
+    task_iter = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque((task, executor.submit(parse_fn, *task, backend))
+                        for task in islice(task_iter, max_pending))
+        while pending:
+            task, future = pending.popleft()
+            result = future.result()
+            next_task = next(task_iter, None)
+            if next_task is not None:
+                pending.append((next_task, executor.submit(parse_fn, *next_task, backend)))
+            batch = to_batch(task, result)
+            if batch:
+                yield batch
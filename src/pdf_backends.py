@@ -0,0 +1,110 @@
+"""
+Pluggable PDF text extraction backends.
+
+pypdf is always available (it is in requirements.txt). PyMuPDF and
+pypdfium2 are native-backed and much faster on large files such as
+Poor Charlie's Almanack; they are used when installed:
+
+    pip install pymupdf        # or: pip install pypdfium2
+
+"auto" picks the fastest installed backend, in PREFERRED_ORDER.
+"""
+from pypdf import PdfReader
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+PREFERRED_ORDER = ["pymupdf", "pypdfium2", "pypdf"]
+
+
+class PyPDFBackend:
+    """Pure-Python extraction with pypdf (the original PyPDFDirectoryLoader behaviour)."""
+    name = "pypdf"
+
+    @staticmethod
+    def page_count(pdf_path: str) -> int:
+        return len(PdfReader(pdf_path).pages)
+
+    @staticmethod
+    def extract_pages(pdf_path: str, start: int, end: int) -> list[str]:
+        reader = PdfReader(pdf_path)
+        return [reader.pages[i].extract_text() or "" for i in range(start, min(end, len(reader.pages)))]
+
+
+class PyMuPDFBackend:
+    """MuPDF-backed extraction via the `fitz` module."""
+    name = "pymupdf"
+
+    @staticmethod
+    def page_count(pdf_path: str) -> int:
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+
+    @staticmethod
+    def extract_pages(pdf_path: str, start: int, end: int) -> list[str]:
+        with fitz.open(pdf_path) as doc:
+            return [doc[i].get_text() for i in range(start, min(end, doc.page_count))]
+
+
+class PdfiumBackend:
+    """PDFium-backed extraction via pypdfium2."""
+    name = "pypdfium2"
+
+    @staticmethod
+    def page_count(pdf_path: str) -> int:
+        doc = pypdfium2.PdfDocument(pdf_path)
+        try:
+            return len(doc)
+        finally:
+            doc.close()
+
+    @staticmethod
+    def extract_pages(pdf_path: str, start: int, end: int) -> list[str]:
+        doc = pypdfium2.PdfDocument(pdf_path)
+        try:
+            texts = []
+            for i in range(start, min(end, len(doc))):
+                page = doc[i]
+                text_page = page.get_textpage()
+                texts.append(text_page.get_text_range())
+                text_page.close()
+                page.close()
+            return texts
+        finally:
+            doc.close()
+
+
+BACKENDS = {
+    "pypdf": PyPDFBackend,
+    "pymupdf": PyMuPDFBackend,
+    "pypdfium2": PdfiumBackend,
+}
+_INSTALLED = {"pypdf": True, "pymupdf": fitz is not None, "pypdfium2": pypdfium2 is not None}
+
+
+def available_backends() -> list[str]:
+    """Installed backend names, fastest first."""
+    return [name for name in PREFERRED_ORDER if _INSTALLED[name]]
+
+
+def resolve_backend_name(name: str = "auto") -> str:
+    """Maps "auto" to the fastest installed backend and validates explicit names."""
+    if name == "auto":
+        return available_backends()[0]
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{name}'. Choose from: auto, {', '.join(PREFERRED_ORDER)}")
+    if not _INSTALLED[name]:
+        raise ValueError(f"PDF backend '{name}' is not installed.")
+    return name
+
+
+def get_backend(name: str = "auto"):
+    """Returns the backend class for `name` (or the fastest installed one for "auto")."""
+    return BACKENDS[resolve_backend_name(name)]
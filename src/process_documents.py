@@ -1,103 +1,716 @@
 import os
-import shutil
+import json
+import argparse
+from collections import Counter
+from functools import partial
+from pathlib import Path
 from dotenv import load_dotenv
 
-# --- Updated Imports for HuggingFace Embeddings ---
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_community.vectorstores import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter 
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+from index_manifest import (
+    CHECKPOINT_FILENAME, MANIFEST_FILENAME, IndexManifest, IngestCheckpoint, assign_chunk_ids, file_sha256,
+)
+from parallel_loader import DEFAULT_WORKERS, PageBatch, iter_pdf_pages, load_pdfs_parallel
+from pdf_backends import PREFERRED_ORDER, resolve_backend_name
+from parallel_embeddings import DEFAULT_EMBED_WORKERS, EMBED_BATCH_SIZE, ParallelEmbedder
+from embedding_cache import CachedEmbeddings
+from dedup import DEDUP_FORMAT, DEDUP_INDEX_FILENAME, DedupIndex, strip_repeated_lines
+from source_metadata import LETTER_TYPES, METADATA_VERSION, SourceTagger, source_metadata
+from profiling import BUILD_REPORTS_DIR, ProfiledEmbeddings, StageProfiler
+from index_versions import current_path, prepare_staging, publish, staging_path
+from page_cache import CACHED_BATCH_PAGES, PageTextCache
+from token_chunking import EMBEDDING_MAX_TOKENS, SPECIAL_TOKENS, TokenTextSplitter, count_tokens, load_tokenizer
+from fact_tables import FACT_TABLE_FILENAME, FactTable, extract_performance_facts, table_is_current
+from store_vectors import StoreVectors, load_store_vectors
+from quantized_index import QUANTIZED_DIRNAME, build_quantized_index
+from flat_index import FLAT_DIRNAME, build_flat_index
+from ivf_index import IVF_DIRNAME, build_ivf_index
+from bm25_index import BM25_DIRNAME, build_bm25_index
+from shards import SHARDS, drop_shard, is_legacy_store, migrate_to_shards, shard_for_source
+from small_to_big import PARENT_DOCSTORE_FILENAME, ParentDocstore, SentenceWindowSplitter
+
 # --- Configuration ---
 load_dotenv()
 
 # Define paths and constants
-DATA_PATH = "../knowledge_base/docs" 
+DATA_PATH = "../knowledge_base/docs"
+# Root of the versioned vector store; apps read the version CURRENT points at
 VECTOR_DB_PATH = "../knowledge_base/vector_db"
+# Builds are written here and published atomically (see index_versions.py)
+BUILD_PATH = staging_path(VECTOR_DB_PATH)
+# Written by download_data.py; lists the transcript text files it extracted
+DOWNLOAD_MANIFEST_PATH = os.path.join(DATA_PATH, ".download_manifest.json")
+# Content-hash manifest of what is currently in the vector store
+INDEX_MANIFEST_PATH = os.path.join(BUILD_PATH, MANIFEST_FILENAME)
+# Chunk IDs written by an interrupted run, so the next run can resume
+CHECKPOINT_PATH = os.path.join(BUILD_PATH, CHECKPOINT_FILENAME)
+# SimHash fingerprints of stored chunks, used to drop near-duplicates
+DEDUP_INDEX_PATH = os.path.join(BUILD_PATH, DEDUP_INDEX_FILENAME)
+# Per-year figures from the letters' performance tables, for instant numeric answers
+FACT_TABLE_PATH = os.path.join(BUILD_PATH, FACT_TABLE_FILENAME)
+# Parent chunks that the embedded sentence windows map back to (see small_to_big.py)
+PARENT_DOCSTORE_PATH = os.path.join(BUILD_PATH, PARENT_DOCSTORE_FILENAME)
+# Multi-year compilations are indexed last, so when they repeat a passage the
+# individual annual letter keeps the canonical copy
+COMPILATION_MARKERS = ("Combined_Archive",)
 # Using HuggingFace embedding model (FREE!)
-EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2" 
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Persistent (model, text hash) -> vector cache; kept outside VECTOR_DB_PATH so --rebuild reuses it
+EMBEDDING_CACHE_PATH = "../knowledge_base/embedding_cache.sqlite3"
+EMBEDDING_DIMENSION = 384  # all-MiniLM-L6-v2
+# Extracted page text keyed by (PDF sha256, backend), so re-chunking never re-parses an unchanged PDF
+PAGE_CACHE_DIR = "../knowledge_base/page_cache"
 
-# Chunking parameters
-CHUNK_SIZE = 1000
+# Chunking parameters. "tokens" measures chunks with the embedding model's tokenizer so
+# every chunk fits the encoder's window; "chars" is the original character splitter.
+CHUNK_UNIT = "tokens"
+CHUNK_TOKENS = EMBEDDING_MAX_TOKENS - SPECIAL_TOKENS  # 254 word pieces + [CLS]/[SEP]
+CHUNK_TOKEN_OVERLAP = 48
+CHUNK_SIZE = 1000       # characters, when CHUNK_UNIT is "chars"
 CHUNK_OVERLAP = 200
+# Small-to-big: each chunk above becomes a parent passage and only its sentence
+# windows of up to this size are embedded; 0 embeds the chunks themselves.
+# While children are on, parents are split WITHOUT the overlap above: windows never
+# span two parents, so overlapping parents would embed (and return) the same
+# sentences twice. CHUNK_TOKEN_OVERLAP / CHUNK_OVERLAP only apply with CHILD_TOKENS = 0.
+CHILD_TOKENS = 64
+CHILD_CHARS = 250       # when CHUNK_UNIT is "chars"
 
-def load_documents():
-    """Loads PDF documents from the DATA_PATH directory."""
-    print(f"Loading documents from {DATA_PATH}...")
-    try:
-        loader = PyPDFDirectoryLoader(DATA_PATH)
-        documents = loader.load()
-        print(f"Found and loaded {len(documents)} document pages.")
-        return documents
-    except Exception as e:
-        print(f"Error loading documents: {e}")
-        return []
+# PDF text extractor: "auto" uses the fastest installed backend (see pdf_backends.py)
+PDF_BACKEND = "auto"
 
-def split_documents(documents: list[Document]):
-    """Splits documents into smaller, overlapping chunks."""
-    print("Splitting documents into chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
+# Chroma rejects very large single writes; deletes are sent in batches
+WRITE_BATCH_SIZE = 1000
+# Chunks embedded and written per batch during streaming ingestion. Together with
+# the loader's in-flight page ranges this caps peak memory regardless of corpus size.
+# Large enough to give every embedding worker several length-sorted batches.
+INGEST_BATCH_SIZE = 1024
+
+# Standalone search engines built from the stored chunks next to the Chroma files (--engine)
+ENGINE_BUILDERS = {
+    QUANTIZED_DIRNAME: lambda store, path: build_quantized_index(store.ids, store.vectors, path),
+    FLAT_DIRNAME: build_flat_index,
+    IVF_DIRNAME: build_ivf_index,
+    BM25_DIRNAME: build_bm25_index,
+}
+# Built on every run: the BM25 index behind the app's hybrid (lexical + dense) search
+DEFAULT_ENGINES = [BM25_DIRNAME]
+
+def index_config(pdf_backend=PDF_BACKEND, dedup=True):
+    """Settings that change every chunk; a change here re-embeds every file."""
+    return {
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        **chunk_settings(),
+        "pdf_backend": resolve_backend_name(pdf_backend),
+        "dedup": DEDUP_FORMAT if dedup else False,
+        "metadata_version": METADATA_VERSION,
+    }
+
+def find_pdf_files():
+    """Returns every PDF under DATA_PATH (skipping hidden files), sorted."""
+    return sorted(
+        str(path) for path in Path(DATA_PATH).rglob("[!.]*.pdf")
+        if not any(part.startswith(".") for part in path.relative_to(DATA_PATH).parts)
+    )
+
+def find_transcript_files():
+    """
+    Returns the plain-text Munger transcripts extracted by download_data.py.
+    Only files the download manifest marks as transcripts are listed, so URL
+    bookmarks for pages that could not be fetched never reach the index.
+    """
+    if not os.path.exists(DOWNLOAD_MANIFEST_PATH):
+        return {}
+
+    with open(DOWNLOAD_MANIFEST_PATH) as f:
+        manifest = json.load(f)
+
+    transcripts = {}
+    for rel_path, entry in sorted(manifest.items()):
+        file_path = os.path.join(DATA_PATH, rel_path)
+        if entry.get("kind") == "transcript" and os.path.exists(file_path):
+            transcripts[file_path] = entry.get("url")
+    return transcripts
+
+def load_documents(pdf_paths=None, workers=DEFAULT_WORKERS, pdf_backend=PDF_BACKEND, use_page_cache=True):
+    """
+    Loads PDF pages from the given files (default: every PDF under DATA_PATH),
+    parsing files and page ranges in parallel across `workers` processes.
+    Unchanged files are read from the page text cache instead of being parsed.
+    A file that fails to parse is reported and skipped.
+    """
+    if pdf_paths is None:
+        pdf_paths = find_pdf_files()
+    backend = resolve_backend_name(pdf_backend)
+    print(f"Loading {len(pdf_paths)} PDF files from {DATA_PATH} with {backend}...")
+
+    cache = PageTextCache(PAGE_CACHE_DIR)
+    hashes = {path: file_sha256(path) for path in pdf_paths} if use_page_cache else {}
+    pages = {}
+    for path in hashes:
+        cached = cache.load(hashes[path], backend, path)
+        if cached is not None:
+            pages[path] = cached
+    to_parse = [path for path in pdf_paths if path not in pages]
+    if use_page_cache:
+        print(f"Page text cache: {len(pages)} files cached, {len(to_parse)} to parse.")
+
+    for doc in load_pdfs_parallel(to_parse, workers=workers, backend=backend) if to_parse else []:
+        pages.setdefault(doc.metadata["source"], []).append(doc)
+    if use_page_cache:
+        for path in to_parse:
+            if path in pages:
+                cache.store(hashes[path], backend, path, pages[path])
+
+    documents = [doc for path in pdf_paths for doc in pages.get(path, [])]
+    print(f"Found and loaded {len(documents)} document pages.")
+    return documents
+
+def load_transcripts(transcript_paths=None):
+    """Loads cached transcript text (default: every transcript in the download manifest)."""
+    available = find_transcript_files()
+    if transcript_paths is None:
+        transcript_paths = list(available)
+
+    transcripts = []
+    for file_path in transcript_paths:
+        with open(file_path, encoding="utf-8") as f:
+            text = f.read()
+        transcripts.append(Document(
+            page_content=text,
+            metadata={"source": file_path, "page": 0, "url": available.get(file_path)},
+        ))
+    print(f"Loaded {len(transcripts)} cached transcript texts.")
+    return transcripts
+
+def configured_chunking():
+    """(chunk size, chunk overlap, child size) as configured for CHUNK_UNIT."""
+    if CHUNK_UNIT == "tokens":
+        return CHUNK_TOKENS, CHUNK_TOKEN_OVERLAP, CHILD_TOKENS
+    return CHUNK_SIZE, CHUNK_OVERLAP, CHILD_CHARS
+
+def chunk_settings():
+    """
+    Chunk unit, size, overlap and child window size in effect (sizes are in
+    CHUNK_UNIT). The overlap is 0 while small-to-big children are on.
+    """
+    size, overlap, child_size = configured_chunking()
+    return {"chunk_unit": CHUNK_UNIT, "chunk_size": size, "chunk_overlap": 0 if child_size else overlap,
+            "child_size": child_size}
+
+def make_text_splitter():
+    """The splitter used for every chunk in the index (the parents, with small-to-big)."""
+    settings = chunk_settings()
+    overlap = configured_chunking()[1]
+    if settings["chunk_overlap"] != overlap:
+        print(f"Small-to-big is on ({settings['child_size']}-{CHUNK_UNIT} windows): parent chunks are split "
+              f"without the configured {overlap}-{CHUNK_UNIT} overlap.")
+    if CHUNK_UNIT == "tokens":
+        return TokenTextSplitter(
+            load_tokenizer(EMBEDDING_MODEL_NAME),
+            chunk_tokens=settings["chunk_size"],
+            chunk_overlap=settings["chunk_overlap"],
+        )
+    return RecursiveCharacterTextSplitter(
+        chunk_size=settings["chunk_size"],
+        chunk_overlap=settings["chunk_overlap"],
         length_function=len,
         is_separator_regex=False,
     )
-    chunks = text_splitter.split_documents(documents)
+
+def make_child_splitter():
+    """The sentence-window splitter for small-to-big children, or None when they are disabled."""
+    child_size = chunk_settings()["child_size"]
+    if not child_size:
+        return None
+    if CHUNK_UNIT == "tokens":
+        return SentenceWindowSplitter(child_size, partial(count_tokens, load_tokenizer(EMBEDDING_MODEL_NAME)))
+    return SentenceWindowSplitter(child_size)
+
+def split_documents(documents: list[Document]):
+    """Splits documents into smaller, overlapping chunks."""
+    print("Splitting documents into chunks...")
+    chunks = make_text_splitter().split_documents(documents)
     print(f"Total number of chunks created: {len(chunks)}")
     return chunks
 
-def add_to_chroma(chunks: list[Document]):
+def iter_page_batches(changed: set, workers=DEFAULT_WORKERS, pdf_backend=PDF_BACKEND,
+                      file_hashes: dict = None, use_page_cache=True):
+    """
+    Lazily yields PageBatches for the changed PDFs followed by changed
+    transcripts. PDFs in the page text cache are replayed from it; the rest
+    are parsed on the process pool, a bounded number of page ranges at a
+    time, and written to the cache as they stream through.
+    """
+    pdf_paths = [path for path in find_pdf_files() if path in changed]
+    backend = resolve_backend_name(pdf_backend)
+    file_hashes = file_hashes or {}
+    hashes = {path: file_hashes.get(path) or file_sha256(path) for path in pdf_paths} if use_page_cache else {}
+    cache = PageTextCache(PAGE_CACHE_DIR)
+    cached = {path for path in hashes if cache.contains(hashes[path], backend)}
+    print(f"Streaming {len(pdf_paths)} PDF files from {DATA_PATH} with {backend} "
+          f"({len(cached)} from the page text cache)...")
+
+    # Annual letters first, compilations last; within each group cached files replay first
+    for compilations in (False, True):
+        group = [path for path in pdf_paths if any(m in path for m in COMPILATION_MARKERS) == compilations]
+        to_parse = []
+        for path in group:
+            documents = cache.load(hashes[path], backend, path) if path in cached else None
+            if documents is None:
+                to_parse.append(path)
+                continue
+            for start in range(0, len(documents), CACHED_BATCH_PAGES):
+                end = start + CACHED_BATCH_PAGES
+                yield PageBatch(path, documents[start:end], end >= len(documents))
+            if not documents:
+                yield PageBatch(path, [], True)
+
+        writers = {}
+        try:
+            for batch in iter_pdf_pages(to_parse, workers=workers, backend=backend):
+                if use_page_cache and batch.source not in writers:
+                    writers[batch.source] = cache.writer(hashes[batch.source], backend, batch.source)
+                writer = writers.get(batch.source)
+                if writer and batch.error:
+                    writers.pop(batch.source).discard()
+                elif writer:
+                    writer.add(batch.documents)
+                    if batch.is_last:
+                        writers.pop(batch.source).commit()
+                yield batch
+        finally:
+            for writer in writers.values():
+                writer.discard()
+
+    for doc in load_transcripts([path for path in find_transcript_files() if path in changed]):
+        yield PageBatch(doc.metadata["source"], [doc], True)
+
+def hash_source_files():
+    """Returns {path: sha256} for every PDF and transcript that should be indexed."""
+    paths = find_pdf_files() + list(find_transcript_files())
+    return {path: file_sha256(path) for path in paths}
+
+def add_to_chroma(page_batches, diff: dict, file_hashes: dict, manifest: IndexManifest,
+                  config: dict, batch_size: int = INGEST_BATCH_SIZE,
+                  embed_workers: int = DEFAULT_EMBED_WORKERS, embed_batch_size: int = EMBED_BATCH_SIZE,
+                  use_cache: bool = True, dedup: DedupIndex = None, profiler: StageProfiler = None,
+                  facts: FactTable = None, docstore: ParentDocstore = None):
     """
-    Initializes the embedding function and stores the document chunks
-    in the Chroma vector database.
+    Streams `page_batches` (PageBatch) for the files in `diff` into the
+    Chroma store at BUILD_PATH, one collection per source family, and
+    deletes the chunks of the files in diff["removed"]. Only chunks not
+    already stored under `config` are embedded. A file is recorded in
+    `manifest` with its hash from `file_hashes` once all of its chunks are
+    written; a file that fails to parse is left out and retried next run.
+    Optional: `dedup` drops running headers and near-duplicate chunks,
+    `facts` receives the letters' performance tables, and `docstore` keeps
+    the chunks as parents while their sentence windows are embedded.
+    Written batches are checkpointed so an interrupted run resumes; stage
+    timings go to `profiler`. Returns True if the run completed.
     """
-    # 1. Initialize the HuggingFace Embeddings (FREE!)
-    print(f"Initializing HuggingFace Embeddings with model: {EMBEDDING_MODEL_NAME}...")
+    profiler = profiler or StageProfiler()
+    # 1. Initialize the HuggingFace Embeddings (FREE!), one model per worker process
+    print(f"Initializing HuggingFace Embeddings with model: {EMBEDDING_MODEL_NAME} "
+          f"({embed_workers} worker processes, batch size {embed_batch_size})...")
     print("(This may take a moment on first run as it downloads the model...)")
+    embedder = ParallelEmbedder(
+        EMBEDDING_MODEL_NAME, workers=embed_workers, batch_size=embed_batch_size
+    )
+    embedding_function = (
+        CachedEmbeddings(embedder, EMBEDDING_MODEL_NAME, path=EMBEDDING_CACHE_PATH) if use_cache else embedder
+    )
+
+    checkpoint = IngestCheckpoint(CHECKPOINT_PATH, config)
+    if checkpoint.resumed_chunks():
+        print(f"Resuming from checkpoint: {checkpoint.resumed_chunks()} chunks already written.")
+
+    splitter = make_text_splitter()
+    child_splitter = make_child_splitter() if docstore else None
+    tagger = SourceTagger()
+    stats = Counter()
+    pending = []        # (source, chunk, chunk_id) waiting to be embedded and written
+    open_files = {}     # source -> {"ids": [...], "skip": set, "facts": [...], "parents": [...], "done": bool}
+
+    def shard_store(shard):
+        if shard not in vectorstores:
+            vectorstores[shard] = Chroma(
+                collection_name=shard,
+                persist_directory=BUILD_PATH,
+                embedding_function=ProfiledEmbeddings(embedding_function, profiler)
+            )
+        return vectorstores[shard]
+
+    def delete_ids(source, ids):
+        with profiler.stage("delete", unit="chunks") as stage:
+            for start in range(0, len(ids), WRITE_BATCH_SIZE):
+                shard_store(shard_for_source(source)).delete(ids=ids[start:start + WRITE_BATCH_SIZE])
+            stage.add(len(ids))
+        stats["deleted"] += len(ids)
+        if dedup:
+            dedup.forget(ids)
+
+    def save_state():
+        manifest.save(config)
+        if dedup:
+            dedup.save()
+
+    def flush():
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            # Embedding happens inside add_documents and is charged to the nested "embed" stage
+            with profiler.stage("write", unit="chunks") as stage:
+                by_shard = {}
+                for source, chunk, chunk_id in batch:
+                    by_shard.setdefault(shard_for_source(source), []).append((chunk, chunk_id))
+                for shard, rows in by_shard.items():
+                    shard_store(shard).add_documents(
+                        [chunk for chunk, _ in rows],
+                        ids=[chunk_id for _, chunk_id in rows]
+                    )
+                written = {}
+                for source, _, chunk_id in batch:
+                    written.setdefault(source, []).append(chunk_id)
+                checkpoint.add(written)
+                stage.add(len(batch))
+            stats["embedded"] += len(batch)
+        pending.clear()
+
+        # Every file whose last page range has been seen is now fully written
+        for source in [s for s, state in open_files.items() if state["done"]]:
+            state = open_files.pop(source)
+            delete_ids(source, sorted(set(manifest.chunk_ids(source)) - set(state["ids"])))
+            if facts:
+                facts.replace_source(source, state["facts"])
+            if docstore:
+                docstore.replace_source(source, state["parents"])
+            manifest.set_file(source, file_hashes[source], state["ids"], config)
+            save_state()
+            checkpoint.finish_file(source)
+
+    vectorstores = {}   # shard name -> Chroma, opened on first use
     try:
-        embedding_function = HuggingFaceEmbeddings(
-            model_name=EMBEDDING_MODEL_NAME
-        )
+        # 2. Drop chunks of files that no longer exist
+        for source in diff["removed"]:
+            delete_ids(source, manifest.chunk_ids(source))
+            manifest.remove_file(source)
+            if facts:
+                facts.remove_source(source)
+            if docstore:
+                docstore.remove_source(source)
+            if dedup:
+                dedup.reset_source(source)
+        save_state()
+
+        # 3. Stream the changed files through split → embed → write
+        for page_batch in profiler.iterate("parse", page_batches, unit="pages",
+                                           count=lambda batch: len(batch.documents)):
+            source = page_batch.source
+            if page_batch.error:
+                # Leave the file out of the manifest so the next run retries it, and take back
+                # its chunks from earlier page ranges: queued ones and those already written
+                state = open_files.pop(source, None)
+                pending[:] = [row for row in pending if row[0] != source]
+                previous = set(manifest.chunk_ids(source))
+                written = checkpoint.written_ids(source) - previous
+                if written:
+                    delete_ids(source, sorted(written))
+                checkpoint.discard_file(source)
+                if dedup and state:
+                    dedup.forget(set(state["ids"]) - previous)
+                    dedup.reset_source(source)
+                stats["failed"] += 1
+                continue
+
+            if source not in open_files:
+                open_files[source] = {
+                    "ids": [],
+                    "skip": set(manifest.reusable_chunk_ids(source, config)) | checkpoint.written_ids(source),
+                    "facts": [],
+                    "parents": [],
+                    "done": False,
+                }
+                if dedup:
+                    dedup.reset_source(source)
+            state = open_files[source]
+
+            documents = page_batch.documents
+            with profiler.stage("split", unit="chunks"):
+                # Before header/footer stripping, which could clip the edge rows of a table
+                tagger.tag(documents)
+                if facts:
+                    state["facts"].extend(extract_performance_facts(documents))
+            if dedup:
+                with profiler.stage("dedup", unit="chunks"):
+                    documents, stripped = strip_repeated_lines(documents)
+                stats["boilerplate_lines"] += stripped
+            with profiler.stage("split", unit="chunks") as stage:
+                chunks = splitter.split_documents(documents)
+                chunk_ids = assign_chunk_ids(chunks)
+                if child_splitter:
+                    state["parents"].extend(zip(chunk_ids, chunks))
+                    chunks = child_splitter.split(chunks, chunk_ids)
+                    chunk_ids = assign_chunk_ids(chunks)
+                stage.add(len(chunks))
+            with profiler.stage("dedup", unit="chunks") as stage:
+                for chunk, chunk_id in zip(chunks, chunk_ids):
+                    if chunk_id in state["skip"]:
+                        state["ids"].append(chunk_id)
+                        stats["kept"] += 1
+                        if dedup:
+                            dedup.register(chunk_id, chunk.page_content)
+                    elif dedup and dedup.check(source, chunk_id, chunk.page_content):
+                        stats["duplicates"] += 1
+                        stats["duplicate_chars"] += len(chunk.page_content)
+                    else:
+                        state["ids"].append(chunk_id)
+                        pending.append((source, chunk, chunk_id))
+                stage.add(len(chunks) if dedup else 0)
+            state["done"] = page_batch.is_last
+
+            if len(pending) >= batch_size:
+                flush()
+        flush()
     except Exception as e:
-        print(f"Error initializing HuggingFace Embeddings: {e}")
-        return
+        print(f"Error during Chroma vector store update: {e}")
+        print("Completed batches are checkpointed; rerun process_documents.py to resume.")
+        return False
+    finally:
+        embedder.close()
+        if use_cache:
+            embedding_function.close()
 
-    # 2. Clean up previous vector store data
-    if os.path.exists(VECTOR_DB_PATH):
-        print(f"Removing existing vector store at {VECTOR_DB_PATH}...")
-        shutil.rmtree(VECTOR_DB_PATH)
-    
-    # 3. Create a new Chroma instance and persist the data
-    print(f"Creating new Chroma store and embedding {len(chunks)} chunks...")
-    try:
-        vectorstore = Chroma.from_documents(
-            chunks, 
-            embedding_function, 
-            persist_directory=VECTOR_DB_PATH
+    if not checkpoint.written:
+        checkpoint.clear()
+
+    print(f"✅ Indexing complete! Vector store built in {BUILD_PATH}")
+    print(
+        f"   Files: {len(diff['added'])} added, {len(diff['updated'])} updated, "
+        f"{len(diff['removed'])} removed, {len(diff['unchanged'])} unchanged"
+        + (f", {stats['failed']} failed" if stats["failed"] else "")
+    )
+    print(f"   Chunks: {stats['embedded']} embedded, {stats['deleted']} deleted, {stats['kept']} kept")
+    if use_cache:
+        print(
+            f"   Embedding cache: {embedding_function.hits} hits, {embedding_function.misses} misses "
+            f"({embedding_function.hit_rate:.0%} hit rate)"
         )
-        print(f"✅ Indexing complete! Vector store saved at {VECTOR_DB_PATH}")
-    except Exception as e:
-        print(f"Error during Chroma vector store creation: {e}")
+    if embedder.total_texts:
+        print(
+            f"   Embedding: {embedder.total_texts} chunks in {embedder.total_seconds:.2f}s "
+            f"({embedder.texts_per_second:.1f} chunks/sec across {embed_workers} workers)"
+        )
+    if dedup:
+        considered = stats["duplicates"] + stats["embedded"]
+        seconds_per_chunk = embedder.total_seconds / max(embedder.total_texts, 1)
+        saved_bytes = stats["duplicates"] * EMBEDDING_DIMENSION * 4 + stats["duplicate_chars"]
+        print(
+            f"   Dedup: {stats['duplicates']} near-duplicate chunks dropped "
+            f"({stats['duplicates'] / max(considered, 1):.1%} of new chunks), "
+            f"{stats['boilerplate_lines']} header/footer lines stripped; "
+            f"saved ~{saved_bytes / 1e6:.1f} MB of index and ~{stats['duplicates'] * seconds_per_chunk:.1f}s of embedding"
+        )
+    profiler.counts.update(stats)
+    return True
+
+def build_engines(store_dir: str, requested: list, profiler: StageProfiler) -> list:
+    """
+    (Re)builds standalone search engines from the vectors in the store: the
+    requested ones plus any already present, which were copied from the
+    previous version and may be stale. Returns the names of the engines built.
+    """
+    engines = [name for name in ENGINE_BUILDERS
+               if name in requested or os.path.isdir(os.path.join(store_dir, name))]
+    if not engines:
+        return []
+    with profiler.stage("engines", unit="vectors") as stage:
+        store: StoreVectors = load_store_vectors(store_dir)
+        for name in engines:
+            ENGINE_BUILDERS[name](store, os.path.join(store_dir, name))
+        stage.add(len(store) * len(engines))
+    print(f"🔧 Built {', '.join(engines)} search engine(s) over {len(store)} vectors")
+    return engines
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or update the Buffett's Brain vector store.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Build a new vector store from scratch instead of updating a copy of the current one")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Processes used for PDF parsing (default: %(default)s)")
+    parser.add_argument("--pdf-backend", default=PDF_BACKEND, choices=["auto"] + PREFERRED_ORDER,
+                        help="PDF text extractor (default: %(default)s, the fastest installed)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE,
+                        help="Chunks embedded and written per batch (default: %(default)s)")
+    parser.add_argument("--embed-workers", type=int, default=DEFAULT_EMBED_WORKERS,
+                        help="Processes used for embedding, one model each (default: %(default)s)")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help="Texts per embedding forward pass (default: %(default)s)")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Keep near-duplicate chunks and running headers/footers")
+    parser.add_argument("--no-page-cache", action="store_true",
+                        help="Always re-parse PDFs instead of reusing cached page text")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Always recompute embeddings instead of reading through the on-disk cache")
+    parser.add_argument("--rebuild-shard", action="append", default=[], choices=SHARDS,
+                        help="Re-index every file of this source family from scratch, leaving the other shards "
+                             "as they are (repeatable)")
+    parser.add_argument("--engine", action="append", default=[], choices=sorted(ENGINE_BUILDERS),
+                        help="Also build this standalone search engine from the stored vectors (repeatable)")
+    parser.add_argument("--report", metavar="PATH",
+                        help=f"Where to write the JSON build profile (default: a timestamped file in {BUILD_REPORTS_DIR})")
+    return parser.parse_args()
+
+def backfill_facts(facts: FactTable, sources: list, args) -> int:
+    """
+    Empties an outdated (or new) fact table and re-extracts the performance
+    tables of the given already indexed letters; returns how many were read.
+    Page text comes from the page text cache, so no embedding work is redone.
+    """
+    facts.reset()
+    letters = [path for path in sources
+               if path.endswith(".pdf") and source_metadata(path)["source_type"] in LETTER_TYPES]
+    if not letters:
+        return 0
+    pages = SourceTagger().tag(load_documents(letters, workers=args.workers, pdf_backend=args.pdf_backend,
+                                              use_page_cache=not args.no_page_cache))
+    by_source = {}
+    for fact in extract_performance_facts(pages):
+        by_source.setdefault(fact.source, []).append(fact)
+    for source in letters:
+        facts.replace_source(source, by_source.get(source, []))
+    return len(letters)
+
+def reset_shards(shards: list, manifest: IndexManifest, config: dict) -> list:
+    """
+    Empties the given shards of the staging store and forgets their files, so
+    this run re-indexes them as new. Returns the chunk IDs that were dropped.
+    """
+    checkpoint = IngestCheckpoint(CHECKPOINT_PATH, config)
+    dropped = []
+    for shard in shards:
+        drop_shard(BUILD_PATH, shard)
+        for source in [s for s in list(manifest.files) + list(checkpoint.written) if shard_for_source(s) == shard]:
+            dropped.extend(manifest.chunk_ids(source))
+            manifest.remove_file(source)
+            checkpoint.finish_file(source)
+        print(f"Shard '{shard}' emptied; its files will be re-indexed.")
+    return dropped
+
+def build_index(args, config: dict, file_hashes: dict, profiler: StageProfiler):
+    """Brings the staging store up to date with the source files; returns (completed, diff)."""
+    moved = migrate_to_shards(BUILD_PATH)
+    if moved:
+        print(f"Moved {moved} chunks of the single-collection store into per-source shards.")
+    manifest = IndexManifest(INDEX_MANIFEST_PATH)
+    dropped_ids = reset_shards(args.rebuild_shard, manifest, config)
+    diff = manifest.diff(file_hashes, config)
+    dedup = None if args.no_dedup else DedupIndex(DEDUP_INDEX_PATH)
+    if dedup:
+        # Files that dropped duplicates of chunks about to be deleted must be re-processed
+        deleted_ids = dropped_ids + [i for source in diff["removed"] + diff["updated"]
+                                     for i in manifest.chunk_ids(source)]
+        for source in sorted(dedup.dependents_of(deleted_ids) & set(diff["unchanged"])):
+            diff["unchanged"].remove(source)
+            diff["updated"].append(source)
+        # Chunks of changed files only count as canonical again once re-read
+        dedup.forget(deleted_ids)
+    print(
+        f"Source files: {len(diff['added'])} added, {len(diff['updated'])} updated, "
+        f"{len(diff['removed'])} removed, {len(diff['unchanged'])} unchanged"
+    )
+    facts = FactTable(FACT_TABLE_PATH)
+    docstore = ParentDocstore(PARENT_DOCSTORE_PATH) if config["child_size"] else None
+    if not docstore and os.path.exists(PARENT_DOCSTORE_PATH):
+        # Without children the chunks are embedded directly; the old parents must not be served
+        os.remove(PARENT_DOCSTORE_PATH)
+    try:
+        if not facts.is_current():
+            with profiler.stage("facts", unit="files") as stage:
+                backfilled = backfill_facts(facts, diff["unchanged"], args)
+                stage.add(backfilled)
+            print(f"Fact table: re-extracted performance tables of {backfilled} unchanged letters.")
+        if not (diff["added"] or diff["updated"] or diff["removed"]):
+            # An interrupted run that had already written everything only needs publishing
+            return True, diff
+
+        changed = set(diff["added"] + diff["updated"])
+        page_batches = iter_page_batches(changed, workers=args.workers, pdf_backend=args.pdf_backend,
+                                         file_hashes=file_hashes, use_page_cache=not args.no_page_cache)
+        completed = add_to_chroma(page_batches, diff, file_hashes, manifest, config, batch_size=args.batch_size,
+                                  embed_workers=args.embed_workers, embed_batch_size=args.embed_batch_size,
+                                  use_cache=not args.no_embedding_cache, dedup=dedup, profiler=profiler,
+                                  facts=facts, docstore=docstore)
+        print(f"   Fact table: {facts.count()} per-year figures from the letters' performance tables")
+        if docstore:
+            print(f"   Parent docstore: {docstore.count()} passages behind the embedded sentence windows")
+        return completed, diff
+    finally:
+        facts.close()
+        if docstore:
+            docstore.close()
 
 def main():
     """Main function to run the document processing pipeline."""
+    args = parse_args()
+    profiler = StageProfiler()
     print("🚀 Starting document processing pipeline...")
     print("=" * 60)
-    
-    documents = load_documents()
-    if not documents:
+
+    with profiler.stage("hash", unit="files") as stage:
+        file_hashes = hash_source_files()
+        stage.add(len(file_hashes))
+    if not file_hashes:
         print("❌ No documents found. Please ensure your PDFs are in the 'knowledge_base/docs' folder.")
         return
 
-    chunks = split_documents(documents)
-    
-    if chunks:
-        add_to_chroma(chunks)
-        print("=" * 60)
-        print("✅ All done! Your knowledge base is ready to use.")
+    config = index_config(args.pdf_backend, dedup=not args.no_dedup)
+    published = IndexManifest(os.path.join(current_path(VECTOR_DB_PATH), MANIFEST_FILENAME))
+    diff = published.diff(file_hashes, config)
+    resuming = os.path.exists(BUILD_PATH) and not args.rebuild
+    # A fact table missing from (or outdated in) the published version is backfilled by a build
+    stale_facts = not table_is_current(os.path.join(current_path(VECTOR_DB_PATH), FACT_TABLE_FILENAME))
+    engines = sorted(set(args.engine + DEFAULT_ENGINES))
+    missing_engines = [name for name in engines
+                       if not os.path.isdir(os.path.join(current_path(VECTOR_DB_PATH), name))]
+    # Stores from before sharding are split into per-source shards by the next build
+    unsharded = is_legacy_store(current_path(VECTOR_DB_PATH))
+    changed = (diff["added"] or diff["updated"] or diff["removed"] or stale_facts or missing_engines
+               or args.rebuild_shard or unsharded)
+    if resuming or args.rebuild or changed:
+        # Stores built without a manifest have random chunk IDs and cannot be updated in place
+        rebuild = args.rebuild or (not resuming and not published.exists())
+        if resuming:
+            print(f"Resuming the interrupted build in {BUILD_PATH}...")
+        elif rebuild:
+            print(f"Building a new vector store from scratch in {BUILD_PATH}...")
+        with profiler.stage("snapshot", unit="builds") as stage:
+            prepare_staging(VECTOR_DB_PATH, rebuild=rebuild)
+            stage.add(1)
+        completed, diff = build_index(args, config, file_hashes, profiler)
+        if completed:
+            build_engines(BUILD_PATH, engines, profiler)
+            version = publish(VECTOR_DB_PATH)
+            print(f"📦 Published index version {version}; running apps switch to it automatically.")
+            # Page text of PDFs that were edited or deleted can never be reused
+            PageTextCache(PAGE_CACHE_DIR).prune(file_hashes.values())
     else:
-        print("❌ No chunks were generated. Stopping process.")
+        print(f"Source files: {len(diff['unchanged'])} unchanged")
+        print("✅ Vector store is already up to date.")
+        completed = True
+
+    report_path = profiler.write_report(
+        args.report, completed=completed, config=config, args=vars(args),
+        files={kind: len(paths) for kind, paths in diff.items()},
+    )
+    print("=" * 60)
+    print("⏱️ Build profile:")
+    profiler.print_summary()
+    print(f"   Report written to {report_path}")
+    if completed:
+        print("✅ All done! Your knowledge base is ready to use.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
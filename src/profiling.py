@@ -0,0 +1,191 @@
+"""
+Per-stage profiling for index builds.
+
+StageProfiler accumulates wall time, CPU time, item counts and resident
+memory for each named stage (parse, split, dedup, embed, write, ...).
+Stages nest and are charged exclusively: while `embed` runs inside `write`,
+its time is not also counted as Chroma write time. The result is written as
+a JSON report per run so build performance can be tracked over time.
+
+Memory is the current RSS, sampled whenever a stage is entered or left:
+`max_rss_mb` is the largest sample taken at the stage's boundaries and
+`rss_delta_mb` the net growth while it ran (exclusive, like its time). A
+spike freed again before the stage returns is not seen; the run's
+high-water mark is `peak_rss_mb` at the top of the report.
+
+CPU time is that of the ingesting process; parse and embedding workers are
+reported together as `children_cpu_seconds` once their pools have exited.
+The profiler is meant to be driven from one thread.
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from langchain_core.embeddings import Embeddings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BUILD_REPORTS_DIR = "../knowledge_base/build_reports"
+
+
+def peak_rss_mb(who: str = "self"):
+    """High-water resident set size in MB of this process ("self") or its reaped children, if known."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def current_rss_mb():
+    """Resident set size in MB of this process right now, if known (Linux only)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def children_cpu_seconds():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+@dataclass
+class StageStats:
+    name: str
+    unit: str = "items"
+    items: int = 0
+    calls: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    max_rss_mb: float = None
+    rss_delta_mb: float = None
+
+    def add(self, count: int):
+        self.items += count
+
+    def to_dict(self) -> dict:
+        return {
+            "unit": self.unit,
+            "items": self.items,
+            "calls": self.calls,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            f"{self.unit}_per_second": round(self.items / self.wall_seconds, 2) if self.wall_seconds else None,
+            "max_rss_mb": round(self.max_rss_mb, 1) if self.max_rss_mb is not None else None,
+            "rss_delta_mb": round(self.rss_delta_mb, 1) if self.rss_delta_mb is not None else None,
+        }
+
+
+class StageProfiler:
+    """Collects StageStats; use `with profiler.stage("split", unit="chunks") as s: ...; s.add(n)`."""
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}    # free-form run counters included in the report
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._started = self._clock()
+        self._stack = []    # [stats, wall_start, cpu_start, rss_start] of the active stages, innermost last
+
+    @staticmethod
+    def _clock():
+        return time.perf_counter(), time.process_time(), current_rss_mb()
+
+    @staticmethod
+    def _charge(frame, now):
+        stats, wall_start, cpu_start, rss_start = frame
+        stats.wall_seconds += now[0] - wall_start
+        stats.cpu_seconds += now[1] - cpu_start
+        if rss_start is not None and now[2] is not None:
+            stats.rss_delta_mb = (stats.rss_delta_mb or 0.0) + now[2] - rss_start
+            stats.max_rss_mb = max(stats.max_rss_mb or 0.0, rss_start, now[2])
+
+    @contextmanager
+    def stage(self, name: str, unit: str = "items"):
+        stats = self.stages.setdefault(name, StageStats(name, unit))
+        now = self._clock()
+        if self._stack:
+            self._charge(self._stack[-1], now)
+        self._stack.append([stats, *now])
+        try:
+            yield stats
+        finally:
+            now = self._clock()
+            self._charge(self._stack.pop(), now)
+            if self._stack:
+                self._stack[-1][1:] = now
+            stats.calls += 1
+
+    def iterate(self, name: str, iterable, unit: str = "items", count=len):
+        """Yields from `iterable`, charging the time spent producing each item to stage `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name, unit) as stats:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                stats.add(count(item))
+            yield item
+
+    def report(self, **extra) -> dict:
+        wall, cpu = (now - start for now, start in zip(self._clock()[:2], self._started))
+        return {
+            "started_at": self.started_at,
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "children_cpu_seconds": children_cpu_seconds(),
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb("children"),
+            "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+            "counts": self.counts,
+            **extra,
+        }
+
+    def write_report(self, path: str = None, **extra) -> str:
+        """Writes the JSON report (default: a timestamped file in BUILD_REPORTS_DIR) and returns its path."""
+        if path is None:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            path = os.path.join(BUILD_REPORTS_DIR, f"build_{stamp}.json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(**extra), f, indent=2)
+        return path
+
+    def print_summary(self):
+        print(f"   {'stage':<8} {'wall (s)':>9} {'cpu (s)':>8} {'items':>8} {'rate/s':>9} {'max RSS':>9} {'RSS +/-':>9}")
+        for name, stats in self.stages.items():
+            rate = stats.items / stats.wall_seconds if stats.wall_seconds else 0.0
+            rss = f"{stats.max_rss_mb:.0f} MB" if stats.max_rss_mb is not None else "n/a"
+            delta = f"{stats.rss_delta_mb:+.0f} MB" if stats.rss_delta_mb is not None else "n/a"
+            print(f"   {name:<8} {stats.wall_seconds:>9.2f} {stats.cpu_seconds:>8.2f} "
+                  f"{stats.items:>8} {rate:>9.1f} {rss:>9} {delta:>9}")
+
+
+class ProfiledEmbeddings(Embeddings):
+    """Charges every embedding call (cache lookups included) to the profiler's `embed` stage."""
+
+    def __init__(self, inner: Embeddings, profiler: StageProfiler):
+        self.inner = inner
+        self.profiler = profiler
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with self.profiler.stage("embed", unit="vectors") as stats:
+            stats.add(len(texts))
+            return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        with self.profiler.stage("embed", unit="vectors") as stats:
+            stats.add(1)
+            return self.inner.embed_query(text)
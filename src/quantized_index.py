@@ -0,0 +1,156 @@
+"""
+Compact vector index: int8 first pass, full-precision rescoring.
+
+Chroma keeps every 384-dim vector as float32 in its HNSW graph, so index
+memory grows by ~1.5 KB per chunk. QuantizedIndex keeps only a compact code
+per chunk in memory:
+
+  * optional PCA to `pca_dims` dimensions (fitted on the corpus), then
+  * int8 scalar quantization with one scale per dimension
+
+A query is scored against all codes (float query vs. int8 codes, in blocks),
+and the best `candidates` rows are rescored exactly against the normalized
+float32 vectors, which stay on disk and are memory-mapped, so only the
+candidate rows are ever paged in. Files, under <version>/quantized/:
+
+    meta.json                  {"format", "count", "dim", "code_dim", "pca"}
+    ids.json                   chunk IDs, row order
+    codes.npy                  int8 (count, code_dim)
+    scales.npy                 float32 (code_dim,)
+    bias.npy                   float32 (count,): mean · x, the score term PCA centering removes
+    pca_mean.npy, pca_components.npy       with PCA only
+    full.npy                   float32 (count, dim), memory-mapped for rescoring
+
+Built by `process_documents.py --engine quantized` from the vectors already
+in the store; `python benchmark_quantization.py` measures memory, latency and
+recall@4 against the Chroma store.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from store_vectors import normalize
+
+QUANTIZED_DIRNAME = "quantized"
+QUANTIZED_FORMAT = 1
+# None keeps all dimensions (int8 alone is 4x smaller than float32)
+PCA_DIMS = None
+# First-pass hits rescored at full precision
+RESCORE_CANDIDATES = 40
+# Rows dequantized per block during the first pass (bounds the temporary float copy)
+SEARCH_BLOCK_ROWS = 65536
+
+
+def fit_pca(vectors: np.ndarray, dims: int) -> tuple[np.ndarray, np.ndarray]:
+    """(mean, components) of the top `dims` principal directions; components is (dim, dims)."""
+    mean = vectors.mean(axis=0)
+    centered = vectors - mean
+    covariance = centered.T @ centered / max(len(vectors) - 1, 1)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    top = np.argsort(eigenvalues)[::-1][:dims]
+    return mean.astype(np.float32), eigenvectors[:, top].astype(np.float32)
+
+
+def quantize(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-dimension int8 quantization; returns (codes, scales)."""
+    scales = np.abs(values).max(axis=0) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(values / scales), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def build_quantized_index(ids: list, vectors: np.ndarray, out_dir: str, pca_dims: int = PCA_DIMS) -> dict:
+    """Writes a QuantizedIndex for `vectors` (rows aligned with `ids`) to `out_dir`; returns its meta."""
+    full = normalize(vectors)
+    count, dim = full.shape
+    use_pca = bool(pca_dims) and pca_dims < dim
+    if use_pca:
+        mean, components = fit_pca(full, pca_dims)
+        reduced = (full - mean) @ components
+        bias = full @ mean
+    else:
+        reduced, bias = full, np.zeros(count, dtype=np.float32)
+    codes, scales = quantize(reduced)
+
+    meta = {"format": QUANTIZED_FORMAT, "count": count, "dim": dim,
+            "code_dim": int(codes.shape[1]), "pca": use_pca}
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "codes.npy"), codes)
+    np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+    np.save(os.path.join(tmp_dir, "bias.npy"), bias.astype(np.float32))
+    np.save(os.path.join(tmp_dir, "full.npy"), full)
+    if use_pca:
+        np.save(os.path.join(tmp_dir, "pca_mean.npy"), mean)
+        np.save(os.path.join(tmp_dir, "pca_components.npy"), components)
+    with open(os.path.join(tmp_dir, "ids.json"), "w") as f:
+        json.dump(list(ids), f)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(tmp_dir, out_dir)
+    return meta
+
+
+class QuantizedIndex:
+    """Loads an index written by build_quantized_index; search() returns [(chunk id, score)]."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != QUANTIZED_FORMAT:
+            raise ValueError(f"Unsupported quantized index format {self.meta.get('format')} in {path}")
+        with open(os.path.join(path, "ids.json")) as f:
+            self.ids = json.load(f)
+        self.codes = np.load(os.path.join(path, "codes.npy"))
+        self.scales = np.load(os.path.join(path, "scales.npy"))
+        self.bias = np.load(os.path.join(path, "bias.npy"))
+        self.full = np.load(os.path.join(path, "full.npy"), mmap_mode="r")
+        if self.meta["pca"]:
+            self.pca_mean = np.load(os.path.join(path, "pca_mean.npy"))
+            self.pca_components = np.load(os.path.join(path, "pca_components.npy"))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def close(self):
+        """Drops the memory maps; a file is unmapped once no array taken from it is left."""
+        self.full = None
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held in memory for the first pass (full-precision vectors stay on disk)."""
+        resident = self.codes.nbytes + self.scales.nbytes + self.bias.nbytes
+        if self.meta["pca"]:
+            resident += self.pca_mean.nbytes + self.pca_components.nbytes
+        return resident
+
+    def first_pass(self, query: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+        """(rows, approximate scores) of the best `n` rows, best first."""
+        projected = (query - self.pca_mean) @ self.pca_components if self.meta["pca"] else query
+        weights = (projected * self.scales).astype(np.float32)
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), SEARCH_BLOCK_ROWS):
+            block = self.codes[start:start + SEARCH_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = block @ weights + self.bias[start:start + len(block)]
+        n = min(n, len(scores))
+        rows = np.argpartition(-scores, n - 1)[:n] if n < len(scores) else np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows])]
+        return rows, scores[rows]
+
+    def search(self, query_vector, k: int = 4, candidates: int = RESCORE_CANDIDATES, rescore: bool = True) -> list:
+        """Top `k` (chunk id, cosine similarity); with `rescore`, the first pass keeps `candidates` rows."""
+        if not self.ids:
+            return []
+        query = normalize(np.asarray(query_vector, dtype=np.float32))
+        rows, scores = self.first_pass(query, max(k, candidates) if rescore else k)
+        if rescore:
+            ordered = np.sort(rows)    # sequential reads from the memory map
+            exact = np.asarray(self.full[ordered]) @ query
+            best = np.argsort(-exact)[:k]
+            rows, scores = ordered[best], exact[best]
+        return [(self.ids[row], float(score)) for row, score in zip(rows[:k], scores[:k])]
@@ -0,0 +1,392 @@
+"""
+Retrievers used by the chat apps.
+
+MetadataFilteredRetriever parses explicit source/year references out of the
+query (see source_metadata.py) and runs the similarity search on the matching
+subset of the collection only. When a filter matches fewer than `k` chunks
+(e.g. a year the corpus does not cover), the results are topped up from an
+unfiltered search, so a constraint never makes an answer worse.
+
+ShardedRetriever does the same over the per-source shards of the store (see
+shards.py): the query is embedded once, every shard is searched on its own
+thread and the per-shard top-k lists are merged by distance, so latency
+follows the slowest shard rather than the sum of all of them. A source
+constraint also limits which shards are searched.
+
+VectorIndexRetriever searches a standalone vector index built next to the
+Chroma files (quantized_index.py, flat_index.py) and fetches the hits' text
+by key: a chunk ID looked up in the Chroma shards, or a row of the flat index's own
+chunk file. Queries with explicit source/year constraints go to a filtered Chroma
+retriever instead, since the standalone indexes hold vectors only.
+
+LexicalRetriever searches the BM25 index (bm25_index.py) for exact terms, and
+HybridRetriever runs it and a dense retriever in parallel and merges the two
+rankings with reciprocal rank fusion: a chunk's score is the sum of
+1 / (RRF_K + rank) over the rankings it appears in, so a chunk both paths
+rank highly comes first, and one only BM25 finds (a name, a ticker, a year)
+still makes the cut. The latency of each path is recorded per query.
+
+SmallToBigRetriever sits on top of any of these when the index embeds
+sentence windows (small_to_big.py): it looks up the parent passages of the
+matched windows in the docstore and returns each hit grown back into its
+passage, deduplicated per parent and capped at a length budget.
+
+ReloadingRetriever serves queries from the published index version (see
+index_versions.py). When process_documents.py publishes a new version it is
+loaded and warmed up on a background thread while queries keep hitting the
+old one, then swapped in; a running app never needs a restart. The replaced
+retriever is closed (close_retriever) once its last in-flight query is done.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
+from langchain_core.vectorstores import VectorStore
+from pydantic import PrivateAttr
+
+from index_versions import current_version, version_path
+from shards import SHARDS, shards_for_types
+from small_to_big import CONTEXT_CHAR_BUDGET, WINDOW_CHARS, expand_windows
+from source_metadata import chroma_where, parse_query_constraints
+
+DEFAULT_K = 4
+# Seconds between checks of the CURRENT pointer (one small file read)
+RELOAD_CHECK_INTERVAL = 5.0
+# Run once against a freshly loaded version so the first real query is not a cold one
+WARMUP_QUERY = "Berkshire Hathaway"
+# Shared by all ShardedRetrievers, so a hot-swapped version does not leave idle threads behind
+_SHARD_POOL = ThreadPoolExecutor(max_workers=len(SHARDS), thread_name_prefix="shard-search")
+# Runs the dense and lexical paths of HybridRetriever; separate from _SHARD_POOL, whose tasks it waits on
+_PATH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+# Reciprocal rank fusion constant: larger values flatten the advantage of the top ranks
+RRF_K = 60
+# Candidates each path contributes to the fusion
+HYBRID_CANDIDATES = 10
+# Recent queries kept for HybridRetriever.latency_summary
+LATENCY_WINDOW = 200
+
+
+def _chunk_key(doc: Document):
+    return doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content
+
+
+class MetadataFilteredRetriever(BaseRetriever):
+    """Similarity search restricted by the constraints found in the query."""
+
+    vectorstore: VectorStore
+    k: int = DEFAULT_K
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        where = chroma_where(parse_query_constraints(query))
+        if where is None:
+            return self.vectorstore.similarity_search(query, k=self.k)
+
+        documents = self.vectorstore.similarity_search(query, k=self.k, filter=where)
+        if len(documents) < self.k:
+            seen = {_chunk_key(doc) for doc in documents}
+            for doc in self.vectorstore.similarity_search(query, k=self.k):
+                if len(documents) == self.k:
+                    break
+                if _chunk_key(doc) not in seen:
+                    documents.append(doc)
+        return documents
+
+
+class ShardedRetriever(BaseRetriever):
+    """Similarity search fanned out over the store's shards ({name: vectorstore}), merged by distance."""
+
+    shards: dict[str, VectorStore]
+    k: int = DEFAULT_K
+
+    def search_by_vector(self, embedding: list[float], k: int, where: dict = None,
+                         names: list[str] = None) -> list[tuple[Document, float]]:
+        """Top `k` (Document, distance) over the named shards (default: all), searched concurrently."""
+        futures = [
+            _SHARD_POOL.submit(self.shards[name].similarity_search_by_vector_with_relevance_scores,
+                               embedding, k=k, filter=where)
+            for name in (self.shards if names is None else names) if name in self.shards
+        ]
+        hits = [hit for future in futures for hit in future.result()]
+        return sorted(hits, key=lambda hit: hit[1])[:k]
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        if not self.shards:
+            return []
+        embedding = next(iter(self.shards.values())).embeddings.embed_query(query)
+        constraints = parse_query_constraints(query)
+        where = chroma_where(constraints)
+        if where is None:
+            return [doc for doc, _ in self.search_by_vector(embedding, self.k)]
+
+        names = shards_for_types(constraints.source_types) if constraints.source_types else None
+        documents = [doc for doc, _ in self.search_by_vector(embedding, self.k, where, names)]
+        if len(documents) < self.k:
+            seen = {_chunk_key(doc) for doc in documents}
+            for doc, _ in self.search_by_vector(embedding, self.k):
+                if len(documents) == self.k:
+                    break
+                if _chunk_key(doc) not in seen:
+                    documents.append(doc)
+        return documents
+
+
+def fetch_from_chroma(vectorstores: list, ids: list[str]) -> list[Document]:
+    """Documents for chunk IDs from langchain Chroma stores (e.g. the shards), in the order of `ids`."""
+    by_id = {}
+    for vectorstore in vectorstores:
+        rows = vectorstore.get(ids=ids)
+        by_id.update((i, (text, metadata))
+                     for i, text, metadata in zip(rows["ids"], rows["documents"], rows["metadatas"]))
+    return [Document(page_content=by_id[i][0], metadata=by_id[i][1] or {}) for i in ids if i in by_id]
+
+
+class VectorIndexRetriever(BaseRetriever):
+    """
+    Top-k search on a standalone index: `index.search(query_vector, k)`
+    returns [(key, score)] and `fetch_documents(keys)` the Documents.
+    """
+
+    index: Any
+    embeddings: Embeddings
+    fetch_documents: Callable[[list[str]], list[Document]]
+    filtered: Optional[Runnable] = None
+    k: int = DEFAULT_K
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        if self.filtered is not None and parse_query_constraints(query):
+            return self.filtered.invoke(query)
+        hits = self.index.search(self.embeddings.embed_query(query), k=self.k)
+        return self.fetch_documents([key for key, _ in hits])
+
+
+class LexicalRetriever(BaseRetriever):
+    """BM25 top-k: `index.search(query, k, constraints)` returns [(chunk id, score)], fetched as Documents."""
+
+    index: Any
+    fetch_documents: Callable[[list[str]], list[Document]]
+    k: int = DEFAULT_K
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        hits = self.index.search(query, k=self.k, constraints=parse_query_constraints(query))
+        return self.fetch_documents([key for key, _ in hits])
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], k: int, rrf_k: int = RRF_K) -> list[Document]:
+    """Top `k` of the merged rankings by sum of 1 / (rrf_k + rank); ties keep the earlier ranking's order."""
+    scores, documents = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _chunk_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+    ordered = sorted(scores, key=lambda key: -scores[key])   # stable: first-seen order breaks ties
+    return [documents[key] for key in ordered[:k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense and lexical retrieval run concurrently, fused with reciprocal rank
+    fusion. Both retrievers should return more than `k` candidates
+    (HYBRID_CANDIDATES). Milliseconds per path are kept for the last
+    LATENCY_WINDOW queries (latency_summary).
+    """
+
+    dense: Runnable
+    lexical: Runnable
+    k: int = DEFAULT_K
+    rrf_k: int = RRF_K
+
+    _latencies: deque = PrivateAttr(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    @staticmethod
+    def _timed(retriever, query):
+        started = time.perf_counter()
+        documents = retriever.invoke(query)
+        return documents, (time.perf_counter() - started) * 1000
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        started = time.perf_counter()
+        dense = _PATH_POOL.submit(self._timed, self.dense, query)
+        lexical = _PATH_POOL.submit(self._timed, self.lexical, query)
+        dense_docs, dense_ms = dense.result()
+        lexical_docs, lexical_ms = lexical.result()
+        documents = reciprocal_rank_fusion([dense_docs, lexical_docs], self.k, self.rrf_k)
+        self._latencies.append({"dense": dense_ms, "lexical": lexical_ms,
+                                "total": (time.perf_counter() - started) * 1000})
+        return documents
+
+    @property
+    def last_latency(self) -> dict:
+        """{"dense", "lexical", "total"} milliseconds of the latest query (empty before the first)."""
+        return dict(self._latencies[-1]) if self._latencies else {}
+
+    def latency_summary(self) -> dict:
+        """{path: {"p50": ms, "p95": ms}} over the recent queries."""
+        recent = list(self._latencies)
+        if not recent:
+            return {}
+        return {path: {"p50": float(np.percentile([t[path] for t in recent], 50)),
+                       "p95": float(np.percentile([t[path] for t in recent], 95))}
+                for path in recent[0]}
+
+
+class SmallToBigRetriever(BaseRetriever):
+    """
+    Expands the sentence windows found by `retriever` into passages of their
+    parents from `docstore` (`get(parent_ids)` returns {id: Document}); see
+    expand_windows for `budget`, `window` and `length_function`. Give the
+    inner retriever more than DEFAULT_K results: windows are short, and the
+    budget decides how much context is returned.
+    """
+
+    retriever: Runnable
+    docstore: Any
+    budget: int = CONTEXT_CHAR_BUDGET
+    window: int = WINDOW_CHARS
+    length_function: Callable[[str], int] = len
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        children = self.retriever.invoke(query)
+        parent_ids = {child.metadata["parent_id"] for child in children if child.metadata.get("parent_id")}
+        parents = self.docstore.get(parent_ids) if parent_ids else {}
+        return expand_windows(children, parents, self.budget, self.window, self.length_function)
+
+
+def close_retriever(resource, _seen: set = None):
+    """
+    Releases what a retriever built for one index version holds: docstore
+    connections, memory-mapped indexes and Chroma clients, walking nested
+    retrievers, shards and fetch functions. Embeddings are shared across
+    versions and left open. Only call it once no query is using the retriever.
+    """
+    seen = set() if _seen is None else _seen
+    if resource is None or id(resource) in seen or isinstance(resource, Embeddings):
+        return
+    seen.add(id(resource))
+    if isinstance(resource, BaseRetriever):
+        children = [getattr(resource, name) for name in type(resource).model_fields]
+    elif isinstance(resource, dict):
+        children = list(resource.values())
+    elif isinstance(resource, (list, tuple)):
+        children = list(resource)
+    elif isinstance(resource, partial):
+        children = list(resource.args) + list(resource.keywords.values())
+    elif isinstance(resource, VectorStore):
+        # Chroma's clients are reference counted per path; the last close stops the client
+        children = [getattr(resource, "_client", None)]
+    else:
+        if callable(getattr(resource, "close", None)):
+            resource.close()
+        return
+    for child in children:
+        close_retriever(child, seen)
+
+
+class ReloadingRetriever(BaseRetriever):
+    """
+    Delegates to a retriever for the published index version, built by
+    `load_retriever(path)`, and hot-swaps it when a new version is published.
+    The replaced retriever is closed as soon as no query is running on it. A
+    version that fails to load is reported and retried at the next check;
+    the old one stays active.
+    """
+
+    root: str
+    load_retriever: Callable[[str], BaseRetriever]
+    check_interval: float = RELOAD_CHECK_INTERVAL
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _active: tuple = PrivateAttr(default=None)      # (version, retriever)
+    _pending: set = PrivateAttr(default_factory=set)  # versions being loaded
+    _in_flight: dict = PrivateAttr(default_factory=dict)  # version -> queries running on it
+    _retired: dict = PrivateAttr(default_factory=dict)    # version -> replaced retriever, closed when idle
+    _last_check: float = PrivateAttr(default=0.0)
+
+    def model_post_init(self, __context):
+        version = current_version(self.root)
+        self._active = (version, self._load(version))
+        self._last_check = time.monotonic()
+
+    @property
+    def version(self):
+        return self._active[0]
+
+    @property
+    def active(self) -> BaseRetriever:
+        """The retriever currently serving queries."""
+        return self._active[1]
+
+    def _load(self, version) -> BaseRetriever:
+        retriever = self.load_retriever(version_path(self.root, version))
+        try:
+            retriever.invoke(WARMUP_QUERY)
+        except Exception:
+            close_retriever(retriever)
+            raise
+        return retriever
+
+    def _switch(self, version):
+        try:
+            try:
+                retriever = self._load(version)
+            except Exception as e:
+                print(f"⚠️ Could not load index version {version}, still serving {self.version}: {e}")
+                return
+            with self._lock:
+                old_version, old = self._active
+                self._active = (version, retriever)
+                if self._in_flight.get(old_version):
+                    self._retired[old_version] = old
+                    old = None
+            close_retriever(old)
+        finally:
+            with self._lock:
+                self._pending.discard(version)
+
+    def check_for_update(self, wait: bool = False):
+        """Starts loading a newly published version, if any (at most once per check_interval)."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        version = current_version(self.root)
+        with self._lock:
+            if version == self._active[0] or version in self._pending:
+                return
+            self._pending.add(version)
+        loader = threading.Thread(target=self._switch, args=(version,), daemon=True)
+        loader.start()
+        if wait:
+            loader.join()
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        self.check_for_update()
+        with self._lock:
+            version, retriever = self._active
+            self._in_flight[version] = self._in_flight.get(version, 0) + 1
+        try:
+            return retriever.invoke(query)
+        finally:
+            with self._lock:
+                self._in_flight[version] -= 1
+                idle = None
+                if not self._in_flight[version]:
+                    del self._in_flight[version]
+                    idle = self._retired.pop(version, None)
+            close_retriever(idle)
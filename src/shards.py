@@ -0,0 +1,104 @@
+"""
+Per-source-family shards of the vector store.
+
+The store holds one Chroma collection per source family rather than one
+collection for everything:
+
+    letters       annual letters and the 1977-2002 archive
+    almanack      Poor Charlie's Almanack
+    speeches      Munger's speeches
+    transcripts   Daily Journal meeting transcripts
+
+process_documents.py writes every chunk to the shard of its source file, so
+one family can be rebuilt (`--rebuild-shard letters`) without touching the
+others. At query time ShardedRetriever (retrieval.py) searches the shards
+concurrently and merges their top-k by distance; a query that names a source
+("in the Almanack") only searches that source's shard.
+
+Stores written before sharding keep every chunk in langchain's default
+collection. migrate_to_shards moves those rows into the shards together with
+their embeddings, so nothing is re-embedded.
+"""
+import os
+
+from source_metadata import ALMANACK, ANNUAL_LETTER, LETTER_ARCHIVE, SPEECH, TRANSCRIPT, source_metadata
+from store_vectors import COPY_BATCH_SIZE, DEFAULT_COLLECTION, collection_names, iter_collection_rows
+
+LETTERS = "letters"
+SHARD_BY_SOURCE_TYPE = {
+    ANNUAL_LETTER: LETTERS,
+    LETTER_ARCHIVE: LETTERS,
+    ALMANACK: "almanack",
+    SPEECH: "speeches",
+    TRANSCRIPT: "transcripts",
+}
+SHARDS = (LETTERS, "almanack", "speeches", "transcripts")
+# The single collection of stores built before sharding
+LEGACY_COLLECTION = DEFAULT_COLLECTION
+
+
+def shard_for_source(source: str) -> str:
+    """Name of the shard a source file's chunks are stored in."""
+    return SHARD_BY_SOURCE_TYPE[source_metadata(source)["source_type"]]
+
+
+def shards_for_types(source_types) -> list[str]:
+    """Shards holding the given source types, in SHARDS order."""
+    wanted = {SHARD_BY_SOURCE_TYPE[source_type] for source_type in source_types}
+    return [name for name in SHARDS if name in wanted]
+
+
+def _client(store_dir: str):
+    import chromadb
+
+    if not os.path.isdir(store_dir):
+        raise FileNotFoundError(f"No vector store at {store_dir}")
+    return chromadb.PersistentClient(path=store_dir)
+
+
+def present_shards(store_dir: str) -> list[str]:
+    """Shards that exist in the store, in SHARDS order."""
+    names = set(collection_names(_client(store_dir)))
+    return [name for name in SHARDS if name in names]
+
+
+def is_legacy_store(store_dir: str) -> bool:
+    """True if the store still has the single pre-sharding collection."""
+    return os.path.isdir(store_dir) and LEGACY_COLLECTION in collection_names(_client(store_dir))
+
+
+def drop_shard(store_dir: str, name: str) -> bool:
+    """Deletes a shard's collection; returns False if it did not exist."""
+    client = _client(store_dir)
+    if name not in collection_names(client):
+        return False
+    client.delete_collection(name)
+    return True
+
+
+def migrate_to_shards(store_dir: str, batch_size: int = COPY_BATCH_SIZE) -> int:
+    """
+    Moves the rows of a pre-sharding store into the shard of their source and
+    drops the old collection; returns the rows moved. Rows are upserted, so
+    an interrupted migration can simply be run again.
+    """
+    client = _client(store_dir)
+    if LEGACY_COLLECTION not in collection_names(client):
+        return 0
+    legacy = client.get_collection(LEGACY_COLLECTION)
+    shards = {}
+    moved = 0
+    for rows in iter_collection_rows(legacy, ["embeddings", "documents", "metadatas"], batch_size):
+        by_shard = {}
+        for row in zip(rows["ids"], rows["embeddings"], rows["documents"], rows["metadatas"]):
+            metadata = row[3] or {}
+            by_shard.setdefault(shard_for_source(metadata.get("source", "")), []).append(row)
+        for name, shard_rows in by_shard.items():
+            if name not in shards:
+                shards[name] = client.get_or_create_collection(name, metadata=legacy.metadata)
+            ids, embeddings, documents, metadatas = zip(*shard_rows)
+            shards[name].upsert(ids=list(ids), embeddings=list(embeddings),
+                                documents=list(documents), metadatas=list(metadatas))
+        moved += len(rows["ids"])
+    client.delete_collection(LEGACY_COLLECTION)
+    return moved
@@ -0,0 +1,217 @@
+"""
+Small-to-big retrieval: search sentence windows, answer with their passages.
+
+A 254-token chunk embeds into one vector that blurs everything it says, and
+pasting four of them into the prompt spends most of the context on text that
+does not answer the question. With small-to-big indexing each chunk (the
+"parent") is split into windows of whole sentences of up to `child_size`
+tokens (the "children"). Only the children are embedded and searched, so a
+hit points at the few sentences that match; the parents go to a docstore.
+At query time expand_windows grows every hit back out within its parent,
+sentence by sentence, merges hits on the same parent into one passage and
+stops at a length budget.
+
+Children carry their parent's metadata plus:
+
+    parent_id                   key of the parent in the docstore
+    window_start, window_end    character offsets of the child in the parent's text
+
+The docstore is a SQLite file in the version directory, replaced per source
+file like the fact table.
+"""
+import json
+import os
+import re
+import sqlite3
+
+from langchain_core.documents import Document
+
+PARENT_DOCSTORE_FILENAME = "parent_docstore.sqlite3"
+# Default length budget of the passages returned for one query, and how far a
+# single hit is grown around its child (characters)
+CONTEXT_CHAR_BUDGET = 2400
+WINDOW_CHARS = 800
+# Between two windows of the same parent that do not touch
+WINDOW_SEPARATOR = " … "
+
+SENTENCE_END_RE = re.compile(r"[.!?][\"'”’)\]]*\s+")
+
+
+def sentence_spans(text: str) -> list[tuple[int, int]]:
+    """(start, end) character offsets of the sentences of `text`, surrounding whitespace excluded."""
+    spans = []
+    start = len(text) - len(text.lstrip())
+    for match in SENTENCE_END_RE.finditer(text, start):
+        end = match.start() + len(match.group().rstrip())
+        if end > start:
+            spans.append((start, end))
+        start = match.end()
+    end = len(text.rstrip())
+    if end > start:
+        spans.append((start, end))
+    return spans
+
+
+class SentenceWindowSplitter:
+    """
+    Splits parent chunks into children of consecutive whole sentences, each
+    at most `child_size` long as measured by `count_lengths(texts) -> [length]`
+    (a sentence longer than that is a child of its own).
+    """
+
+    def __init__(self, child_size: int, count_lengths=None):
+        self.child_size = child_size
+        self.count_lengths = count_lengths or (lambda texts: [len(text) for text in texts])
+
+    def split(self, parents: list[Document], parent_ids: list[str]) -> list[Document]:
+        spans = [sentence_spans(parent.page_content) for parent in parents]
+        lengths = iter(self.count_lengths(
+            [parent.page_content[start:end] for parent, parent_spans in zip(parents, spans)
+             for start, end in parent_spans]
+        ))
+        children = []
+        for parent, parent_id, parent_spans in zip(parents, parent_ids, spans):
+            window, size = None, 0
+            for start, end in parent_spans:
+                length = next(lengths)
+                if window and size + length > self.child_size:
+                    children.append(self._child(parent, parent_id, *window))
+                    window, size = None, 0
+                window = (window[0] if window else start, end)
+                size += length
+            if window:
+                children.append(self._child(parent, parent_id, *window))
+        return children
+
+    @staticmethod
+    def _child(parent: Document, parent_id: str, start: int, end: int) -> Document:
+        return Document(
+            page_content=parent.page_content[start:end],
+            metadata={**parent.metadata, "parent_id": parent_id, "window_start": start, "window_end": end},
+        )
+
+
+class ParentDocstore:
+    """SQLite store of parent chunks by ID, replaced per source file like the index manifest."""
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parents ("
+            " parent_id TEXT PRIMARY KEY, source TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS parents_source ON parents (source)")
+        self._conn.commit()
+
+    def replace_source(self, source: str, parents: list[tuple[str, Document]]):
+        """Replaces the parents of `source` with [(parent_id, Document)]."""
+        with self._conn:
+            self._conn.execute("DELETE FROM parents WHERE source = ?", (source,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO parents (parent_id, source, text, metadata) VALUES (?, ?, ?, ?)",
+                [(parent_id, source, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False))
+                 for parent_id, doc in parents],
+            )
+
+    def remove_source(self, source: str):
+        self.replace_source(source, [])
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM parents").fetchone()[0]
+
+    def get(self, parent_ids) -> dict:
+        """{parent_id: Document} for the IDs that are stored."""
+        parent_ids = list(parent_ids)
+        found = {}
+        for start in range(0, len(parent_ids), 500):
+            batch = parent_ids[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT parent_id, text, metadata FROM parents WHERE parent_id IN ({', '.join('?' * len(batch))})",
+                batch,
+            )
+            found.update((parent_id, Document(page_content=text, metadata=json.loads(metadata)))
+                         for parent_id, text, metadata in rows)
+        return found
+
+    def close(self):
+        self._conn.close()
+
+
+def _grow(spans: list, start: int, end: int, limit: int) -> tuple[int, int]:
+    """Adds the nearest sentences on either side of [start, end) while the window stays within `limit`."""
+    before = [span for span in reversed(spans) if span[1] <= start]
+    after = [span for span in spans if span[0] >= end]
+    grew = True
+    while grew:
+        grew = False
+        for side in (before, after):
+            if side and max(end, side[0][1]) - min(start, side[0][0]) <= limit:
+                start, end = min(start, side[0][0]), max(end, side[0][1])
+                side.pop(0)
+                grew = True
+    return start, end
+
+
+def _merge(intervals: list) -> list:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def expand_windows(children: list[Document], parents: dict, budget: int = CONTEXT_CHAR_BUDGET,
+                   window: int = WINDOW_CHARS, length_function=len) -> list[Document]:
+    """
+    Passages for ranked child hits. Each child is grown to about `window`
+    characters within its parent, windows on the same parent are merged
+    into one passage, and passages are added until their total length (by
+    `length_function`) would exceed `budget`; a window that does not fit is
+    cut back to the bare child, and skipped if even that does not fit.
+    Passages keep the order of their best-ranked hit. Hits without a
+    parent in `parents` are passed through as they are.
+    """
+    passages = {}       # key -> {"parent": Document or None, "windows": [(start, end)], "size": int}
+    used = 0
+
+    def size_of(parent, windows):
+        return sum(length_function(parent.page_content[start:end]) for start, end in windows)
+
+    for child in children:
+        parent_id = child.metadata.get("parent_id")
+        parent = parents.get(parent_id)
+        if parent is None:
+            key = ("child", child.metadata.get("source"), child.metadata.get("page"), child.page_content)
+            length = length_function(child.page_content)
+            if key not in passages and used + length <= budget:
+                passages[key] = {"parent": None, "document": child, "size": length}
+                used += length
+            continue
+
+        start, end = child.metadata.get("window_start", 0), child.metadata.get("window_end", len(parent.page_content))
+        passage = passages.get(parent_id, {"parent": parent, "windows": [], "size": 0})
+        grown = _grow(sentence_spans(parent.page_content), start, end, window)
+        for candidate in (grown, (start, end)):
+            windows = _merge(passage["windows"] + [candidate])
+            size = size_of(parent, windows)
+            if used - passage["size"] + size <= budget:
+                used += size - passage["size"]
+                passages[parent_id] = {**passage, "windows": windows, "size": size}
+                break
+
+    documents = []
+    for passage in passages.values():
+        if passage["parent"] is None:
+            documents.append(passage["document"])
+            continue
+        parent = passage["parent"]
+        text = WINDOW_SEPARATOR.join(parent.page_content[start:end] for start, end in passage["windows"])
+        documents.append(Document(page_content=text, metadata=dict(parent.metadata)))
+    return documents
@@ -0,0 +1,196 @@
+"""
+Source/year metadata for indexed chunks, and the query-side constraints that
+filter on it.
+
+At ingestion every page is tagged with:
+
+    source_type   annual_letter | letter_archive | almanack | speech | transcript
+    author        buffett | munger
+    year_start, year_end   the years the page covers (omitted when unknown)
+
+Single-year sources have year_start == year_end. Pages of the combined
+1977-2002 archive are assigned to the letter they belong to by counting the
+"To the Shareholders" salutations (the archive is chronological).
+
+At query time parse_query_constraints picks up explicit references such as
+"in the 1987 letter", "between 1990 and 1995" or "in Poor Charlie's", and
+chroma_where turns them into a Chroma `where` filter, so the similarity search
+only scores the matching subset. A year only becomes a filter when it dates a
+source: attached to one ("the 1987 letter", "the letter of 1987"), or after a
+preposition ("in 1987") in a query that names a source or asks what was said
+or written. "Why did Buffett buy See's in 1972?" is about an event told in
+later letters, so it is not filtered.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+
+# Bumped whenever the tags below change, so existing chunks are re-tagged
+METADATA_VERSION = 1
+
+ANNUAL_LETTER = "annual_letter"
+LETTER_ARCHIVE = "letter_archive"
+ALMANACK = "almanack"
+SPEECH = "speech"
+TRANSCRIPT = "transcript"
+LETTER_TYPES = (ANNUAL_LETTER, LETTER_ARCHIVE)
+
+# Documents whose file name does not carry their year
+KNOWN_YEARS = {
+    "Psychology_of_Human_Misjudgment": 1995,
+}
+
+YEAR_RE = re.compile(r"\b(19[5-9]\d|20[0-4]\d)\b")
+# File names join words with underscores, which \b does not treat as a boundary
+FILE_YEAR_RE = re.compile(r"(?<!\d)(19[5-9]\d|20[0-4]\d)(?!\d)")
+RANGE_RE = re.compile(
+    r"\b(?:between|from)\s+(19[5-9]\d|20[0-4]\d)\s+(?:and|to|through|until)\s+(19[5-9]\d|20[0-4]\d)\b"
+    r"|\b(19[5-9]\d|20[0-4]\d)\s*(?:-|–|to|through)\s*(19[5-9]\d|20[0-4]\d)\b"
+)
+SALUTATION_RE = re.compile(r"to the (?:share|stock)holders of berkshire hathaway", re.IGNORECASE)
+
+# "letter" in these is not a reference to Buffett's letters
+LETTER = r"\bletters?\b(?!\s+of\s+(?:credit|intent|comfort|guarantee))"
+# Explicit source references -> source types they restrict the search to
+SOURCE_PATTERNS = [
+    (re.compile(r"poor charlie|almanack", re.IGNORECASE), (ALMANACK,)),
+    (re.compile(r"daily journal|annual meeting transcript|\bdj\b", re.IGNORECASE), (TRANSCRIPT,)),
+    (re.compile(r"\bspeech|commencement|psychology of human misjudgment", re.IGNORECASE), (SPEECH,)),
+    (re.compile(LETTER, re.IGNORECASE), LETTER_TYPES),
+]
+# Year references that date a source: "the 1987 letter", "2022 Daily Journal meeting", "the letter of 1987"
+SOURCE_NOUN = (rf"(?:{LETTER}|\bannual reports?\b|\b(?:annual )?meetings?\b|\bdaily journal\b|\bdj\b"
+               r"|\bspeech(?:es)?\b|\btranscripts?\b)")
+YEAR_THEN_SOURCE_RE = re.compile(rf"^(?:'s)?\s+(?:berkshire(?: hathaway)?\s+|shareholder\s+)?{SOURCE_NOUN}",
+                                 re.IGNORECASE)
+SOURCE_THEN_YEAR_RE = re.compile(rf"{SOURCE_NOUN}\s+(?:of|from|for)\s+$", re.IGNORECASE)
+PREPOSITION_THEN_YEAR_RE = re.compile(r"\b(?:in|during)\s+(?:the\s+year\s+)?$", re.IGNORECASE)
+RANGE_PREPOSITION_RE = re.compile(r"(?:between|from)\b", re.IGNORECASE)
+# More years of one reference: "in 1987 and 1988", "the 1987, 1988 or 1989 letters"
+YEAR_LIST_GAP_RE = re.compile(r"^\s*(?:,\s*(?:and|or)?|and|or|&)\s*$", re.IGNORECASE)
+# Queries asking what was said or written, where "in 1987" means the source's year
+STATEMENT_RE = re.compile(r"\b(?:say|says|said|wr[io]te|writes|written|tell|told|discuss|describ|explain|mention"
+                          r"|warn|comment|argu)\w*", re.IGNORECASE)
+
+
+def source_metadata(file_path: str) -> dict:
+    """Tags describing a source file, derived from the corpus layout used by download_data.py."""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    parts = set(os.path.normpath(file_path).split(os.sep))
+
+    if "Berkshire_Letters" in parts:
+        span = re.match(r"(\d{4})-(\d{4})", stem)
+        if span:
+            return {"source_type": LETTER_ARCHIVE, "author": "buffett",
+                    "year_start": int(span.group(1)), "year_end": int(span.group(2))}
+        metadata = {"source_type": ANNUAL_LETTER, "author": "buffett"}
+    elif "Almanack" in stem:
+        return {"source_type": ALMANACK, "author": "munger"}
+    elif stem.startswith("DJ_"):
+        metadata = {"source_type": TRANSCRIPT, "author": "munger"}
+    else:
+        metadata = {"source_type": SPEECH, "author": "munger"}
+
+    match = FILE_YEAR_RE.search(stem)
+    year = KNOWN_YEARS.get(stem, int(match.group(1)) if match else None)
+    if year is not None:
+        metadata.update(year_start=year, year_end=year)
+    return metadata
+
+
+class SourceTagger:
+    """
+    Adds source_metadata to pages as they stream in. Pages of one file must
+    arrive in order; archive pages are assigned to individual letter years.
+    """
+
+    def __init__(self):
+        self._salutations = {}
+
+    def tag(self, documents: list) -> list:
+        """Updates each document's metadata in place and returns the documents."""
+        for doc in documents:
+            source = doc.metadata.get("source", "")
+            metadata = source_metadata(source)
+            if metadata["source_type"] == LETTER_ARCHIVE:
+                seen = self._salutations.get(source, 0) + len(SALUTATION_RE.findall(doc.page_content))
+                self._salutations[source] = seen
+                if seen:
+                    year = min(metadata["year_start"] + seen - 1, metadata["year_end"])
+                    metadata.update(year_start=year, year_end=year)
+            doc.metadata.update(metadata)
+        return documents
+
+
+@dataclass
+class QueryConstraints:
+    """Explicit constraints found in a query. Empty lists mean "no constraint"."""
+    source_types: list = field(default_factory=list)
+    year_ranges: list = field(default_factory=list)   # [(first_year, last_year), ...]
+
+    def __bool__(self):
+        return bool(self.source_types or self.year_ranges)
+
+
+def _year_mentions(query: str) -> list[tuple]:
+    """(start, end, first_year, last_year) of every year or year range in the query, in order."""
+    mentions = []
+    for match in RANGE_RE.finditer(query):
+        first, last = (int(y) for y in match.groups() if y)
+        mentions.append((match.start(), match.end(), min(first, last), max(first, last)))
+    for match in YEAR_RE.finditer(query):
+        if not any(start <= match.start() < end for start, end, _, _ in mentions):
+            year = int(match.group(1))
+            mentions.append((match.start(), match.end(), year, year))
+    return sorted(mentions)
+
+
+def parse_query_constraints(query: str) -> QueryConstraints:
+    """
+    Extracts explicit source and year references from a query, e.g.
+    "in the 1987 letter" -> letters covering 1987. Years that do not date a
+    source (see the module docstring) are left out.
+    """
+    constraints = QueryConstraints()
+    for pattern, types in SOURCE_PATTERNS:
+        if pattern.search(query):
+            constraints.source_types.extend(t for t in types if t not in constraints.source_types)
+            break   # the most specific reference wins: "letter" in "Poor Charlie's ... letter" is incidental
+
+    dates_sources = bool(constraints.source_types or STATEMENT_RE.search(query))
+    mentions = _year_mentions(query)
+    kept = []
+    for start, end, _, _ in mentions:
+        before, text, after = query[:start], query[start:end], query[end:]
+        attached = YEAR_THEN_SOURCE_RE.search(after) or SOURCE_THEN_YEAR_RE.search(before)
+        prepositional = PREPOSITION_THEN_YEAR_RE.search(before) or RANGE_PREPOSITION_RE.match(text)
+        kept.append(bool(attached or (prepositional and dates_sources)))
+    # A year listed next to a kept one belongs to the same reference: "in 1987 and 1988"
+    def listed(i):
+        return YEAR_LIST_GAP_RE.match(query[mentions[i][1]:mentions[i + 1][0]])
+
+    for i in range(len(mentions) - 1):
+        kept[i + 1] = kept[i + 1] or (kept[i] and bool(listed(i)))
+    for i in reversed(range(len(mentions) - 1)):
+        kept[i] = kept[i] or (kept[i + 1] and bool(listed(i)))
+    constraints.year_ranges.extend((first, last) for (_, _, first, last), keep in zip(mentions, kept) if keep)
+    return constraints
+
+
+def _overlaps(first: int, last: int) -> dict:
+    return {"$and": [{"year_start": {"$lte": last}}, {"year_end": {"$gte": first}}]}
+
+
+def chroma_where(constraints: QueryConstraints):
+    """Chroma `where` filter for the constraints, or None when there are none."""
+    clauses = []
+    if constraints.source_types:
+        clauses.append({"source_type": {"$in": list(constraints.source_types)}})
+    if len(constraints.year_ranges) == 1:
+        clauses.append(_overlaps(*constraints.year_ranges[0]))
+    elif constraints.year_ranges:
+        clauses.append({"$or": [_overlaps(first, last) for first, last in constraints.year_ranges]})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
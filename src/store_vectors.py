@@ -0,0 +1,83 @@
+"""
+Bulk read access to the vectors of a Chroma store.
+
+The standalone search engines (quantized_index.py, ...) are built from the
+embeddings Chroma already holds, so building them never re-embeds a chunk.
+Rows are paged out of Chroma COPY_BATCH_SIZE at a time, from every
+collection (shard) of the store, and returned as one float32 matrix aligned
+with the chunk IDs, texts and metadata.
+"""
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# Rows fetched per call when reading a collection
+COPY_BATCH_SIZE = 1000
+# Collection name langchain's Chroma wrapper writes to
+DEFAULT_COLLECTION = "langchain"
+
+
+@dataclass
+class StoreVectors:
+    ids: list
+    vectors: np.ndarray                  # (n, dim) float32
+    documents: list = field(default_factory=list)
+    metadatas: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def collection_names(client) -> list[str]:
+    # list_collections returns Collection objects before chromadb 0.6 and names after
+    return [getattr(c, "name", c) for c in client.list_collections()]
+
+
+def iter_collection_rows(collection, include: list[str], batch_size: int = COPY_BATCH_SIZE):
+    """Yields the collection's rows as `collection.get` results of at most `batch_size` rows."""
+    offset = 0
+    while True:
+        rows = collection.get(limit=batch_size, offset=offset, include=include)
+        if not rows["ids"]:
+            return
+        yield rows
+        offset += len(rows["ids"])
+
+
+def load_store_vectors(store_dir: str, collection_name: str = None,
+                       include_documents: bool = True) -> StoreVectors:
+    """
+    Every vector of a store, across all of its collections unless one is
+    named (with texts and metadata unless `include_documents` is False).
+    """
+    import chromadb
+
+    if not os.path.isdir(store_dir):
+        raise FileNotFoundError(f"No vector store at {store_dir}")
+    client = chromadb.PersistentClient(path=store_dir)
+    names = sorted(collection_names(client))
+    if collection_name is not None:
+        if collection_name not in names:
+            raise ValueError(f"No collection '{collection_name}' in {store_dir} (found: {', '.join(names)})")
+        names = [collection_name]
+
+    include = ["embeddings"] + (["documents", "metadatas"] if include_documents else [])
+    ids, blocks, documents, metadatas = [], [], [], []
+    for name in names:
+        for rows in iter_collection_rows(client.get_collection(name), include):
+            ids.extend(rows["ids"])
+            blocks.append(np.asarray(rows["embeddings"], dtype=np.float32))
+            if include_documents:
+                documents.extend(rows["documents"])
+                metadatas.extend(m or {} for m in rows["metadatas"])
+    dim = blocks[0].shape[1] if blocks else 0
+    vectors = np.vstack(blocks) if blocks else np.empty((0, dim), dtype=np.float32)
+    return StoreVectors(ids=ids, vectors=vectors, documents=documents, metadatas=metadatas)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length rows (float32), so inner products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
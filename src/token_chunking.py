@@ -0,0 +1,103 @@
+"""
+Chunking measured in the embedding model's own tokens.
+
+all-MiniLM-L6-v2 embeds at most 256 word pieces ([CLS] and [SEP] included)
+and silently drops the rest, so a 1000-character chunk is often only partly
+embedded. TokenTextSplitter tokenizes a whole batch of pages with the fast
+(Rust) tokenizer in one call, then cuts windows of at most `chunk_tokens`
+tokens with `chunk_overlap` tokens of overlap. Cuts are moved back to the
+nearest sentence end, or at least a word boundary, within the second half of
+the window, and chunk text is sliced from the original page via the
+tokenizer's character offsets, so no text is re-encoded or normalized.
+"""
+from langchain_core.documents import Document
+
+# sentence-transformers' max_seq_length for all-MiniLM-L6-v2
+EMBEDDING_MAX_TOKENS = 256
+SPECIAL_TOKENS = 2          # [CLS] ... [SEP]
+SENTENCE_ENDS = (".", "!", "?", ":", ";")
+TOKENIZE_BATCH_SIZE = 256
+
+
+def load_tokenizer(model_name: str):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+
+def count_tokens(tokenizer, texts: list[str]) -> list[int]:
+    """Token counts (without special tokens) of `texts`, tokenized in batches."""
+    counts = []
+    for start in range(0, len(texts), TOKENIZE_BATCH_SIZE):
+        encoded = tokenizer(texts[start:start + TOKENIZE_BATCH_SIZE], add_special_tokens=False)
+        counts.extend(len(ids) for ids in encoded["input_ids"])
+    return counts
+
+
+def truncated_count(token_counts: list[int], max_tokens: int = EMBEDDING_MAX_TOKENS) -> int:
+    """How many texts exceed what the encoder embeds."""
+    return sum(1 for n in token_counts if n + SPECIAL_TOKENS > max_tokens)
+
+
+class TokenTextSplitter:
+    """Drop-in for RecursiveCharacterTextSplitter.split_documents with token-based sizes."""
+
+    def __init__(self, tokenizer, chunk_tokens: int = EMBEDDING_MAX_TOKENS - SPECIAL_TOKENS,
+                 chunk_overlap: int = 48):
+        if not 0 <= chunk_overlap < chunk_tokens:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_tokens ({chunk_tokens})")
+        self.tokenizer = tokenizer
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+
+    @staticmethod
+    def _starts_word(offsets: list, i: int) -> bool:
+        return i == 0 or offsets[i][0] > offsets[i - 1][1]
+
+    def _cut(self, text: str, offsets: list, start: int, end: int) -> int:
+        """Best end (exclusive token index) for a window [start, end): sentence end, word boundary, or `end`."""
+        if end >= len(offsets):
+            return len(offsets)
+        floor = start + self.chunk_tokens // 2
+        word_cut = None
+        for k in range(end, floor, -1):
+            if self._starts_word(offsets, k):
+                if text[offsets[k - 1][1] - 1] in SENTENCE_ENDS:
+                    return k
+                word_cut = word_cut or k
+        return word_cut or end
+
+    def _windows(self, text: str, offsets: list):
+        """Yields (first_token, end_token) windows covering every token."""
+        start, n = 0, len(offsets)
+        while start < n:
+            end = self._cut(text, offsets, start, min(start + self.chunk_tokens, n))
+            yield start, end
+            if end >= n:
+                return
+            # Step back by the overlap, then forward to the start of a word
+            nxt = max(end - self.chunk_overlap, start + 1)
+            while nxt < end and not self._starts_word(offsets, nxt):
+                nxt += 1
+            start = nxt
+
+    def split_text_batch(self, texts: list[str]) -> list[list[str]]:
+        """Chunks of each text, tokenizing all texts in batched calls."""
+        results = []
+        for batch_start in range(0, len(texts), TOKENIZE_BATCH_SIZE):
+            batch = texts[batch_start:batch_start + TOKENIZE_BATCH_SIZE]
+            encoded = self.tokenizer(batch, add_special_tokens=False, return_offsets_mapping=True)
+            for text, offsets in zip(batch, encoded["offset_mapping"]):
+                results.append([
+                    text[offsets[first][0]:offsets[end - 1][1]]
+                    for first, end in self._windows(text, offsets)
+                ])
+        return results
+
+    def split_text(self, text: str) -> list[str]:
+        return self.split_text_batch([text])[0]
+
+    def split_documents(self, documents: list[Document]) -> list[Document]:
+        chunks = []
+        for doc, texts in zip(documents, self.split_text_batch([d.page_content for d in documents])):
+            chunks.extend(Document(page_content=t, metadata=dict(doc.metadata)) for t in texts)
+        return chunks
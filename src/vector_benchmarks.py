@@ -0,0 +1,84 @@
+"""
+Shared pieces of the search-engine benchmarks (benchmark_quantization.py, ...).
+
+Every engine is measured on the same embedded questions against the same
+ground truth: exact cosine top-k over the full-precision vectors of the
+published store. Recall@k is the fraction of the true top-k an engine
+returns; latency is per query, single-threaded.
+"""
+import time
+
+import numpy as np
+
+from store_vectors import normalize
+
+BENCHMARK_QUESTIONS = [
+    "What is Buffett's circle of competence principle?",
+    "How does Berkshire think about insurance float?",
+    "Why does Buffett prefer buying whole businesses over stocks?",
+    "What did Buffett learn from buying Berkshire's textile mills?",
+    "How should investors think about market fluctuations and Mr. Market?",
+    "What makes a business have a durable competitive advantage or moat?",
+    "Why did Berkshire buy See's Candies and what did it teach Buffett?",
+    "How does Buffett evaluate management and capital allocation?",
+    "What is Buffett's view on share repurchases?",
+    "Why does Berkshire not pay a dividend?",
+    "What are owner earnings?",
+    "How does Buffett think about derivatives as financial weapons of mass destruction?",
+    "What is Munger's latticework of mental models?",
+    "What are the psychological tendencies behind human misjudgment?",
+    "What does Munger say about incentives?",
+    "How does Buffett think about goodwill and economic goodwill?",
+    "What did Buffett say about the GEICO acquisition?",
+    "How does Berkshire decentralize management of its subsidiaries?",
+    "What is Buffett's advice for index fund investors?",
+    "Why does Buffett avoid using leverage?",
+    "What is the role of Ajit Jain in Berkshire's reinsurance business?",
+    "How does Buffett value a business using intrinsic value?",
+    "What mistakes of omission has Buffett admitted?",
+    "What does Munger say about envy and jealousy?",
+]
+
+
+def embed_questions(model_name: str, questions: list[str] = None) -> np.ndarray:
+    """Normalized query vectors for the benchmark questions."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    return normalize(np.asarray(embeddings.embed_documents(questions or BENCHMARK_QUESTIONS), dtype=np.float32))
+
+
+def sharded_chroma(store_dir: str):
+    """The app's Chroma search path: a ShardedRetriever over the store's shards, for search_by_vector."""
+    from langchain_chroma import Chroma
+    from retrieval import ShardedRetriever
+    from shards import present_shards
+
+    return ShardedRetriever(shards={name: Chroma(collection_name=name, persist_directory=store_dir)
+                                    for name in present_shards(store_dir)})
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> list[list[int]]:
+    """Ground truth: row indices of the exact cosine top-k for each (normalized) query."""
+    scores = queries @ normalize(vectors).T
+    return [list(np.argsort(-row)[:k]) for row in scores]
+
+
+def recall_at_k(truth: list, results: list) -> float:
+    """Mean fraction of each true top-k found in the corresponding result list."""
+    found = [len(set(t) & set(r)) / max(len(t), 1) for t, r in zip(truth, results)]
+    return sum(found) / max(len(found), 1)
+
+
+def timed_queries(search, queries: np.ndarray) -> tuple[list, np.ndarray]:
+    """Runs `search(query)` for every query; returns (results, per-query milliseconds)."""
+    results, millis = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query))
+        millis.append((time.perf_counter() - started) * 1000)
+    return results, np.asarray(millis)
+
+
+def percentile_ms(millis: np.ndarray, q: float) -> float:
+    return float(np.percentile(millis, q)) if len(millis) else 0.0
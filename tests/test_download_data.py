@@ -0,0 +1,286 @@
+"""
+Tests for the concurrent corpus downloader, run against a local HTTP stand-in server
+"""
+import pytest
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import download_data
+from download_data import (
+    DownloadJob, DownloadManifest, HostPool, backoff_delay, download_all,
+    extract_article_text, fetch_transcripts,
+)
+
+
+PDF_BODY = b'%PDF-1.4 ' + b'x' * 4096
+ARTICLE_HTML = (
+    b'<html><head><script>var x = 1;</script></head><body>'
+    b'<nav>Home | About</nav><article><h1>Daily Journal Meeting</h1>'
+    + b'<p>Invert, always invert.</p>' * 40 +
+    b'</article><footer>Copyright</footer></body></html>'
+)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves /ok/* as a PDF (with ETag, conditional GET and Range support),
+    /missing/* as 404, /flaky/* as 503 on the first hit and /html/* as an HTML page.
+    """
+    hits = {}
+    requests_seen = []
+    lock = threading.Lock()
+    etag = '"v1"'
+
+    def do_GET(self):
+        with self.lock:
+            self.hits[self.path] = self.hits.get(self.path, 0) + 1
+            self.requests_seen.append((self.path, dict(self.headers)))
+            count = self.hits[self.path]
+
+        if self.path.startswith('/missing/'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.path.startswith('/flaky/') and count == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        if self.path.startswith('/article/'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(ARTICLE_HTML)))
+            self.end_headers()
+            self.wfile.write(ARTICLE_HTML)
+            return
+        if self.path.startswith('/html/'):
+            body = b'<html>Not found</html>'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range') == self.etag:
+            start = int(range_header.split('=')[1].rstrip('-'))
+            body = PDF_BODY[start:]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(PDF_BODY) - 1}/{len(PDF_BODY)}')
+        else:
+            body = PDF_BODY
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', self.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    """Download manifest stored next to the test downloads"""
+    return DownloadManifest(str(tmp_path / '.download_manifest.json'))
+
+
+@pytest.fixture
+def stand_in_server():
+    """Starts a threaded local HTTP server and yields its base URL"""
+    StandInHandler.hits = {}
+    StandInHandler.requests_seen = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+class TestConcurrentDownloader:
+    """Test suite for the pooled, retrying downloader"""
+
+    def test_downloads_all_files(self, stand_in_server, tmp_path, manifest):
+        """Test that every job is written to disk and results keep job order"""
+        jobs = [
+            DownloadJob(f'{year} letter', f'{stand_in_server}/ok/{year}ltr.pdf',
+                        str(tmp_path / f'{year}_letter.pdf'))
+            for year in range(1999, 2025)
+        ]
+        results = download_all(jobs, manifest=manifest, max_workers=8, per_host_limit=4)
+
+        assert [r['job'] for r in results] == jobs
+        assert all(r['status'] == 'success' for r in results)
+        assert all((tmp_path / f'{year}_letter.pdf').read_bytes() == PDF_BODY
+                   for year in range(1999, 2025))
+
+    def test_existing_files_are_not_refetched(self, stand_in_server, tmp_path, manifest):
+        """Test that valid files already on disk are adopted without a request"""
+        target = tmp_path / 'exists.pdf'
+        target.write_bytes(PDF_BODY)
+        results = download_all([DownloadJob('exists', f'{stand_in_server}/ok/exists.pdf', str(target))],
+                               manifest=manifest)
+
+        assert results[0]['status'] == 'exists'
+        assert '/ok/exists.pdf' not in StandInHandler.hits
+
+    def test_retries_transient_errors(self, stand_in_server, tmp_path, manifest, monkeypatch):
+        """Test that a 503 is retried and the second attempt succeeds"""
+        monkeypatch.setattr(download_data.time, 'sleep', lambda s: None)
+        job = DownloadJob('flaky', f'{stand_in_server}/flaky/a.pdf', str(tmp_path / 'a.pdf'))
+        results = download_all([job], manifest=manifest, max_retries=2)
+
+        assert results[0]['status'] == 'success'
+        assert StandInHandler.hits['/flaky/a.pdf'] == 2
+
+    def test_non_retryable_status_is_skipped(self, stand_in_server, tmp_path, manifest):
+        """Test that a 404 is reported as skipped and nothing is written"""
+        job = DownloadJob('missing', f'{stand_in_server}/missing/a.pdf', str(tmp_path / 'a.pdf'))
+        results = download_all([job], manifest=manifest)
+
+        assert results[0]['status'] == 'skipped'
+        assert results[0]['status_code'] == 404
+        assert not (tmp_path / 'a.pdf').exists()
+        assert StandInHandler.hits['/missing/a.pdf'] == 1
+
+    def test_one_session_per_host(self):
+        """Test that URLs on the same host share a session and semaphore"""
+        pool = HostPool(per_host_limit=2)
+        a = pool.get('https://www.berkshirehathaway.com/letters/1999ltr.pdf')
+        b = pool.get('https://www.berkshirehathaway.com/letters/2000ltr.pdf')
+        c = pool.get('https://ia600702.us.archive.org/some.pdf')
+        pool.close()
+
+        assert a[0] is b[0] and a[1] is b[1]
+        assert a[0] is not c[0]
+
+    @pytest.mark.parametrize("attempt", [0, 1, 2, 5, 10])
+    def test_backoff_is_jittered_and_capped(self, attempt):
+        """Test that backoff delays stay within [0, cap]"""
+        delays = [backoff_delay(attempt, base=0.5, cap=8.0) for _ in range(50)]
+        assert all(0 <= d <= min(8.0, 0.5 * 2 ** attempt) for d in delays)
+
+
+class TestStreamingResumableDownloads:
+    """Test suite for streamed, resumable, manifest-tracked downloads"""
+
+    def test_manifest_records_checksum_and_validators(self, stand_in_server, tmp_path, manifest):
+        """Test that a completed download records size, SHA-256 and ETag"""
+        target = tmp_path / 'a.pdf'
+        download_all([DownloadJob('a', f'{stand_in_server}/ok/a.pdf', str(target))], manifest=manifest)
+
+        entry = manifest.get(str(target))
+        assert entry['size'] == len(PDF_BODY)
+        assert entry['sha256'] == hashlib.sha256(PDF_BODY).hexdigest()
+        assert entry['etag'] == StandInHandler.etag
+        assert not (tmp_path / 'a.pdf.part').exists()
+
+    def test_rerun_sends_conditional_get(self, stand_in_server, tmp_path, manifest):
+        """Test that a rerun revalidates with If-None-Match and skips on 304"""
+        job = DownloadJob('a', f'{stand_in_server}/ok/a.pdf', str(tmp_path / 'a.pdf'))
+        download_all([job], manifest=manifest)
+        results = download_all([job], manifest=manifest)
+
+        assert results[0]['status'] == 'unchanged'
+        assert StandInHandler.requests_seen[-1][1].get('If-None-Match') == StandInHandler.etag
+
+    def test_partial_file_is_resumed_with_range(self, stand_in_server, tmp_path, manifest):
+        """Test that an interrupted transfer resumes from the .part file"""
+        target = tmp_path / 'a.pdf'
+        (tmp_path / 'a.pdf.part').write_bytes(PDF_BODY[:1000])
+        manifest.record(str(target), url='x', partial=True, etag=StandInHandler.etag, last_modified=None)
+
+        results = download_all([DownloadJob('a', f'{stand_in_server}/ok/a.pdf', str(target))],
+                               manifest=manifest)
+
+        assert results[0]['status'] == 'success'
+        assert results[0]['resumed_from'] == 1000
+        assert results[0]['bytes'] == len(PDF_BODY) - 1000
+        assert StandInHandler.requests_seen[-1][1].get('Range') == 'bytes=1000-'
+        assert target.read_bytes() == PDF_BODY
+        assert manifest.get(str(target))['sha256'] == hashlib.sha256(PDF_BODY).hexdigest()
+
+    def test_html_masquerading_as_pdf_is_rejected(self, stand_in_server, tmp_path, manifest):
+        """Test that a non-PDF body is not saved under a .pdf name"""
+        target = tmp_path / 'a.pdf'
+        results = download_all([DownloadJob('a', f'{stand_in_server}/html/a.pdf', str(target))],
+                               manifest=manifest)
+
+        assert results[0]['status'] == 'error'
+        assert not target.exists()
+        assert manifest.get(str(target)) == {}
+
+
+class TestTranscriptFetcher:
+    """Test suite for the transcript fetch stage and its extracted-text cache"""
+
+    def test_extract_article_text_skips_page_chrome(self):
+        """Test that scripts, navigation and footers are dropped"""
+        text = extract_article_text(ARTICLE_HTML.decode())
+        assert text.startswith('Daily Journal Meeting')
+        assert 'Invert, always invert.' in text
+        assert 'Home | About' not in text
+        assert 'var x' not in text
+        assert 'Copyright' not in text
+
+    def test_transcripts_are_extracted_and_cached(self, stand_in_server, tmp_path, manifest, monkeypatch):
+        """Test that unchanged HTML is served from the text cache without re-parsing"""
+        calls = []
+        original = download_data.extract_article_text
+        monkeypatch.setattr(download_data, 'extract_article_text',
+                            lambda html: calls.append(html) or original(html))
+        sources = {'DJ_2023': f'{stand_in_server}/article/2023', 'DJ_2022': f'{stand_in_server}/article/2022'}
+        kwargs = dict(min_interval=0, out_dir=str(tmp_path), cache_dir=str(tmp_path / '.text_cache'))
+
+        first = fetch_transcripts(sources, manifest, **kwargs)
+        parses_after_first_run = len(calls)
+        second = fetch_transcripts(sources, manifest, refresh=True, **kwargs)
+
+        assert {r['status'] for r in first} <= {'fetched', 'cached'}
+        assert [r['status'] for r in second] == ['cached', 'cached']
+        assert len(calls) == parses_after_first_run  # re-runs never parse HTML again
+        assert (tmp_path / 'DJ_2023.txt').read_text().startswith('Daily Journal Meeting')
+        assert manifest.get(str(tmp_path / 'DJ_2023.txt'))['kind'] == 'transcript'
+
+    def test_fetched_transcripts_are_kept_without_a_request(self, stand_in_server, tmp_path, manifest):
+        """Test that a rerun reuses transcripts on disk and only re-fetches them when asked to"""
+        sources = {'DJ_2023': f'{stand_in_server}/article/2023'}
+        kwargs = dict(min_interval=0, out_dir=str(tmp_path), cache_dir=str(tmp_path / '.text_cache'))
+
+        fetch_transcripts(sources, manifest, **kwargs)
+        requests_after_first_run = len(StandInHandler.requests_seen)
+        rerun = fetch_transcripts(sources, manifest, **kwargs)
+
+        assert rerun[0]['status'] == 'exists'
+        assert rerun[0]['chars'] == len((tmp_path / 'DJ_2023.txt').read_text())
+        assert len(StandInHandler.requests_seen) == requests_after_first_run
+
+        (tmp_path / 'DJ_2023.txt').write_text('truncated')
+        repaired = fetch_transcripts(sources, manifest, **kwargs)
+        assert repaired[0]['status'] == 'cached'
+        assert (tmp_path / 'DJ_2023.txt').read_text().startswith('Daily Journal Meeting')
+
+        refreshed = fetch_transcripts(sources, manifest, refresh=True, **kwargs)
+        assert refreshed[0]['status'] == 'cached'
+        assert len(StandInHandler.requests_seen) == requests_after_first_run + 2
+
+    def test_failed_transcript_leaves_bookmark(self, stand_in_server, tmp_path, manifest):
+        """Test that a page that cannot be fetched gets a URL bookmark, not a manifest entry"""
+        sources = {'DJ_2018': f'{stand_in_server}/missing/2018'}
+        results = fetch_transcripts(sources, manifest, min_interval=0, out_dir=str(tmp_path),
+                                    cache_dir=str(tmp_path / '.text_cache'))
+
+        assert results[0]['status'] == 'error'
+        assert f'{stand_in_server}/missing/2018' in (tmp_path / 'DJ_2018.txt').read_text()
+        assert manifest.get(str(tmp_path / 'DJ_2018.txt')) == {}
@@ -100,4 +100,71 @@ class TestVectorOperations:
         k = 4  # From actual implementation
         assert isinstance(k, int)
         assert k > 0
-        assert k <= 10  # Reasonable upper bound
\ No newline at end of file
+        assert k <= 10  # Reasonable upper bound
+
+class CountingEmbeddings:
+    """Deterministic fake embedder that records every text it is asked to embed"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class TestEmbeddingCache:
+    """Test suite for the persistent SQLite embedding cache"""
+
+    @pytest.fixture
+    def cache_path(self, tmp_path):
+        return str(tmp_path / "embedding_cache.sqlite3")
+
+    def test_read_through_hits_and_misses(self, cache_path):
+        """Test that repeated texts are served from the cache"""
+        from embedding_cache import CachedEmbeddings
+
+        inner = CountingEmbeddings()
+        cache = CachedEmbeddings(inner, "all-MiniLM-L6-v2", path=cache_path)
+        first = cache.embed_documents(["Circle of competence", "Margin of safety"])
+        second = cache.embed_documents(["Margin of safety", "Mr. Market"])
+
+        assert inner.calls == ["Circle of competence", "Margin of safety", "Mr. Market"]
+        assert second[0] == first[1]
+        assert (cache.hits, cache.misses) == (1, 3)
+
+    def test_cache_persists_and_normalizes_whitespace(self, cache_path):
+        """Test that vectors survive a reopen and whitespace-only differences share a key"""
+        from embedding_cache import CachedEmbeddings
+
+        CachedEmbeddings(CountingEmbeddings(), "all-MiniLM-L6-v2", path=cache_path).embed_documents(
+            ["Economic   moat\n"]
+        )
+        inner = CountingEmbeddings()
+        reopened = CachedEmbeddings(inner, "all-MiniLM-L6-v2", path=cache_path)
+        reopened.embed_documents(["Economic moat"])
+
+        assert inner.calls == []
+
+    def test_cache_is_keyed_by_model(self, cache_path):
+        """Test that a different embedding model never reuses cached vectors"""
+        from embedding_cache import CachedEmbeddings
+
+        CachedEmbeddings(CountingEmbeddings(), "model-a", path=cache_path).embed_documents(["Float"])
+        inner = CountingEmbeddings()
+        CachedEmbeddings(inner, "model-b", path=cache_path).embed_documents(["Float"])
+
+        assert inner.calls == ["Float"]
+
+    def test_size_bound_evicts_least_recently_used(self, cache_path):
+        """Test that the cache stays under max_entries"""
+        from embedding_cache import CachedEmbeddings
+
+        cache = CachedEmbeddings(CountingEmbeddings(), "all-MiniLM-L6-v2", path=cache_path, max_entries=10)
+        for i in range(30):
+            cache.embed_documents([f"chunk {i}"])
+
+        assert cache.size() <= 10
@@ -121,4 +121,386 @@ class TestQueryRouting:
         should_use_search = is_time_sensitive or (relevance_score < 5)
         
         assert should_use_rag == True
-        assert should_use_search == False
\ No newline at end of file
+        assert should_use_search == False
+
+class TestMetadataFilters:
+    """Test suite for query constraint parsing and metadata-filtered retrieval"""
+
+    @pytest.mark.parametrize("query,source_types,year_ranges", [
+        ("What did Buffett say about insurance in the 1987 letter?",
+         ["annual_letter", "letter_archive"], [(1987, 1987)]),
+        ("What did Munger say in Poor Charlie's about envy?", ["almanack"], []),
+        ("Munger on Costco at the 2022 Daily Journal meeting", ["transcript"], [(2022, 2022)]),
+        ("How did the letters describe Salomon between 1991 and 1993?",
+         ["annual_letter", "letter_archive"], [(1991, 1993)]),
+        ("What is Buffett's circle of competence principle?", [], []),
+        ("What did Buffett write about derivatives in 2002?", [], [(2002, 2002)]),
+        ("Compare the 1987, 1988 and 1989 letters on Salomon",
+         ["annual_letter", "letter_archive"], [(1987, 1987), (1988, 1988), (1989, 1989)]),
+        ("Summarize the letter of 1987", ["annual_letter", "letter_archive"], [(1987, 1987)]),
+    ])
+    def test_parse_query_constraints(self, query, source_types, year_ranges):
+        """Test that explicit source and year references are extracted"""
+        from source_metadata import parse_query_constraints
+
+        constraints = parse_query_constraints(query)
+        assert constraints.source_types == source_types
+        assert constraints.year_ranges == year_ranges
+
+    @pytest.mark.parametrize("query", [
+        "Why did Buffett buy See's in 1972?",
+        "Why did Berkshire buy GEICO in 1995 and 1996?",
+        "How did the 2008 financial crisis affect Berkshire?",
+        "Is Berkshire's 1965 book value still a useful yardstick?",
+        "How does Berkshire use a letter of credit in its reinsurance business?",
+    ])
+    def test_incidental_years_and_letters_are_not_constraints(self, query):
+        """Test that years of events and "letter" in other phrases do not filter the search"""
+        from source_metadata import parse_query_constraints
+
+        assert not parse_query_constraints(query)
+
+    def test_chroma_where(self):
+        """Test that constraints become a Chroma where filter, and no constraints means no filter"""
+        from source_metadata import QueryConstraints, chroma_where
+
+        assert chroma_where(QueryConstraints()) is None
+        assert chroma_where(QueryConstraints(source_types=["almanack"])) == {"source_type": {"$in": ["almanack"]}}
+        assert chroma_where(QueryConstraints(source_types=["annual_letter"], year_ranges=[(1987, 1987)])) == {
+            "$and": [
+                {"source_type": {"$in": ["annual_letter"]}},
+                {"$and": [{"year_start": {"$lte": 1987}}, {"year_end": {"$gte": 1987}}]},
+            ]
+        }
+
+    def test_filtered_retriever_tops_up_sparse_results(self):
+        """Test that a filter matching too few chunks is topped up from an unfiltered search"""
+        from langchain_core.documents import Document
+        from langchain_core.vectorstores import VectorStore
+        from retrieval import MetadataFilteredRetriever
+
+        filtered = [Document(page_content="1987 letter", metadata={"source": "1987_letter.pdf", "page": 0})]
+        unfiltered = filtered + [
+            Document(page_content=f"other {i}", metadata={"source": "x.pdf", "page": i}) for i in range(4)
+        ]
+        vectorstore = MagicMock(spec=VectorStore)
+        vectorstore.similarity_search.side_effect = (
+            lambda query, k, filter=None: list(filtered if filter else unfiltered)[:k]
+        )
+
+        docs = MetadataFilteredRetriever(vectorstore=vectorstore, k=4).invoke("the 1987 letter on insurance")
+        assert [d.page_content for d in docs] == ["1987 letter", "other 0", "other 1", "other 2"]
+
+
+class TestHotReload:
+    """Test suite for switching the app's retriever to a newly published index version"""
+
+    def test_new_version_is_swapped_in_without_restart(self, tmp_path):
+        """Test that queries are served by the old version until the new one is loaded and warm"""
+        from langchain_core.documents import Document
+        from langchain_core.runnables import RunnableLambda
+        from index_versions import prepare_staging, publish
+        from retrieval import ReloadingRetriever
+
+        root = str(tmp_path / "vector_db")
+        prepare_staging(root)
+        first = publish(root)
+        loaded = []
+
+        def load_retriever(path):
+            loaded.append(os.path.basename(path))
+            return RunnableLambda(lambda query: [Document(page_content=os.path.basename(path))])
+
+        retriever = ReloadingRetriever(root=root, load_retriever=load_retriever, check_interval=0)
+        assert retriever.version == first
+        assert retriever.invoke("moats")[0].page_content == first
+
+        prepare_staging(root)
+        second = publish(root)
+        retriever.check_for_update(wait=True)
+
+        assert retriever.version == second
+        assert retriever.invoke("moats")[0].page_content == second
+        assert loaded == [first, second]
+
+    def test_failed_load_keeps_serving_the_old_version(self, tmp_path):
+        """Test that a version that cannot be loaded leaves the old version active"""
+        from langchain_core.documents import Document
+        from langchain_core.runnables import RunnableLambda
+        from index_versions import prepare_staging, publish
+        from retrieval import ReloadingRetriever
+
+        root = str(tmp_path / "vector_db")
+        prepare_staging(root)
+        first = publish(root)
+
+        def load_retriever(path):
+            if os.path.basename(path) != first:
+                raise RuntimeError("corrupt store")
+            return RunnableLambda(lambda query: [Document(page_content="ok")])
+
+        retriever = ReloadingRetriever(root=root, load_retriever=load_retriever, check_interval=0)
+        prepare_staging(root)
+        publish(root)
+        retriever.check_for_update(wait=True)
+
+        assert retriever.version == first
+        assert retriever.invoke("moats")[0].page_content == "ok"
+
+    def test_failed_version_is_retried_at_the_next_check(self, tmp_path):
+        """Test that a version whose load failed is loaded again instead of being skipped for good"""
+        from langchain_core.documents import Document
+        from langchain_core.runnables import RunnableLambda
+        from index_versions import prepare_staging, publish
+        from retrieval import ReloadingRetriever
+
+        root = str(tmp_path / "vector_db")
+        prepare_staging(root)
+        first = publish(root)
+        attempts = []
+
+        def load_retriever(path):
+            attempts.append(os.path.basename(path))
+            if attempts.count(os.path.basename(path)) == 1 and os.path.basename(path) != first:
+                raise RuntimeError("store still being copied")
+            return RunnableLambda(lambda query: [Document(page_content=os.path.basename(path))])
+
+        retriever = ReloadingRetriever(root=root, load_retriever=load_retriever, check_interval=0)
+        prepare_staging(root)
+        second = publish(root)
+        retriever.check_for_update(wait=True)
+        assert retriever.version == first
+
+        retriever.check_for_update(wait=True)
+        assert retriever.version == second
+        assert attempts == [first, second, second]
+
+    def test_replaced_version_is_closed_after_its_queries_finish(self, tmp_path):
+        """Test that the old retriever is closed once idle, and not while a query is still using it"""
+        import threading
+        from langchain_core.documents import Document
+        from index_versions import prepare_staging, publish
+        from retrieval import ReloadingRetriever
+
+        class VersionRetriever:
+            def __init__(self, name, gate):
+                self.name, self.gate, self.closed = name, gate, False
+
+            def invoke(self, query):
+                if query == "slow":
+                    self.gate.wait(timeout=5)
+                assert not self.closed
+                return [Document(page_content=self.name)]
+
+            def close(self):
+                self.closed = True
+
+        root = str(tmp_path / "vector_db")
+        prepare_staging(root)
+        publish(root)
+        gate = threading.Event()
+        loaded = []
+
+        def load_retriever(path):
+            loaded.append(VersionRetriever(os.path.basename(path), gate))
+            return loaded[-1]
+
+        retriever = ReloadingRetriever(root=root, load_retriever=load_retriever, check_interval=0)
+        results = []
+        query = threading.Thread(target=lambda: results.append(retriever.invoke("slow")))
+        query.start()
+        while not retriever._in_flight:
+            pass
+
+        prepare_staging(root)
+        publish(root)
+        retriever.check_for_update(wait=True)
+        old, new = loaded
+        assert retriever.invoke("moats")[0].page_content == new.name
+        assert not old.closed
+
+        gate.set()
+        query.join()
+        assert results[0][0].page_content == old.name
+        assert old.closed and not new.closed
+
+        prepare_staging(root)
+        publish(root)
+        retriever.check_for_update(wait=True)
+        assert new.closed
+
+
+class TestInstantFacts:
+    """Test suite for answering performance-table questions without retrieval"""
+
+    @pytest.mark.parametrize("query,years,metrics", [
+        ("What was Berkshire's per-share book value gain in 1985?", (1985,), ("book_value",)),
+        ("What was the S&P 500 return in 1968?", (1968,), ("sp500",)),
+        ("Berkshire stock price change in 1969", (1969,), ("market_value",)),
+        ("How did Berkshire do vs the S&P 500 in 1966 and 1967?", (1966, 1967),
+         ("book_value", "market_value", "sp500")),
+    ])
+    def test_numeric_questions_are_recognized(self, query, years, metrics):
+        """Test that years and metrics are extracted from numeric questions"""
+        from fact_tables import parse_fact_query
+
+        fact_query = parse_fact_query(query)
+        assert fact_query.years == years
+        assert fact_query.metrics == metrics
+
+    @pytest.mark.parametrize("query", [
+        "Why did book value fall in 2001?",
+        "Book value growth from 1965 to 1970",
+        "What did Buffett say about moats in the 1985 letter?",
+        "What is Berkshire's book value today?",
+    ])
+    def test_other_questions_take_the_rag_path(self, query):
+        """Test that explanations, ranges and prose questions are not answered from the table"""
+        from fact_tables import parse_fact_query
+
+        assert parse_fact_query(query) is None
+
+
+class TestVectorIndexRetriever:
+    """Test suite for retrieval from standalone vector indexes"""
+
+    def test_hits_are_fetched_in_rank_order_and_constraints_use_chroma(self):
+        """Test that unconstrained queries use the index and constrained ones the filtered retriever"""
+        from langchain_core.documents import Document
+        from langchain_core.embeddings import FakeEmbeddings
+        from langchain_core.runnables import RunnableLambda
+        from retrieval import VectorIndexRetriever
+
+        index = Mock()
+        index.search.return_value = [("b", 0.9), ("a", 0.8)]
+        texts = {"a": "float", "b": "moats"}
+        retriever = VectorIndexRetriever(
+            index=index,
+            embeddings=FakeEmbeddings(size=8),
+            fetch_documents=lambda ids: [Document(page_content=texts[i]) for i in ids],
+            filtered=RunnableLambda(lambda query: [Document(page_content="filtered")]),
+            k=2,
+        )
+
+        assert [d.page_content for d in retriever.invoke("what is a moat?")] == ["moats", "float"]
+        assert [d.page_content for d in retriever.invoke("moats in the 1987 letter")] == ["filtered"]
+        assert index.search.call_count == 1
+
+
+class TestShardedRetriever:
+    """Test suite for fan-out search over the per-source shards"""
+
+    @staticmethod
+    def make_shard(hits, delay=0.0):
+        import time
+        from langchain_core.embeddings import FakeEmbeddings
+        from langchain_core.vectorstores import VectorStore
+
+        def search(embedding, k, filter=None):
+            time.sleep(delay)
+            return list(hits)[:k]
+
+        shard = MagicMock(spec=VectorStore)
+        shard.embeddings = FakeEmbeddings(size=8)
+        shard.similarity_search_by_vector_with_relevance_scores = Mock(side_effect=search)
+        return shard
+
+    def test_shards_are_searched_concurrently_and_merged_by_distance(self):
+        """Test that the merged top-k is ordered by distance and the shards run in parallel"""
+        import time
+        from langchain_core.documents import Document
+        from retrieval import ShardedRetriever
+
+        def doc(name, page):
+            return Document(page_content=f"{name} {page}", metadata={"source": f"{name}.pdf", "page": page})
+
+        shards = {
+            "letters": self.make_shard([(doc("letter", 0), 0.1), (doc("letter", 1), 0.5)], delay=0.2),
+            "almanack": self.make_shard([(doc("almanack", 0), 0.3)], delay=0.2),
+            "speeches": self.make_shard([(doc("speech", 0), 0.2), (doc("speech", 1), 0.9)], delay=0.2),
+            "transcripts": self.make_shard([], delay=0.2),
+        }
+        started = time.perf_counter()
+        docs = ShardedRetriever(shards=shards, k=3).invoke("what is float?")
+        elapsed = time.perf_counter() - started
+
+        assert [d.page_content for d in docs] == ["letter 0", "speech 0", "almanack 0"]
+        assert elapsed < 0.6
+
+    def test_source_constraint_searches_only_matching_shards(self):
+        """Test that a query naming a source skips the other shards, topping up only when short"""
+        from langchain_core.documents import Document
+        from retrieval import ShardedRetriever
+
+        almanack = [(Document(page_content=f"almanack {i}", metadata={"source": "a.pdf", "page": i}), 0.1 * i)
+                    for i in range(4)]
+        shards = {"letters": self.make_shard([]), "almanack": self.make_shard(almanack)}
+
+        docs = ShardedRetriever(shards=shards, k=4).invoke("incentives in Poor Charlie's Almanack")
+        assert [d.page_content for d in docs] == [f"almanack {i}" for i in range(4)]
+        assert shards["letters"].similarity_search_by_vector_with_relevance_scores.call_count == 0
+        where = shards["almanack"].similarity_search_by_vector_with_relevance_scores.call_args.kwargs["filter"]
+        assert where == {"source_type": {"$in": ["almanack"]}}
+
+
+class TestHybridRetriever:
+    """Test suite for lexical + dense retrieval with reciprocal rank fusion"""
+
+    def test_rank_fusion_promotes_chunks_found_by_both_paths(self):
+        """Test that fused order favours agreement, keeps lexical-only hits and records per-path latency"""
+        import time
+        from langchain_core.documents import Document
+        from langchain_core.runnables import RunnableLambda
+        from retrieval import HybridRetriever
+
+        def doc(name):
+            return Document(page_content=name, metadata={"source": f"{name}.pdf", "page": 0})
+
+        def slow(docs):
+            def search(query):
+                time.sleep(0.2)
+                return docs
+            return RunnableLambda(search)
+
+        retriever = HybridRetriever(
+            dense=slow([doc("moats"), doc("float"), doc("buybacks")]),
+            lexical=slow([doc("ajit jain"), doc("float")]),
+            k=3,
+        )
+        started = time.perf_counter()
+        docs = retriever.invoke("Ajit Jain on float")
+        elapsed = time.perf_counter() - started
+
+        assert [d.page_content for d in docs] == ["float", "moats", "ajit jain"]
+        assert elapsed < 0.35
+        assert set(retriever.last_latency) == {"dense", "lexical", "total"}
+        assert retriever.last_latency["dense"] >= 200 and retriever.last_latency["lexical"] >= 200
+        assert retriever.latency_summary()["total"]["p50"] < 350
+
+
+class TestSmallToBigRetriever:
+    """Test suite for expanding retrieved sentence windows into their parent passages"""
+
+    def test_windows_are_expanded_from_the_docstore(self):
+        """Test that matched windows come back as one passage per parent, fetched in one lookup"""
+        from unittest.mock import Mock
+        from langchain_core.documents import Document
+        from langchain_core.runnables import RunnableLambda
+        from retrieval import SmallToBigRetriever
+
+        text = "Float is money we hold. It is not ours. We invest it. Costs matter most."
+        parent = Document(page_content=text, metadata={"source": "1997.pdf", "page": 1})
+        hits = [
+            Document(page_content="We invest it.", metadata={"parent_id": "p1", "window_start": 40, "window_end": 53}),
+            Document(page_content="Float is money we hold.", metadata={"parent_id": "p1", "window_start": 0,
+                                                                      "window_end": 23}),
+        ]
+        docstore = Mock()
+        docstore.get.return_value = {"p1": parent}
+
+        retriever = SmallToBigRetriever(retriever=RunnableLambda(lambda query: hits), docstore=docstore)
+        docs = retriever.invoke("What is float?")
+
+        docstore.get.assert_called_once_with({"p1"})
+        assert [d.page_content for d in docs] == [text]
+        assert docs[0].metadata == parent.metadata
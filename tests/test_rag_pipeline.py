@@ -2,6 +2,7 @@
 Tests for RAG pipeline functionality
 """
 import pytest
+import numpy as np
 from unittest.mock import Mock, patch
 import sys
 import os
@@ -89,4 +90,1102 @@ class TestDocumentProcessing:
         
         assert expected_pages > 1000  # Sanity check
         assert expected_chunks > expected_pages  # Chunks > pages makes sense
-        assert expected_chunks / expected_pages < 10  # Reasonable ratio
\ No newline at end of file
+        assert expected_chunks / expected_pages < 10  # Reasonable ratio
+
+class TestIncrementalIndexing:
+    """Test suite for the content-hash index manifest"""
+
+    @pytest.fixture
+    def config(self):
+        return {"embedding_model": "sentence-transformers/all-MiniLM-L6-v2", "chunk_size": 1000, "chunk_overlap": 200}
+
+    def test_chunk_ids_are_deterministic(self):
+        """Test that identical chunks get stable, distinct IDs"""
+        from langchain_core.documents import Document
+        from index_manifest import assign_chunk_ids
+
+        chunks = [
+            Document(page_content="Float is money we hold but don't own", metadata={"source": "a.pdf", "page": 3}),
+            Document(page_content="Float is money we hold but don't own", metadata={"source": "a.pdf", "page": 3}),
+            Document(page_content="Float is money we hold but don't own", metadata={"source": "b.pdf", "page": 3}),
+        ]
+        ids = assign_chunk_ids(chunks)
+
+        assert ids == assign_chunk_ids(chunks)
+        assert len(set(ids)) == 3
+
+    def test_manifest_diff(self, tmp_path, config):
+        """Test that the diff classifies added, updated, removed and unchanged files"""
+        from index_manifest import IndexManifest
+
+        manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+        manifest.set_file("same.pdf", "h1", ["c1"], config)
+        manifest.set_file("changed.pdf", "h2", ["c2"], config)
+        manifest.set_file("gone.pdf", "h3", ["c3"], config)
+        manifest.save(config)
+
+        reloaded = IndexManifest(str(tmp_path / "index_manifest.json"))
+        diff = reloaded.diff({"same.pdf": "h1", "changed.pdf": "h2-new", "2025_letter.pdf": "h4"}, config)
+
+        assert diff == {
+            "added": ["2025_letter.pdf"],
+            "updated": ["changed.pdf"],
+            "removed": ["gone.pdf"],
+            "unchanged": ["same.pdf"],
+        }
+
+    def test_config_change_updates_every_file(self, tmp_path, config):
+        """Test that changing chunk parameters marks every file as updated"""
+        from index_manifest import IndexManifest
+
+        manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+        manifest.set_file("same.pdf", "h1", ["c1"], config)
+        manifest.save(config)
+
+        diff = manifest.diff({"same.pdf": "h1"}, dict(config, chunk_size=500))
+        assert diff["updated"] == ["same.pdf"]
+        assert diff["unchanged"] == []
+
+
+def fake_parse_page_range(pdf_path, start, end, backend="pypdf"):
+    """Stand-in for parallel_loader.parse_page_range that never touches a real PDF"""
+    if "corrupt" in pdf_path and start > 0:
+        return {"pages": [], "seconds": 0.0, "error": "PdfReadError: broken xref"}
+    return {
+        "pages": [(f"{pdf_path} page {i}", {"source": pdf_path, "page": i}) for i in range(start, end)],
+        "seconds": 0.01,
+    }
+
+
+class TestParallelLoader:
+    """Test suite for process-pool PDF parsing"""
+
+    def test_large_files_are_split_into_page_ranges(self, monkeypatch):
+        """Test that long PDFs are spread across several tasks"""
+        import parallel_loader
+        monkeypatch.setattr(parallel_loader, "count_pages", lambda path, backend: 150 if "archive" in path else 20)
+
+        tasks, errors = parallel_loader.plan_tasks(["archive.pdf", "1999_letter.pdf"], pages_per_task=64)
+
+        assert tasks == [("archive.pdf", 0, 64), ("archive.pdf", 64, 128), ("archive.pdf", 128, 150),
+                         ("1999_letter.pdf", 0, 20)]
+        assert errors == {}
+
+    def test_page_order_is_deterministic(self, monkeypatch):
+        """Test that pages come back ordered by file then page"""
+        import parallel_loader
+        monkeypatch.setattr(parallel_loader, "count_pages", lambda path, backend: 100)
+
+        docs = parallel_loader.load_pdfs_parallel(["b.pdf", "a.pdf"], workers=1, pages_per_task=30,
+                                                  parse_fn=fake_parse_page_range)
+
+        assert [(d.metadata["source"], d.metadata["page"]) for d in docs] == (
+            [("b.pdf", i) for i in range(100)] + [("a.pdf", i) for i in range(100)]
+        )
+
+    def test_failed_file_is_skipped_not_fatal(self, monkeypatch):
+        """Test that a file with a failing page range is dropped and the rest still load"""
+        import parallel_loader
+        monkeypatch.setattr(parallel_loader, "count_pages", lambda path, backend: 100)
+
+        docs = parallel_loader.load_pdfs_parallel(["corrupt.pdf", "ok.pdf"], workers=1, pages_per_task=50,
+                                                  parse_fn=fake_parse_page_range)
+
+        assert {d.metadata["source"] for d in docs} == {"ok.pdf"}
+        assert len(docs) == 100
+
+    def test_auto_backend_falls_back_to_pypdf(self):
+        """Test that "auto" resolves to an installed backend and unknown names are rejected"""
+        from pdf_backends import PREFERRED_ORDER, available_backends, resolve_backend_name
+
+        assert "pypdf" in available_backends()
+        assert resolve_backend_name("auto") in PREFERRED_ORDER
+        assert resolve_backend_name("pypdf") == "pypdf"
+        with pytest.raises(ValueError):
+            resolve_backend_name("pdfminer")
+
+
+class FakeChroma:
+    """In-memory stand-in for the Chroma store; can be told to fail after N writes"""
+    store = {}
+    fail_after_writes = None
+    writes = 0
+    added = 0
+
+    def __init__(self, collection_name=None, persist_directory=None, embedding_function=None):
+        pass
+
+    def add_documents(self, documents, ids):
+        if FakeChroma.fail_after_writes is not None and FakeChroma.writes >= FakeChroma.fail_after_writes:
+            raise RuntimeError("simulated crash")
+        FakeChroma.writes += 1
+        FakeChroma.added += len(ids)
+        for doc, chunk_id in zip(documents, ids):
+            FakeChroma.store[chunk_id] = doc
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            FakeChroma.store.pop(chunk_id, None)
+
+
+class FakeEmbedder:
+    """Stand-in for ParallelEmbedder; FakeChroma never calls it"""
+    total_texts = 0
+    total_seconds = 0.0
+
+    def __init__(self, model_name, workers=1, batch_size=64):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestStreamingIngestion:
+    """Test suite for batched, checkpointed ingestion in process_documents.add_to_chroma"""
+
+    @pytest.fixture
+    def pipeline(self, tmp_path, monkeypatch):
+        import process_documents
+        monkeypatch.setattr(process_documents, "ParallelEmbedder", FakeEmbedder)
+        monkeypatch.setattr(process_documents, "Chroma", FakeChroma)
+        monkeypatch.setattr(process_documents, "CHECKPOINT_PATH", str(tmp_path / "ingest_checkpoint.json"))
+        monkeypatch.setattr(process_documents, "EMBEDDING_CACHE_PATH", str(tmp_path / "embedding_cache.sqlite3"))
+        monkeypatch.setattr(process_documents, "CHUNK_UNIT", "chars")
+        monkeypatch.setattr(process_documents, "CHUNK_SIZE", 100)
+        monkeypatch.setattr(process_documents, "CHUNK_OVERLAP", 0)
+        FakeChroma.store, FakeChroma.writes, FakeChroma.added, FakeChroma.fail_after_writes = {}, 0, 0, None
+        return process_documents
+
+    @staticmethod
+    def page_batches(sources, pages=5):
+        from langchain_core.documents import Document
+        from parallel_loader import PageBatch
+        for source in sources:
+            for page in range(pages):
+                text = " ".join(f"{source} page {page} sentence {i}." for i in range(10))
+                yield PageBatch(source, [Document(page_content=text, metadata={"source": source, "page": page})],
+                                page == pages - 1)
+
+    def test_interrupted_run_resumes_without_reembedding(self, pipeline, tmp_path):
+        """Test that a crash mid-run keeps finished batches and the rerun only embeds the rest"""
+        from index_manifest import IndexManifest
+
+        sources = ["a.pdf", "b.pdf", "c.pdf"]
+        hashes = {source: f"sha-{source}" for source in sources}
+        config = {"chunk_size": 100}
+        diff = {"added": sources, "updated": [], "removed": [], "unchanged": []}
+
+        manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+        FakeChroma.fail_after_writes = 2
+        pipeline.add_to_chroma(self.page_batches(sources), diff, hashes, manifest, config, batch_size=8)
+        added_before_crash = FakeChroma.added
+        stored_before_crash = len(FakeChroma.store)
+        assert 0 < stored_before_crash
+        assert (tmp_path / "ingest_checkpoint.json").exists()
+
+        FakeChroma.fail_after_writes = None
+        manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+        diff = manifest.diff(hashes, config)
+        pipeline.add_to_chroma(self.page_batches(diff["added"] + diff["updated"]), diff, hashes, manifest,
+                               config, batch_size=8)
+
+        total_ids = {i for s in sources for i in manifest.chunk_ids(s)}
+        assert set(FakeChroma.store) == total_ids
+        assert FakeChroma.added - added_before_crash == len(total_ids) - stored_before_crash
+        assert not (tmp_path / "ingest_checkpoint.json").exists()
+
+    def test_file_failing_part_way_leaves_nothing_behind(self, pipeline, tmp_path):
+        """Test that chunks of earlier page ranges of a file that then fails are neither kept nor published"""
+        from parallel_loader import PageBatch
+        from index_manifest import IndexManifest
+
+        def batches():
+            yield from list(self.page_batches(["a.pdf"], pages=4))[:3]
+            yield PageBatch("a.pdf", [], True, error="broken xref table")
+            yield from self.page_batches(["b.pdf"], pages=2)
+
+        hashes = {"a.pdf": "sha-a", "b.pdf": "sha-b"}
+        diff = {"added": ["a.pdf", "b.pdf"], "updated": [], "removed": [], "unchanged": []}
+        manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+        assert pipeline.add_to_chroma(batches(), diff, hashes, manifest, {"chunk_size": 100}, batch_size=4)
+
+        assert FakeChroma.writes > 1    # some of a.pdf was written before the error
+        assert manifest.chunk_ids("a.pdf") == []
+        assert set(FakeChroma.store) == set(manifest.chunk_ids("b.pdf"))
+        assert all(doc.metadata["source"] == "b.pdf" for doc in FakeChroma.store.values())
+        assert not (tmp_path / "ingest_checkpoint.json").exists()
+
+        diff = manifest.diff(hashes, {"chunk_size": 100})
+        assert diff["added"] == ["a.pdf"]
+        assert pipeline.add_to_chroma(self.page_batches(diff["added"], pages=4), diff, hashes, manifest,
+                                      {"chunk_size": 100}, batch_size=4)
+        assert set(FakeChroma.store) == set(manifest.chunk_ids("a.pdf")) | set(manifest.chunk_ids("b.pdf"))
+
+    def test_sentence_windows_are_embedded_and_parents_stored(self, pipeline, tmp_path, monkeypatch):
+        """Test that small-to-big ingestion embeds sentence windows and keeps their parents in the docstore"""
+        from index_manifest import IndexManifest
+        from small_to_big import ParentDocstore
+
+        monkeypatch.setattr(pipeline, "CHILD_CHARS", 50)
+        docstore = ParentDocstore(str(tmp_path / "parents.sqlite3"))
+        manifest = IndexManifest(str(tmp_path / "index_manifest.json"))
+        diff = {"added": ["a.pdf"], "updated": [], "removed": [], "unchanged": []}
+        assert pipeline.add_to_chroma(self.page_batches(["a.pdf"]), diff, {"a.pdf": "sha-a"}, manifest,
+                                      {"chunk_size": 100}, batch_size=8, docstore=docstore)
+
+        children = list(FakeChroma.store.values())
+        parents = docstore.get({child.metadata["parent_id"] for child in children})
+        assert docstore.count() == len(parents) < len(children)
+        for child in children:
+            parent = parents[child.metadata["parent_id"]]
+            start, end = child.metadata["window_start"], child.metadata["window_end"]
+            assert parent.page_content[start:end] == child.page_content
+            assert len(child.page_content) <= pipeline.CHILD_CHARS
+            assert parent.metadata["source"] == "a.pdf"
+        docstore.close()
+
+
+class TestParallelEmbeddings:
+    """Test suite for multi-process batched embedding"""
+
+    def test_length_sorted_batches_cover_every_text_once(self):
+        """Test that batches are length-sorted and partition the input"""
+        from parallel_embeddings import length_sorted_batches
+
+        texts = ["a" * n for n in [5, 300, 40, 1000, 2, 75, 600]]
+        batches = length_sorted_batches(texts, batch_size=3)
+
+        assert sorted(i for batch in batches for i in batch) == list(range(len(texts)))
+        assert all(len(batch) <= 3 for batch in batches)
+        lengths = [len(texts[i]) for batch in batches for i in batch]
+        assert lengths == sorted(lengths, reverse=True)
+
+    def test_matches_single_process_embeddings(self, embedding_model):
+        """Test that sharded embeddings come back in input order and match HuggingFaceEmbeddings"""
+        from parallel_embeddings import ParallelEmbedder
+
+        texts = ["Circle of competence", "Margin of safety " * 20, "Mr. Market", "Economic moat " * 5]
+        embedder = ParallelEmbedder("sentence-transformers/all-MiniLM-L6-v2", workers=2, batch_size=2)
+        try:
+            parallel = embedder.embed_documents(texts)
+        finally:
+            embedder.close()
+        serial = embedding_model.embed_documents(texts)
+
+        assert len(parallel) == len(texts)
+        for a, b in zip(parallel, serial):
+            assert np.allclose(a, b, atol=1e-4)
+
+
+class TestNearDuplicateDetection:
+    """Test suite for SimHash near-duplicate elimination and header/footer stripping"""
+
+    PASSAGE = (
+        "Our float has grown from $16 million in 1967 to well over $100 billion, and "
+        "its cost has been less than zero over most of that period, which means our "
+        "insurance operations have effectively paid us to hold money that we invest."
+    )
+
+    def test_near_duplicates_are_dropped(self, tmp_path):
+        """Test that a lightly reformatted copy of a passage is detected across files"""
+        from dedup import DedupIndex
+
+        dedup = DedupIndex(str(tmp_path / "dedup_index.json"))
+        assert dedup.check("2000_letter.pdf", "c1", self.PASSAGE) is None
+        reformatted = self.PASSAGE.replace("billion, and", "billion and").upper()
+        assert dedup.check("1977-2002_Combined_Archive_Letters.pdf", "c2", reformatted) == "c1"
+        assert dedup.check("2000_letter.pdf", "c3", "Rule No. 1: never lose money. Rule No. 2: "
+                                                     "never forget rule No. 1, said Buffett again.") is None
+
+    def test_long_unrelated_texts_all_survive(self, tmp_path):
+        """Test that chunk-length texts sharing no passage are never fingerprinted as near-duplicates"""
+        import random
+        from dedup import DedupIndex
+
+        rng = random.Random(0)
+        vocabulary = [f"word{i}" for i in range(5000)]
+        dedup = DedupIndex(str(tmp_path / "dedup_index.json"))
+        dropped = [i for i in range(300)
+                   if dedup.check("letters.pdf", f"c{i}", " ".join(rng.choices(vocabulary, k=220))) is not None]
+        assert dropped == []
+
+    def test_index_persists_and_tracks_dependents(self, tmp_path):
+        """Test that drops survive a reload and deleting the kept chunk flags the dependent file"""
+        from dedup import DedupIndex
+
+        dedup = DedupIndex(str(tmp_path / "dedup_index.json"))
+        dedup.check("2000_letter.pdf", "c1", self.PASSAGE)
+        dedup.check("archive.pdf", "c2", self.PASSAGE)
+        dedup.save()
+
+        reloaded = DedupIndex(str(tmp_path / "dedup_index.json"))
+        assert reloaded.dependents_of(["c1"]) == {"archive.pdf"}
+        reloaded.forget(["c1"])
+        assert reloaded.check("archive.pdf", "c2", self.PASSAGE) is None
+
+    def test_running_headers_and_page_numbers_are_stripped(self):
+        """Test that header/footer lines repeated on most pages are removed"""
+        from langchain_core.documents import Document
+        from dedup import strip_repeated_lines
+
+        pages = [
+            Document(page_content=f"BERKSHIRE HATHAWAY INC.\nBody text number {i} about insurance.\nPage {i + 1}")
+            for i in range(6)
+        ]
+        pages, removed = strip_repeated_lines(pages)
+
+        assert removed == 12
+        assert all(p.page_content.strip() == f"Body text number {i} about insurance." for i, p in enumerate(pages))
+
+    def test_pages_shorter_than_the_edge_windows_keep_their_body(self):
+        """Test that the top and bottom windows never overlap on pages with fewer than 2 * EDGE_LINES lines"""
+        from langchain_core.documents import Document
+        from dedup import strip_repeated_lines
+
+        pages = [Document(page_content=f"Book value grew {20 + i}% in {1980 + i}.") for i in range(4)]
+        pages += [Document(page_content=f"BERKSHIRE HATHAWAY INC.\nNet worth rose {i}%.\nPage {i}") for i in range(4)]
+        pages, removed = strip_repeated_lines(pages)
+
+        assert removed == 8
+        assert [p.page_content.strip() for p in pages[:4]] == [f"Book value grew {20 + i}% in {1980 + i}." for i in range(4)]
+        assert [p.page_content.strip() for p in pages[4:]] == [f"Net worth rose {i}%." for i in range(4)]
+
+
+class TestSourceMetadata:
+    """Test suite for source/year tagging of ingested pages"""
+
+    @pytest.mark.parametrize("path,expected", [
+        ("../knowledge_base/docs/Berkshire_Letters/1987_letter.pdf",
+         {"source_type": "annual_letter", "author": "buffett", "year_start": 1987, "year_end": 1987}),
+        ("../knowledge_base/docs/Poor_Charlies_Almanack.pdf", {"source_type": "almanack", "author": "munger"}),
+        ("../knowledge_base/docs/Munger_Transcripts/DJ_2021.txt",
+         {"source_type": "transcript", "author": "munger", "year_start": 2021, "year_end": 2021}),
+        ("../knowledge_base/docs/Munger_Transcripts/Psychology_of_Human_Misjudgment.pdf",
+         {"source_type": "speech", "author": "munger", "year_start": 1995, "year_end": 1995}),
+    ])
+    def test_source_metadata(self, path, expected):
+        """Test that file paths map to source type, author and year"""
+        from source_metadata import source_metadata
+        assert source_metadata(path) == expected
+
+    def test_archive_pages_get_letter_years(self):
+        """Test that combined archive pages are assigned to the letter they belong to"""
+        from langchain_core.documents import Document
+        from source_metadata import SourceTagger
+
+        source = "../knowledge_base/docs/Berkshire_Letters/1977-2002_Combined_Archive_Letters.pdf"
+        texts = ["Table of contents", "To the Shareholders of Berkshire Hathaway Inc.: 1977 was...",
+                 "more 1977", "To the Stockholders of Berkshire Hathaway Inc.: In 1978..."]
+        tagger = SourceTagger()
+        pages = [Document(page_content=t, metadata={"source": source, "page": i}) for i, t in enumerate(texts)]
+        tagger.tag(pages[:2])
+        tagger.tag(pages[2:])
+
+        years = [(p.metadata["year_start"], p.metadata["year_end"]) for p in pages]
+        assert years == [(1977, 2002), (1977, 1977), (1977, 1977), (1978, 1978)]
+        assert all(p.metadata["source_type"] == "letter_archive" for p in pages)
+
+
+class TestBuildProfiling:
+    """Test suite for per-stage ingestion profiling"""
+
+    def test_nested_stages_are_charged_exclusively(self):
+        """Test that time spent in a nested stage is not also charged to its parent"""
+        import time
+        from profiling import StageProfiler
+
+        profiler = StageProfiler()
+        with profiler.stage("write", unit="chunks") as write:
+            time.sleep(0.02)
+            with profiler.stage("embed", unit="vectors") as embed:
+                embed.add(10)
+                time.sleep(0.1)
+            write.add(10)
+
+        assert profiler.stages["embed"].wall_seconds >= 0.1
+        assert 0.02 <= profiler.stages["write"].wall_seconds < 0.1
+        assert profiler.stages["embed"].items == 10
+
+    @pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="current RSS is read from /proc")
+    def test_memory_is_charged_to_the_stage_that_allocates_it(self):
+        """Test that RSS growth is measured per stage instead of reporting the process high-water mark"""
+        from profiling import StageProfiler
+
+        profiler = StageProfiler()
+        with profiler.stage("write"):
+            with profiler.stage("embed"):
+                buffer = np.ones(64 * 1024 * 1024, dtype=np.uint8)
+            with profiler.stage("dedup"):
+                pass
+        del buffer
+
+        embed, dedup, write = (profiler.stages[name] for name in ("embed", "dedup", "write"))
+        assert embed.rss_delta_mb >= 60
+        assert abs(dedup.rss_delta_mb) < 16
+        assert abs(write.rss_delta_mb) < 16
+        assert profiler.report()["stages"]["embed"]["rss_delta_mb"] >= 60
+
+    def test_report_is_written_as_json(self, tmp_path):
+        """Test that iterated stages count items and the report is machine-readable"""
+        import json
+        from profiling import StageProfiler
+
+        profiler = StageProfiler()
+        pages = list(profiler.iterate("parse", [[1, 2], [3]], unit="pages"))
+        profiler.counts["embedded"] = 3
+        path = profiler.write_report(str(tmp_path / "build.json"), completed=True)
+
+        with open(path) as f:
+            report = json.load(f)
+        assert pages == [[1, 2], [3]]
+        assert report["completed"] is True
+        assert report["counts"] == {"embedded": 3}
+        assert report["stages"]["parse"]["items"] == 3
+        assert report["stages"]["parse"]["calls"] == 3
+        assert "pages_per_second" in report["stages"]["parse"]
+
+
+class TestVersionedBuilds:
+    """Test suite for atomic, versioned publishing of the vector store"""
+
+    def test_build_is_published_atomically(self, tmp_path):
+        """Test that builds happen in staging and only become visible when published"""
+        from index_versions import current_path, current_version, prepare_staging, publish
+
+        root = str(tmp_path / "vector_db")
+        staging = prepare_staging(root)
+        (tmp_path / "vector_db" / "staging" / "chroma.sqlite3").write_text("v1")
+        assert current_version(root) is None
+
+        first = publish(root)
+        assert current_version(root) == first
+        assert (tmp_path / "vector_db" / "versions" / first / "chroma.sqlite3").read_text() == "v1"
+
+        # An incremental build starts from a copy; the published version is untouched
+        staging = prepare_staging(root)
+        with open(os.path.join(staging, "chroma.sqlite3"), "w") as f:
+            f.write("v2")
+        assert open(os.path.join(current_path(root), "chroma.sqlite3")).read() == "v1"
+
+        second = publish(root)
+        assert second != first
+        assert open(os.path.join(current_path(root), "chroma.sqlite3")).read() == "v2"
+        assert not os.path.exists(staging)
+
+    def test_interrupted_build_is_resumed_and_old_versions_pruned(self, tmp_path):
+        """Test that an existing staging build is resumed and only KEEP_VERSIONS versions are kept"""
+        from index_versions import KEEP_VERSIONS, current_version, prepare_staging, publish
+
+        root = str(tmp_path / "vector_db")
+        staging = prepare_staging(root)
+        with open(os.path.join(staging, "ingest_checkpoint.json"), "w") as f:
+            f.write("{}")
+        assert os.path.exists(os.path.join(prepare_staging(root), "ingest_checkpoint.json"))
+        assert not os.listdir(prepare_staging(root, rebuild=True))
+
+        versions = [publish(root)]
+        for _ in range(KEEP_VERSIONS + 1):
+            prepare_staging(root)
+            versions.append(publish(root))
+        assert sorted(os.listdir(tmp_path / "vector_db" / "versions")) == versions[-KEEP_VERSIONS:]
+        assert current_version(root) == versions[-1]
+
+    def test_legacy_store_is_copied_into_staging(self, tmp_path):
+        """Test that a store built before versioning seeds the first versioned build"""
+        from index_versions import prepare_staging
+
+        root = tmp_path / "vector_db"
+        root.mkdir()
+        (root / "index_manifest.json").write_text("{}")
+        staging = prepare_staging(str(root))
+        assert os.listdir(staging) == ["index_manifest.json"]
+
+
+class TestPageTextCache:
+    """Test suite for the extracted page text cache"""
+
+    def test_round_trip_survives_a_rename(self, tmp_path):
+        """Test that cached pages are keyed by content hash, not path"""
+        from langchain_core.documents import Document
+        from page_cache import PageTextCache
+
+        cache = PageTextCache(str(tmp_path))
+        pages = [Document(page_content=f"Page {i} — “quoted”", metadata={"source": "old/a.pdf", "page": i})
+                 for i in range(3)]
+        cache.store("sha-a", "pypdf", "old/a.pdf", pages)
+
+        loaded = cache.load("sha-a", "pypdf", "new/a.pdf")
+        assert [d.page_content for d in loaded] == [d.page_content for d in pages]
+        assert [d.metadata for d in loaded] == [{"source": "new/a.pdf", "page": i} for i in range(3)]
+        assert cache.load("sha-a", "pymupdf", "new/a.pdf") is None
+
+        (tmp_path / "sha-b.pypdf.jsonl.gz").write_bytes(b"not gzip")
+        assert cache.load("sha-b", "pypdf", "b.pdf") is None
+        assert cache.prune(["sha-a"]) == 0
+        assert cache.prune([]) == 1
+
+    def test_rechunking_does_not_reparse(self, tmp_path, monkeypatch):
+        """Test that a second pass over unchanged PDFs replays cached pages without parsing"""
+        import process_documents
+
+        sources = ["a_letter.pdf", "b_letter.pdf"]
+        parsed = []
+
+        def fake_iter_pdf_pages(pdf_paths, workers=1, backend="pypdf"):
+            parsed.extend(pdf_paths)
+            for source in pdf_paths:
+                for page_batch in TestStreamingIngestion.page_batches([source], pages=3):
+                    yield page_batch
+
+        monkeypatch.setattr(process_documents, "iter_pdf_pages", fake_iter_pdf_pages)
+        monkeypatch.setattr(process_documents, "find_pdf_files", lambda: sources)
+        monkeypatch.setattr(process_documents, "find_transcript_files", lambda: {})
+        monkeypatch.setattr(process_documents, "PAGE_CACHE_DIR", str(tmp_path / "page_cache"))
+        hashes = {source: f"sha-{source}" for source in sources}
+
+        def run():
+            batches = process_documents.iter_page_batches(set(sources), workers=1, pdf_backend="pypdf",
+                                                          file_hashes=hashes)
+            pages = {}
+            for batch in batches:
+                pages.setdefault(batch.source, []).extend(d.page_content for d in batch.documents)
+                assert batch.is_last == (len(pages[batch.source]) == 3)
+            return pages
+
+        first = run()
+        second = run()
+        assert parsed == sources
+        assert second == first
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    """The embedding model's tokenizer, loaded once for the module"""
+    from token_chunking import load_tokenizer
+    return load_tokenizer("sentence-transformers/all-MiniLM-L6-v2")
+
+
+class TestTokenChunking:
+    """Test suite for tokenizer-aligned chunking"""
+
+    def test_chunks_fit_the_encoder_window(self, tokenizer):
+        """Test that no token chunk is truncated while 1000-character chunks can be"""
+        from langchain_core.documents import Document
+        from token_chunking import TokenTextSplitter, count_tokens, truncated_count
+
+        text = " ".join(
+            f"In {1965 + i} our per-share book value grew, and float from GEICO and General Re kept compounding."
+            for i in range(60)
+        )
+        page = Document(page_content=text, metadata={"source": "letters.pdf", "page": 7})
+        chunks = TokenTextSplitter(tokenizer, chunk_tokens=254, chunk_overlap=48).split_documents([page])
+        counts = count_tokens(tokenizer, [c.page_content for c in chunks])
+
+        assert len(chunks) > 1
+        assert truncated_count(counts) == 0
+        assert all(c.metadata == {"source": "letters.pdf", "page": 7} for c in chunks)
+        assert all(text.find(c.page_content) >= 0 for c in chunks)
+        assert chunks[0].page_content.endswith(".")
+        # Every word of the page survives into some chunk
+        assert set(text.split()) == {w for c in chunks for w in c.page_content.split()}
+
+    def test_overlap_must_be_smaller_than_chunk(self, tokenizer):
+        """Test that an overlap as large as the chunk is rejected"""
+        from token_chunking import TokenTextSplitter
+        with pytest.raises(ValueError):
+            TokenTextSplitter(tokenizer, chunk_tokens=64, chunk_overlap=64)
+
+
+class TestIndexArtifact:
+    """Test suite for exporting and importing prebuilt index artifacts"""
+
+    @pytest.fixture
+    def published_root(self, tmp_path):
+        import json
+        from index_versions import prepare_staging, publish
+
+        root = str(tmp_path / "build_node" / "vector_db")
+        staging = prepare_staging(root)
+        with open(os.path.join(staging, "index_manifest.json"), "w") as f:
+            json.dump({"config": {"chunk_unit": "tokens", "chunk_size": 254},
+                       "files": {"1987_letter.pdf": {"sha256": "abc", "chunk_ids": ["c1"]}}}, f)
+        os.makedirs(os.path.join(staging, "segment"))
+        with open(os.path.join(staging, "segment", "data_level0.bin"), "wb") as f:
+            f.write(os.urandom(4096))
+        publish(root)
+        return root
+
+    def test_export_then_import_on_a_fresh_node(self, published_root, tmp_path):
+        """Test that an exported artifact installs as the published index elsewhere"""
+        from index_artifact import export_index, import_index
+        from index_versions import current_path
+
+        artifact = str(tmp_path / "artifacts" / "index.tar.gz")
+        manifest = export_index(published_root, artifact, "sentence-transformers/all-MiniLM-L6-v2", 384)
+        assert manifest["corpus"] == {"1987_letter.pdf": "abc"}
+        assert manifest["index_config"]["chunk_size"] == 254
+        assert os.path.exists(artifact + ".sha256")
+
+        fresh_root = str(tmp_path / "serving_node" / "vector_db")
+        import_index(artifact, fresh_root, "sentence-transformers/all-MiniLM-L6-v2")
+        installed = current_path(fresh_root)
+        with open(os.path.join(installed, "segment", "data_level0.bin"), "rb") as a, \
+                open(os.path.join(current_path(published_root), "segment", "data_level0.bin"), "rb") as b:
+            assert a.read() == b.read()
+
+    def test_corrupt_or_incompatible_artifacts_are_rejected(self, published_root, tmp_path):
+        """Test that checksum mismatches and a different embedding model are refused"""
+        from index_artifact import ArtifactError, export_index, import_index, verify_artifact
+        from index_versions import current_version
+
+        artifact = str(tmp_path / "index.tar.gz")
+        export_index(published_root, artifact, "sentence-transformers/all-MiniLM-L6-v2", 384)
+        fresh_root = str(tmp_path / "serving_node" / "vector_db")
+
+        with pytest.raises(ArtifactError):
+            import_index(artifact, fresh_root, "BAAI/bge-small-en-v1.5")
+        with open(artifact, "ab") as f:
+            f.write(b"tampered")
+        with pytest.raises(ArtifactError):
+            verify_artifact(artifact)
+        assert current_version(fresh_root) is None
+
+
+class TestIndexHealth:
+    """Test suite for the index health report"""
+
+    def test_sqlite_fragmentation_is_reported(self, tmp_path):
+        """Test that pages freed by deletes show up as fragmentation"""
+        import sqlite3
+        from index_health import sqlite_stats
+
+        db_path = str(tmp_path / "chroma.sqlite3")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE embeddings_queue (seq_id INTEGER PRIMARY KEY, vector BLOB)")
+        conn.executemany("INSERT INTO embeddings_queue (vector) VALUES (?)", [(os.urandom(1536),)] * 200)
+        conn.commit()
+        conn.execute("DELETE FROM embeddings_queue WHERE seq_id > 50")
+        conn.commit()
+        conn.close()
+
+        stats = sqlite_stats(db_path)
+        assert stats["queue_rows"] == 50
+        assert stats["free_pages"] > 0
+        assert 0 < stats["fragmentation"] < 1
+
+    def test_hnsw_tombstones_are_counted_per_segment(self, tmp_path):
+        """Test that segment metadata exposes vectors added vs. still live"""
+        import pickle
+        from index_health import segment_stats
+
+        segment_id = "3f1c2e9a-5b7d-4c1e-9f0a-2b6d8e4c7a10"
+        segment = tmp_path / segment_id
+        segment.mkdir()
+        (tmp_path / "quantized").mkdir()
+        (segment / "data_level0.bin").write_bytes(b"\0" * 1024)
+        with open(segment / "index_metadata.pickle", "wb") as f:
+            pickle.dump({"total_elements_added": 120, "id_to_label": {f"c{i}": i for i in range(100)}}, f)
+        (tmp_path / "index_manifest.json").write_text("{}")
+
+        stats = segment_stats(str(tmp_path))
+        assert list(stats) == [segment_id]
+        assert stats[segment_id]["elements_added"] == 120
+        assert stats[segment_id]["live_labels"] == 100
+        assert stats[segment_id]["bytes"] >= 1024
+
+
+class TestFactTables:
+    """Test suite for the performance tables extracted from the letters"""
+
+    OLD_TABLE = "\n".join([
+        "Berkshire's Corporate Performance vs. the S&P 500",
+        "Annual Percentage Change in Per-Share Book Value of Berkshire, in S&P 500 with Dividends Included",
+        "1965 ........................................ 23.8 10.0 13.8",
+        "1966 ........................................ 20.3 (11.7) 32.0",
+        "1967 ........................................ 11.0 30.9 (19.9)",
+        "1968 ........................................ 19.0 11.0 8.0",
+        "1969 ........................................ 16.2 (8.4) 24.6",
+    ])
+    NEW_TABLE = "\n".join([
+        "Berkshire's Performance vs. the S&P 500",
+        "Annual Percentage Change in Per-Share Market Value of Berkshire, in S&P 500 with Dividends Included",
+        "1965 ........................................ 49.5 10.0",
+        "1966 ........................................ (3.4) (11.7)",
+        "1967 ........................................ 13.3 30.9",
+        "1968 ........................................ 77.8 11.0",
+        "1969 ........................................ 19.4 (8.4)",
+        "Compounded Annual Gain – 1965-2022 .......... 19.8% 9.9%",
+    ])
+
+    def _pages(self):
+        from langchain_core.documents import Document
+        return [
+            Document(page_content=self.OLD_TABLE, metadata={
+                "source": "docs/Berkshire_Letters/1969_letter.pdf", "page": 1, "year_start": 1969}),
+            Document(page_content=self.NEW_TABLE, metadata={
+                "source": "docs/Berkshire_Letters/2022_letter.pdf", "page": 16, "year_start": 2022}),
+        ]
+
+    def test_column_layouts_are_inferred(self):
+        """Test that the relative column is dropped and market value columns are recognized"""
+        from fact_tables import extract_performance_facts
+
+        facts = {(f.source[-15:], f.year, f.metric): f.value for f in extract_performance_facts(self._pages())}
+        assert facts[("1969_letter.pdf", 1966, "book_value")] == 20.3
+        assert facts[("1969_letter.pdf", 1966, "sp500")] == -11.7
+        assert facts[("2022_letter.pdf", 1966, "market_value")] == -3.4
+        assert len(facts) == 20
+
+    def test_instant_answer_cites_the_published_table(self, tmp_path):
+        """Test that a published fact table answers numeric questions with a citation"""
+        from collections import defaultdict
+        from fact_tables import FACT_TABLE_FILENAME, FactTable, extract_performance_facts, instant_answer
+        from index_versions import prepare_staging, publish
+
+        root = str(tmp_path / "vector_db")
+        table = FactTable(os.path.join(prepare_staging(root), FACT_TABLE_FILENAME))
+        table.reset()
+        by_source = defaultdict(list)
+        for fact in extract_performance_facts(self._pages()):
+            by_source[fact.source].append(fact)
+        for source, facts in by_source.items():
+            table.replace_source(source, facts)
+        table.close()
+        publish(root)
+
+        answer = instant_answer("How did Berkshire do vs. the S&P 500 in 1966?", root)
+        assert "per-share book value +20.3%" in answer
+        assert "per-share market value -3.4%" in answer
+        assert "2022_letter.pdf, p. 17" in answer
+        assert instant_answer("What did Buffett say about moats?", root) is None
+
+    def test_corrupt_table_raises_a_database_error(self, tmp_path):
+        """Test that an unreadable fact table surfaces as sqlite3.Error, which the app falls back to RAG on"""
+        import sqlite3
+        from fact_tables import FACT_TABLE_FILENAME, instant_answer
+        from index_versions import prepare_staging, publish
+
+        root = str(tmp_path / "vector_db")
+        with open(os.path.join(prepare_staging(root), FACT_TABLE_FILENAME), "wb") as f:
+            f.write(b"not a database" * 100)
+        publish(root)
+
+        with pytest.raises(sqlite3.Error):
+            instant_answer("What was the S&P 500 return in 1968?", root)
+
+
+class TestQuantizedIndex:
+    """Test suite for the int8/PCA index with full-precision rescoring"""
+
+    @pytest.fixture
+    def corpus(self):
+        import numpy as np
+
+        rng = np.random.default_rng(7)
+        centers = rng.normal(size=(20, 384))
+        vectors = (centers[rng.integers(0, 20, 2000)] + 0.5 * rng.normal(size=(2000, 384))).astype(np.float32)
+        queries = vectors[:25] + 0.3 * rng.normal(size=(25, 384)).astype(np.float32)
+        return [f"chunk-{i}" for i in range(len(vectors))], vectors, queries
+
+    @pytest.mark.parametrize("pca_dims", [None, 96])
+    def test_rescoring_recovers_exact_top_k(self, corpus, pca_dims, tmp_path):
+        """Test that rescored results match exact search while holding far less in memory"""
+        from quantized_index import QuantizedIndex, build_quantized_index
+        from store_vectors import normalize
+        from vector_benchmarks import exact_top_k, recall_at_k
+
+        ids, vectors, queries = corpus
+        build_quantized_index(ids, vectors, str(tmp_path / "quantized"), pca_dims=pca_dims)
+        index = QuantizedIndex(str(tmp_path / "quantized"))
+
+        truth = exact_top_k(vectors, normalize(queries), 4)
+        results = [[int(i.split("-")[1]) for i, _ in index.search(q, k=4, candidates=100)] for q in queries]
+        assert recall_at_k(truth, results) >= 0.95
+        assert index.memory_bytes < vectors.nbytes / 3
+
+
+class TestFlatIndex:
+    """Test suite for the memory-mapped exact-search index"""
+
+    def test_blocked_search_matches_exact_search(self, tmp_path, monkeypatch):
+        """Test that scoring in row blocks returns the exact top-k and the matching chunk texts"""
+        import flat_index
+        from flat_index import FlatIndex, build_flat_index
+        from store_vectors import StoreVectors, normalize
+        from vector_benchmarks import exact_top_k
+
+        rng = np.random.default_rng(3)
+        vectors = rng.normal(size=(1000, 384)).astype(np.float32)
+        store = StoreVectors(
+            ids=[f"chunk-{i}" for i in range(1000)], vectors=vectors,
+            documents=[f"Passage {i} on Berkshire’s float" for i in range(1000)],
+            metadatas=[{"source": "1987_letter.pdf", "page": i} for i in range(1000)],
+        )
+        build_flat_index(store, str(tmp_path / "flat"))
+        monkeypatch.setattr(flat_index, "SEARCH_BLOCK_ROWS", 128)
+        index = FlatIndex(str(tmp_path / "flat"))
+
+        queries = normalize(vectors[:10] + 0.2 * rng.normal(size=(10, 384)).astype(np.float32))
+        results = index.search_batch(queries, k=4)
+        assert [[row for row, _ in hits] for hits in results] == [list(t) for t in exact_top_k(vectors, queries, 4)]
+
+        docs = index.documents([row for row, _ in results[0]])
+        assert docs[0].page_content == "Passage 0 on Berkshire’s float"
+        assert docs[0].metadata == {"source": "1987_letter.pdf", "page": 0}
+
+
+class TestIVFIndex:
+    """Test suite for the inverted-file (k-means posting list) index"""
+
+    def test_posting_lists_recall_and_exhaustive_probe(self, tmp_path):
+        """Test that posting lists cover every row, a few probes find most neighbours and all probes are exact"""
+        from ivf_index import IVFIndex, build_ivf_index
+        from store_vectors import StoreVectors, normalize
+        from vector_benchmarks import exact_top_k, recall_at_k
+
+        rng = np.random.default_rng(5)
+        centers = rng.normal(size=(20, 384))
+        vectors = (centers[rng.integers(0, 20, 2000)] + 0.8 * rng.normal(size=(2000, 384))).astype(np.float32)
+        store = StoreVectors(
+            ids=[f"chunk-{i}" for i in range(2000)], vectors=vectors,
+            documents=[f"Passage {i}" for i in range(2000)],
+            metadatas=[{"source": "1987_letter.pdf", "page": i} for i in range(2000)],
+        )
+        meta = build_ivf_index(store, str(tmp_path / "ivf"), n_lists=40)
+        index = IVFIndex(str(tmp_path / "ivf"), nprobe=4)
+        assert meta["n_lists"] == 40 and index.lists[0] == 0 and index.lists[-1] == 2000
+
+        store_row = [int(index.chunks.record(position)["id"].split("-")[1]) for position in range(len(index))]
+        assert sorted(store_row) == list(range(2000))
+
+        queries = normalize(vectors[:20] + 0.2 * rng.normal(size=(20, 384)).astype(np.float32))
+        truth = exact_top_k(vectors, queries, 4)
+        probed = [[store_row[row] for row, _ in index.search(q, k=4)] for q in queries]
+        exhaustive = [[store_row[row] for row, _ in index.search(q, k=4, nprobe=40)] for q in queries]
+        assert recall_at_k(truth, probed) >= 0.8
+        assert exhaustive == [list(t) for t in truth]
+
+        row, _ = index.search(queries[0], k=1)[0]
+        assert index.documents([row])[0].page_content == f"Passage {store_row[row]}"
+
+
+class TestShards:
+    """Test suite for per-source-family shards of the vector store"""
+
+    def test_sources_map_to_their_family_shard(self):
+        """Test that letters, the Almanack, speeches and transcripts land in separate shards"""
+        from shards import shard_for_source, shards_for_types
+
+        assert shard_for_source("docs/Berkshire_Letters/1987.pdf") == "letters"
+        assert shard_for_source("docs/Berkshire_Letters/1977-2002_Combined_Archive.pdf") == "letters"
+        assert shard_for_source("docs/Poor_Charlies_Almanack.pdf") == "almanack"
+        assert shard_for_source("docs/DJ_2019_Meeting.txt") == "transcripts"
+        assert shard_for_source("docs/USC_Law_Commencement_2007.pdf") == "speeches"
+        assert shards_for_types(["letter_archive", "annual_letter", "speech"]) == ["letters", "speeches"]
+
+    def test_single_collection_store_is_migrated_without_reembedding(self, tmp_path):
+        """Test that rows of a pre-sharding store move to their shard with their vectors intact"""
+        import chromadb
+        from shards import LEGACY_COLLECTION, drop_shard, is_legacy_store, migrate_to_shards, present_shards
+        from store_vectors import load_store_vectors
+
+        store_dir = str(tmp_path / "store")
+        sources = ["docs/Berkshire_Letters/1987.pdf", "docs/Poor_Charlies_Almanack.pdf", "docs/DJ_2019.txt"]
+        vectors = np.random.default_rng(0).normal(size=(30, 8)).astype(np.float32)
+        chromadb.PersistentClient(path=store_dir).create_collection(LEGACY_COLLECTION).add(
+            ids=[f"chunk-{i}" for i in range(30)], embeddings=vectors,
+            documents=[f"Passage {i}" for i in range(30)],
+            metadatas=[{"source": sources[i % 3], "page": i} for i in range(30)],
+        )
+
+        assert is_legacy_store(store_dir)
+        assert migrate_to_shards(store_dir, batch_size=7) == 30
+        assert not is_legacy_store(store_dir)
+        assert present_shards(store_dir) == ["letters", "almanack", "transcripts"]
+
+        client = chromadb.PersistentClient(path=store_dir)
+        letters = client.get_collection("letters").get(include=["metadatas"])
+        assert sorted(letters["ids"]) == sorted(f"chunk-{i}" for i in range(0, 30, 3))
+        store = load_store_vectors(store_dir)
+        rows = [int(chunk_id.split("-")[1]) for chunk_id in store.ids]
+        np.testing.assert_allclose(store.vectors, vectors[rows], rtol=1e-6)
+
+        assert drop_shard(store_dir, "letters") and not drop_shard(store_dir, "letters")
+        assert present_shards(store_dir) == ["almanack", "transcripts"]
+
+
+class TestBM25Index:
+    """Test suite for the on-disk BM25 inverted index"""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        from bm25_index import BM25Index, build_bm25_index
+        from store_vectors import StoreVectors
+
+        texts = [
+            "Ajit Jain runs our reinsurance operation and has created billions of float.",
+            "Insurance float is money we hold but do not own. Float has grown every year.",
+            "See's Candies taught us the value of pricing power.",
+            "Our textile business was a mistake; the mills never earned their cost of capital.",
+        ]
+        metadatas = [
+            {"source": "1987.pdf", "source_type": "annual_letter", "year_start": 1987, "year_end": 1987},
+            {"source": "2001.pdf", "source_type": "annual_letter", "year_start": 2001, "year_end": 2001},
+            {"source": "almanack.pdf", "source_type": "almanack"},
+            {"source": "1985.pdf", "source_type": "annual_letter", "year_start": 1985, "year_end": 1985},
+        ]
+        store = StoreVectors(ids=[f"chunk-{i}" for i in range(4)], vectors=np.zeros((4, 8), dtype=np.float32),
+                             documents=texts, metadatas=metadatas)
+        meta = build_bm25_index(store, str(tmp_path / "bm25"))
+        assert meta["count"] == 4
+        return BM25Index(str(tmp_path / "bm25"))
+
+    def test_tokenizer_keeps_names_and_years(self):
+        """Test that stopwords and single letters are dropped but names, tickers and years are kept"""
+        from bm25_index import tokenize
+
+        assert tokenize("What did Ajit Jain say in 1987 about BRK's float?") == [
+            "did", "ajit", "jain", "say", "1987", "about", "brk", "float",
+        ]
+
+    def test_exact_terms_rank_matching_chunks_first(self, index):
+        """Test that rare exact terms outrank common ones and unmatched chunks are never returned"""
+        assert [key for key, _ in index.search("Ajit Jain", k=4)] == ["chunk-0"]
+        hits = index.search("float", k=4)
+        assert [key for key, _ in hits] == ["chunk-1", "chunk-0"]
+        assert hits[0][1] > hits[1][1] > 0
+        assert index.search("cryptocurrency", k=4) == []
+
+    def test_query_constraints_filter_rows(self, index):
+        """Test that source and year constraints are applied from the per-row arrays"""
+        from source_metadata import parse_query_constraints
+
+        constraints = parse_query_constraints("float in the 2001 letter")
+        assert [key for key, _ in index.search("float", k=4, constraints=constraints)] == ["chunk-1"]
+        constraints = parse_query_constraints("pricing power in Poor Charlie's Almanack")
+        assert [key for key, _ in index.search("pricing power", k=4, constraints=constraints)] == ["chunk-2"]
+
+
+class TestSmallToBig:
+    """Test suite for sentence-window children and their expansion into parent passages"""
+
+    @staticmethod
+    def parent():
+        from langchain_core.documents import Document
+        text = " ".join(f"Sentence number {i} is about topic {i}." for i in range(12))
+        return Document(page_content=text, metadata={"source": "1987.pdf", "page": 3})
+
+    def test_parent_overlap_only_applies_without_children(self, monkeypatch):
+        """Test that the configured overlap is dropped while children are on and restored with CHILD_TOKENS = 0"""
+        import process_documents
+
+        monkeypatch.setattr(process_documents, "CHUNK_UNIT", "tokens")
+        settings = process_documents.chunk_settings()
+        assert (settings["chunk_overlap"], settings["child_size"]) == (0, process_documents.CHILD_TOKENS)
+        monkeypatch.setattr(process_documents, "CHILD_TOKENS", 0)
+        settings = process_documents.chunk_settings()
+        assert (settings["chunk_overlap"], settings["child_size"]) == (process_documents.CHUNK_TOKEN_OVERLAP, 0)
+
+    def test_windows_pack_whole_sentences(self):
+        """Test that children are exact slices of whole sentences within the size limit"""
+        from small_to_big import SentenceWindowSplitter, sentence_spans
+
+        parent = self.parent()
+        assert len(sentence_spans(parent.page_content)) == 12
+        children = SentenceWindowSplitter(100).split([parent], ["p1"])
+        assert len(children) == 6
+        for child in children:
+            assert child.page_content.startswith("Sentence") and child.page_content.endswith(".")
+            assert len(child.page_content) <= 100
+            assert child.metadata["parent_id"] == "p1" and child.metadata["page"] == 3
+        assert [child.metadata["window_start"] for child in children[1:]] == [
+            child.metadata["window_end"] + 1 for child in children[:-1]]
+
+    def test_hits_are_merged_per_parent_under_the_budget(self):
+        """Test that hits on one parent become one passage and the budget caps the total"""
+        from langchain_core.documents import Document
+        from small_to_big import SentenceWindowSplitter, expand_windows
+
+        parent = self.parent()
+        children = SentenceWindowSplitter(40).split([parent], ["p1"])
+        legacy = Document(page_content="A chunk indexed before small-to-big.", metadata={"source": "x.pdf"})
+
+        passages = expand_windows([children[5], children[6], legacy], {"p1": parent}, budget=1000, window=120)
+        assert len(passages) == 2
+        assert children[5].page_content in passages[0].page_content
+        assert children[6].page_content in passages[0].page_content
+        assert " … " not in passages[0].page_content and len(passages[0].page_content) <= 2 * 120
+        assert passages[0].metadata == parent.metadata
+        assert passages[1] is legacy
+
+        passages = expand_windows([children[0], children[11]], {"p1": parent}, budget=100, window=120)
+        assert sum(len(passage.page_content) for passage in passages) <= 100 + len(" … ")
+        assert children[0].page_content in passages[0].page_content
+
+
+class TestRetrievalSweep:
+    """Test suite for golden-set scoring and the recommendation of the retrieval parameter sweep"""
+
+    def test_golden_set_is_well_formed(self):
+        """Test that every golden question has expected passages with a phrase and a source or year"""
+        from benchmark_retrieval_sweep import load_golden_set
+
+        golden = load_golden_set(os.path.join(os.path.dirname(__file__), "..", "src", "golden_queries.json"))
+        assert len(golden) >= 20
+        for item in golden:
+            for passage in item["expected"]:
+                assert passage["text"] and ("year" in passage or "source" in passage)
+
+    def test_recall_and_reciprocal_rank_ignore_chunk_boundaries(self):
+        """Test that relevance needs the phrase and the source, and that MRR uses the first relevant rank"""
+        from langchain_core.documents import Document
+        from benchmark_retrieval_sweep import score_ranking
+
+        letter = {"source": "docs/Berkshire_Letters/1977-2002_Combined_Archive_Letters.pdf",
+                  "year_start": 1987, "year_end": 1987}
+        ranking = [
+            Document(page_content="Mr. Market appears daily.", metadata={"source": "almanack.pdf"}),
+            Document(page_content="Ben Graham's   mr.\nmarket parable.", metadata=letter),
+        ]
+        expected = [{"year": 1987, "text": "Mr. Market"}, {"year": 1988, "text": "holding period is forever"}]
+        assert score_ranking(ranking, expected) == (0.5, 0.5)
+        assert score_ranking(ranking[:1], expected) == (0.0, 0.0)
+
+    def test_recommendation_prefers_the_cheapest_near_best_row(self):
+        """Test that rows within the tolerance of the best recall and MRR are tie-broken by k, then size"""
+        from benchmark_retrieval_sweep import recommend
+
+        rows = [
+            {"k": 8, "recall": 0.95, "mrr": 0.80, "index_mb": 40, "p95_ms": 3.0},
+            {"k": 4, "recall": 0.945, "mrr": 0.80, "index_mb": 60, "p95_ms": 2.0},
+            {"k": 4, "recall": 0.945, "mrr": 0.795, "index_mb": 30, "p95_ms": 4.0},
+            {"k": 2, "recall": 0.80, "mrr": 0.80, "index_mb": 10, "p95_ms": 1.0},
+        ]
+        assert recommend(rows) is rows[2]
+
+    def test_sweep_exits_when_no_chunking_variant_is_left(self, monkeypatch, capsys):
+        """Test that overlaps at least as large as every chunk size stop the sweep with a clear message"""
+        import benchmark_retrieval_sweep
+
+        monkeypatch.setattr(sys, "argv", ["benchmark_retrieval_sweep.py", "--chunk-sizes", "64",
+                                          "--overlaps", "64", "128", "--child-sizes", "0"])
+        with pytest.raises(SystemExit):
+            benchmark_retrieval_sweep.main()
+        assert "no chunking variant left" in capsys.readouterr().err
+
+    @pytest.mark.parametrize("configuration", [True, False])
+    def test_hnsw_settings_are_applied_to_the_scratch_collection(self, tmp_path, monkeypatch, configuration):
+        """Test that the HNSW settings reach the collection, as configuration (chromadb 1.x) or metadata"""
+        import chromadb
+        import benchmark_retrieval_sweep
+
+        monkeypatch.setattr(benchmark_retrieval_sweep, "has_collection_configuration", lambda: configuration)
+        client = chromadb.PersistentClient(path=str(tmp_path / "sweep"))
+        collection = benchmark_retrieval_sweep.create_hnsw_collection(client, "cosine", 8, 50, 20)
+        collection.add(ids=["a", "b"], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+
+        collection = client.get_collection("sweep")
+        hnsw = collection.configuration["hnsw"]
+        assert (hnsw["space"], hnsw["max_neighbors"], hnsw["ef_construction"], hnsw["ef_search"]) \
+            == ("cosine", 8, 50, 20)
+        assert collection.query(query_embeddings=[[0.9, 0.1]], n_results=1)["ids"] == [["a"]]